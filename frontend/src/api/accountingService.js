@@ -6,6 +6,21 @@ export const getAccounts = async (page = 1, pageSize = 100) => {
   return response.data;
 };
 
+// Árbol completo con saldos acumulados por nodo (una sola llamada)
+export const getAccountTree = async (asOf = null) => {
+  const params = asOf ? `?as_of=${asOf}` : '';
+  const response = await apiClient.get(`/accounts/tree/${params}`);
+  return response.data;
+};
+
+// Mayor de la cuenta con saldo corrido; pasar el 'next_cursor' recibido para la siguiente página
+export const getAccountLedger = async (id, { startDate, endDate, cursor, pageSize } = {}) => {
+  const response = await apiClient.get(`/accounts/${id}/ledger/`, {
+    params: { start_date: startDate, end_date: endDate, cursor, page_size: pageSize },
+  });
+  return response.data;
+};
+
 export const getAccountById = async (id) => {
   const response = await apiClient.get(`/accounts/${id}/`);
   return response.data;
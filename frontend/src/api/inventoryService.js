@@ -19,13 +19,14 @@ export const getUnitsOfMeasure = async () => {
   return Array.isArray(response.data) ? response.data : (response.data.results || []);
 };
 
-export const getProductKardex = async (productId) => {
+export const getProductKardex = async (productId, cursor = null) => {
   try {
-    const response = await apiClient.get(`/products/${productId}/kardex/`);
+    const params = cursor ? { cursor } : {};
+    const response = await apiClient.get(`/products/${productId}/kardex/`, { params });
     return response.data;
   } catch (error) {
     console.error("Error fetching kardex:", error);
-    return [];
+    return { results: [], next_cursor: null };
   }
 };
 
@@ -2,10 +2,11 @@ import apiClient from './axios';
 
 // Función para obtener el reporte de Ganancias y Pérdidas
 // NOTA: Ya no recibe 'token' como argumento
-export const getProfitAndLoss = async () => {
+// Acepta { start_date, end_date, granularity, compare } (compare: previous_year | previous_period)
+export const getProfitAndLoss = async (params = {}) => {
   try {
     // La cookie viaja sola gracias a withCredentials: true en axios.js
-    const response = await apiClient.get('/reports/profit-and-loss/');
+    const response = await apiClient.get('/reports/profit-and-loss/', { params });
     return response.data;
   } catch (error) {
     console.error("Error fetching P&L report:", error);
@@ -13,4 +14,58 @@ export const getProfitAndLoss = async () => {
   }
 };
 
-// Más adelante podríamos añadir getBalanceSheet aquí
\ No newline at end of file
+// Balance de Comprobación multi-periodo (granularity: month | quarter | year)
+export const getTrialBalance = async (startDate, endDate, granularity = 'month') => {
+  const response = await apiClient.get('/reports/trial-balance/', {
+    params: { start_date: startDate, end_date: endDate, granularity },
+  });
+  return response.data;
+};
+
+// URL de descarga del Libro Diario / Mayor (book: diario | mayor, output: csv | jsonl)
+export const getGeneralLedgerExportUrl = (params) => {
+  return apiClient.getUri({ url: '/reports/general-ledger/export/', params });
+};
+
+// Balance General a una fecha, con detalle por cuenta y por cuenta padre
+export const getBalanceSheet = async (asOf = null) => {
+  const response = await apiClient.get('/reports/balance-sheet/', {
+    params: asOf ? { as_of: asOf } : {},
+  });
+  return response.data;
+};
+
+// Estado consolidado de un grupo (params: group, report, start_date/end_date o as_of)
+export const getConsolidatedReport = async (params) => {
+  const response = await apiClient.get('/reports/consolidated/', { params });
+  return response.data;
+};
+
+// Antigüedad de saldos (kind: receivable | payable, as_of, credit_days)
+export const getAgingReport = async (params = {}) => {
+  const response = await apiClient.get('/reports/aging/', { params });
+  return response.data;
+};
+
+// Flujo de efectivo (method: direct | indirect, granularity: week | month)
+export const getCashFlow = async (params = {}) => {
+  const response = await apiClient.get('/reports/cash-flow/', { params });
+  return response.data;
+};
+
+// Indicadores precalculados del dashboard (una sola lectura)
+export const getKpis = async () => {
+  const response = await apiClient.get('/reports/kpis/');
+  return response.data;
+};
+
+// Declaración de ITBMS (start_date, end_date, granularity: month | quarter)
+export const getItbmsDeclaration = async (params = {}) => {
+  const response = await apiClient.get('/reports/itbms/declaration/', { params });
+  return response.data;
+};
+
+// URL de descarga del libro de ventas / compras (book: sales | purchases, output: csv | txt | jsonl)
+export const getTaxBookExportUrl = (params) => {
+  return apiClient.getUri({ url: '/reports/itbms/book/export/', params });
+};
@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Card, CardContent, Typography, Box, CircularProgress, Alert, Grid } from '@mui/material';
 // NOTA: Usamos el Grid clásico temporalmente para asegurar la carga
 // import Grid from '@mui/material/Grid2'; 
-import { getProfitAndLoss } from '../api/reportsService.js';
+import { getKpis } from '../api/reportsService.js';
 
 const KpiCard = ({ title, value, loading, formatAsMoney = true }) => (
   <Card sx={{ minHeight: 120 }}>
@@ -31,8 +31,8 @@ const DashboardPage = () => {
       try {
         setLoading(true);
         setError(null);
-        const data = await getProfitAndLoss();
-        setReportData(data);
+        const data = await getKpis();
+        setReportData(data.kpis);
       } catch (err) {
         console.error(err);
         setError('Error al cargar datos financieros.');
@@ -59,21 +59,21 @@ const DashboardPage = () => {
         <Grid item xs={12} md={4}>
           <KpiCard 
             title="Ingresos Totales (YTD)" 
-            value={reportData?.total_revenue || 0} 
+            value={reportData?.revenue_ytd?.value || 0} 
             loading={loading}
           />
         </Grid>
         <Grid item xs={12} md={4}>
           <KpiCard 
             title="Gastos Operativos" 
-            value={reportData?.total_expense || 0} 
+            value={reportData?.expense_ytd?.value || 0} 
             loading={loading}
           />
         </Grid>
         <Grid item xs={12} md={4}>
           <KpiCard 
             title="Utilidad Neta" 
-            value={reportData?.net_profit || 0} 
+            value={reportData?.net_profit_ytd?.value || 0} 
             loading={loading}
           />
         </Grid>
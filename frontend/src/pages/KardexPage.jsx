@@ -13,14 +13,24 @@ const KardexPage = () => {
   const { id } = useParams();
   const navigate = useNavigate();
   const [movements, setMovements] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
 
-  useEffect(() => {
+  // Paginación keyset: cada página continúa desde el cursor de la anterior
+  const loadPage = (cursor = null) => {
+    setLoading(true);
     // CORRECCIÓN: Llamada directa, el interceptor de Axios maneja la cookie
-    getProductKardex(id)
-      .then(data => setMovements(data))
+    getProductKardex(id, cursor)
+      .then(data => {
+        setMovements(prev => (cursor ? [...prev, ...data.results] : data.results));
+        setNextCursor(data.next_cursor);
+      })
       .catch(err => console.error("Error cargando kardex", err))
       .finally(() => setLoading(false));
+  };
+
+  useEffect(() => {
+    loadPage();
   }, [id]);
 
   return (
@@ -31,7 +41,8 @@ const KardexPage = () => {
       <Typography variant="h4" mb={2}>Kardex del Producto</Typography>
       <Divider sx={{ mb: 3 }} />
 
-      {loading ? <CircularProgress /> : (
+      {loading && movements.length === 0 ? <CircularProgress /> : (
+        <>
         <TableContainer component={Paper}>
           <Table size="small">
             <TableHead>
@@ -39,27 +50,41 @@ const KardexPage = () => {
                 <TableCell>Fecha</TableCell>
                 <TableCell>Tipo</TableCell>
                 <TableCell>Descripción</TableCell>
+                <TableCell align="right">Cantidad</TableCell>
+                <TableCell align="right">Costo Unit.</TableCell>
                 <TableCell align="right">Monto</TableCell>
+                <TableCell align="right">Existencia</TableCell>
+                <TableCell align="right">Valor</TableCell>
               </TableRow>
             </TableHead>
             <TableBody>
               {movements.length === 0 ? (
-                <TableRow><TableCell colSpan={4} align="center">Sin movimientos.</TableCell></TableRow>
+                <TableRow><TableCell colSpan={8} align="center">Sin movimientos.</TableCell></TableRow>
               ) : (
-                movements.map((mov, index) => (
-                  <TableRow key={index}>
+                movements.map((mov) => (
+                  <TableRow key={mov.id}>
                     <TableCell>{new Date(mov.date).toLocaleDateString()}</TableCell>
                     <TableCell sx={{ color: mov.type === 'ENTRADA' ? 'green' : 'red', fontWeight: 'bold' }}>
                         {mov.type}
                     </TableCell>
                     <TableCell>{mov.description}</TableCell>
+                    <TableCell align="right">{parseFloat(mov.quantity).toFixed(2)}</TableCell>
+                    <TableCell align="right">${parseFloat(mov.unit_cost).toFixed(2)}</TableCell>
                     <TableCell align="right">${parseFloat(mov.amount).toFixed(2)}</TableCell>
+                    <TableCell align="right">{parseFloat(mov.balance_quantity).toFixed(2)}</TableCell>
+                    <TableCell align="right">${parseFloat(mov.balance_value).toFixed(2)}</TableCell>
                   </TableRow>
                 ))
               )}
             </TableBody>
           </Table>
         </TableContainer>
+        {nextCursor && (
+          <Button onClick={() => loadPage(nextCursor)} disabled={loading} sx={{ mt: 2 }}>
+            Cargar más
+          </Button>
+        )}
+        </>
       )}
     </Box>
   );
@@ -1,5 +1,35 @@
 from django.contrib import admin
-from .models import Company, Domain
+from django.db import connection
+from django_tenants.utils import get_public_schema_name
+from .models import (
+    Company, Domain, CompanySubsidiary, ConsolidationGroup, ConsolidationMember,
+    ConsolidationAccountMap, EliminationRule,
+)
+
+
+class PublicSchemaOnlyAdmin(admin.ModelAdmin):
+    """
+    Modelos que solo se administran desde el esquema público: el admin de un
+    tenant no puede verlos ni editarlos.
+    """
+    def _is_public(self):
+        return connection.schema_name == get_public_schema_name()
+
+    def has_module_permission(self, request):
+        return self._is_public() and super().has_module_permission(request)
+
+    def has_view_permission(self, request, obj=None):
+        return self._is_public() and super().has_view_permission(request, obj)
+
+    def has_add_permission(self, request):
+        return self._is_public() and super().has_add_permission(request)
+
+    def has_change_permission(self, request, obj=None):
+        return self._is_public() and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return self._is_public() and super().has_delete_permission(request, obj)
+
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
@@ -14,4 +44,32 @@ class DomainAdmin(admin.ModelAdmin):
     """
     Configuración del panel de administración para el modelo Domain.
     """
-    list_display = ('domain', 'tenant', 'is_primary')
\ No newline at end of file
+    list_display = ('domain', 'tenant', 'is_primary')
+
+class ConsolidationMemberInline(admin.TabularInline):
+    model = ConsolidationMember
+    extra = 1
+
+class ConsolidationAccountMapInline(admin.TabularInline):
+    model = ConsolidationAccountMap
+    extra = 1
+
+class EliminationRuleInline(admin.TabularInline):
+    model = EliminationRule
+    extra = 1
+
+@admin.register(CompanySubsidiary)
+class CompanySubsidiaryAdmin(PublicSchemaOnlyAdmin):
+    """
+    Subsidiarias que cada holding puede consolidar.
+    """
+    list_display = ('holding', 'subsidiary', 'created_on')
+    list_filter = ('holding',)
+
+@admin.register(ConsolidationGroup)
+class ConsolidationGroupAdmin(PublicSchemaOnlyAdmin):
+    """
+    Grupos de consolidación: empresas, mapeos de cuentas y eliminaciones intercompañía.
+    """
+    list_display = ('name', 'parent', 'created_on')
+    inlines = [ConsolidationMemberInline, ConsolidationAccountMapInline, EliminationRuleInline]
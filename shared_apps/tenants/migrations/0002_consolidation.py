@@ -0,0 +1,68 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsolidationGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('created_on', models.DateField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EliminationRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('account_code', models.CharField(max_length=20)),
+                ('counterpart_code', models.CharField(max_length=20)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='elimination_rules', to='tenants.consolidationgroup')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConsolidationMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consolidation_memberships', to='tenants.company')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='tenants.consolidationgroup')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='consolidationgroup',
+            name='members',
+            field=models.ManyToManyField(related_name='member_of_groups', through='tenants.ConsolidationMember', to='tenants.company'),
+        ),
+        migrations.AddField(
+            model_name='consolidationgroup',
+            name='parent',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consolidation_groups', to='tenants.company'),
+        ),
+        migrations.CreateModel(
+            name='ConsolidationAccountMap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_code', models.CharField(max_length=20)),
+                ('target_code', models.CharField(max_length=20)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='tenants.company')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='account_maps', to='tenants.consolidationgroup')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='consolidationmember',
+            constraint=models.UniqueConstraint(fields=('group', 'company'), name='tenants_group_member_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='consolidationaccountmap',
+            constraint=models.UniqueConstraint(fields=('group', 'company', 'source_code'), name='tenants_account_map_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.13 on 2026-10-18 08:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_consolidation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanySubsidiary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateField(auto_now_add=True)),
+                ('holding', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subsidiary_links', to='tenants.company')),
+                ('subsidiary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holding_links', to='tenants.company')),
+            ],
+            options={
+                'verbose_name_plural': 'Company subsidiaries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='companysubsidiary',
+            constraint=models.UniqueConstraint(fields=('holding', 'subsidiary'), name='tenants_subsidiary_uniq'),
+        ),
+    ]
@@ -12,6 +12,102 @@ class Company(TenantMixin):
     def __str__(self):
         return self.name
 
+    def consolidable_companies(self):
+        """
+        Empresas que esta empresa puede incluir en sus grupos de consolidación:
+        ella misma y sus subsidiarias registradas.
+        """
+        return Company.objects.filter(
+            models.Q(pk=self.pk) | models.Q(holding_links__holding=self)
+        ).distinct()
+
 class Domain(DomainMixin):
     def __str__(self):
-        return self.domain
\ No newline at end of file
+        return self.domain
+
+class CompanySubsidiary(models.Model):
+    """
+    Relación holding -> subsidiaria que autoriza a la holding a consolidar los
+    estados de la subsidiaria (y por tanto a leer sus saldos). Solo la gestionan
+    los administradores del esquema público, nunca un tenant desde la API.
+    """
+    holding = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='subsidiary_links')
+    subsidiary = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='holding_links')
+    created_on = models.DateField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Company subsidiaries"
+        constraints = [
+            models.UniqueConstraint(fields=['holding', 'subsidiary'], name='tenants_subsidiary_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.holding} -> {self.subsidiary}"
+
+
+class ConsolidationGroup(models.Model):
+    """
+    Grupo de empresas (holding y subsidiarias) que consolida sus estados financieros.
+    Vive en el esquema público: solo la empresa `parent` puede pedir el consolidado.
+    """
+    name = models.CharField(max_length=100)
+    parent = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='consolidation_groups')
+    members = models.ManyToManyField(Company, through='ConsolidationMember', related_name='member_of_groups')
+    created_on = models.DateField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    def unauthorized_members(self):
+        """
+        Empresas del grupo que la matriz no está autorizada a consolidar.
+        """
+        return self.members.exclude(pk__in=self.parent.consolidable_companies().values('pk'))
+
+
+class ConsolidationMember(models.Model):
+    group = models.ForeignKey(ConsolidationGroup, on_delete=models.CASCADE, related_name='memberships')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='consolidation_memberships')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'company'], name='tenants_group_member_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.group} - {self.company}"
+
+
+class ConsolidationAccountMap(models.Model):
+    """
+    Traduce un código de cuenta de una empresa del grupo (o de todas, si company
+    es nulo) al código del plan consolidado. Sin mapeo, el código se usa tal cual.
+    """
+    group = models.ForeignKey(ConsolidationGroup, on_delete=models.CASCADE, related_name='account_maps')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True)
+    source_code = models.CharField(max_length=20)
+    target_code = models.CharField(max_length=20)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'company', 'source_code'], name='tenants_account_map_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.source_code} -> {self.target_code}"
+
+
+class EliminationRule(models.Model):
+    """
+    Eliminación intercompañía entre dos cuentas del plan consolidado, p. ej.
+    Cuentas por cobrar vs. Cuentas por pagar a empresas del grupo, o Ingresos vs.
+    Gastos entre ellas. Se elimina el importe conciliado (el menor de los dos saldos);
+    la diferencia queda a la vista en el reporte.
+    """
+    group = models.ForeignKey(ConsolidationGroup, on_delete=models.CASCADE, related_name='elimination_rules')
+    name = models.CharField(max_length=100)
+    account_code = models.CharField(max_length=20)
+    counterpart_code = models.CharField(max_length=20)
+
+    def __str__(self):
+        return self.name
@@ -1,5 +1,6 @@
+from django.db import connection, transaction
 from rest_framework import serializers
-from .models import Company, Domain
+from .models import Company, Domain, ConsolidationGroup, ConsolidationAccountMap, EliminationRule
 
 class CompanySerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,4 +11,81 @@ class CompanySerializer(serializers.ModelSerializer):
 class DomainSerializer(serializers.ModelSerializer):
     class Meta:
         model = Domain
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+def consolidable_companies():
+    """
+    Empresas que el tenant actual puede consolidar; ninguna si no es un tenant.
+    """
+    company = Company.objects.filter(schema_name=connection.schema_name).first()
+    return company.consolidable_companies() if company else Company.objects.none()
+
+class ConsolidationAccountMapSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ConsolidationAccountMap
+        fields = ['id', 'company', 'source_code', 'target_code']
+
+class EliminationRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EliminationRule
+        fields = ['id', 'name', 'account_code', 'counterpart_code']
+
+class ConsolidationGroupSerializer(serializers.ModelSerializer):
+    """
+    Grupo de consolidación con sus empresas, mapeos de cuentas y reglas de
+    eliminación. Al editar, las listas enviadas reemplazan a las anteriores.
+    Solo se aceptan empresas que la empresa actual puede consolidar (ella misma
+    y sus subsidiarias, ver CompanySubsidiary).
+    """
+    members = serializers.PrimaryKeyRelatedField(many=True, queryset=Company.objects.all())
+    account_maps = ConsolidationAccountMapSerializer(many=True, required=False)
+    elimination_rules = EliminationRuleSerializer(many=True, required=False)
+
+    class Meta:
+        model = ConsolidationGroup
+        fields = ['id', 'name', 'parent', 'members', 'account_maps', 'elimination_rules', 'created_on']
+        read_only_fields = ['parent', 'created_on']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        allowed = consolidable_companies()
+        fields['members'].child_relation.queryset = allowed
+        fields['account_maps'].child.fields['company'].queryset = allowed
+        return fields
+
+    def validate_members(self, members):
+        if not members:
+            raise serializers.ValidationError("El grupo debe tener al menos una empresa.")
+        return members
+
+    def _save_related(self, group, members, account_maps, elimination_rules):
+        if members is not None:
+            group.members.set(members)
+        if account_maps is not None:
+            group.account_maps.all().delete()
+            ConsolidationAccountMap.objects.bulk_create(
+                [ConsolidationAccountMap(group=group, **data) for data in account_maps]
+            )
+        if elimination_rules is not None:
+            group.elimination_rules.all().delete()
+            EliminationRule.objects.bulk_create(
+                [EliminationRule(group=group, **data) for data in elimination_rules]
+            )
+
+    @transaction.atomic
+    def create(self, validated_data):
+        members = validated_data.pop('members')
+        account_maps = validated_data.pop('account_maps', [])
+        elimination_rules = validated_data.pop('elimination_rules', [])
+        group = ConsolidationGroup.objects.create(**validated_data)
+        self._save_related(group, members, account_maps, elimination_rules)
+        return group
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        members = validated_data.pop('members', None)
+        account_maps = validated_data.pop('account_maps', None)
+        elimination_rules = validated_data.pop('elimination_rules', None)
+        instance = super().update(instance, validated_data)
+        self._save_related(instance, members, account_maps, elimination_rules)
+        return instance
@@ -1,6 +1,6 @@
 from rest_framework.routers import DefaultRouter
 # Tenant App Views
-from .views import CompanyViewSet, DomainViewSet
+from .views import CompanyViewSet, DomainViewSet, ConsolidationGroupViewSet
 # User App Views
 from users.views import UserViewSet
 # Inventory App Views
@@ -12,14 +12,17 @@ from sales.views import CustomerViewSet, SalesOrderViewSet
 # Treasury App Views
 from treasury.views import BankAccountViewSet, CashRegisterViewSet, TreasuryMovementViewSet
 # Accounting App Views
-from accounting.views import AccountViewSet, JournalEntryViewSet
+from accounting.views import AccountViewSet, JournalEntryViewSet, FiscalPeriodViewSet
 # HR App Views (¡LA QUE FALTABA!)
 from hr.views import EmployeeViewSet 
+# Reports App Views
+from reports.views import ReportJobViewSet
 
 router = DefaultRouter()
 
 router.register(r'companies', CompanyViewSet, basename='company')
 router.register(r'domains', DomainViewSet, basename='domain')
+router.register(r'consolidation-groups', ConsolidationGroupViewSet, basename='consolidationgroup')
 router.register(r'users', UserViewSet, basename='user')
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'units', UnitOfMeasureViewSet, basename='unitofmeasure')
@@ -33,6 +36,8 @@ router.register(r'cash-registers', CashRegisterViewSet, basename='cashregister')
 router.register(r'treasury-movements', TreasuryMovementViewSet, basename='treasurymovement')
 router.register(r'accounts', AccountViewSet, basename='account')
 router.register(r'journal-entries', JournalEntryViewSet, basename='journalentry')
+router.register(r'fiscal-periods', FiscalPeriodViewSet, basename='fiscalperiod')
 router.register(r'employees', EmployeeViewSet, basename='employee')
+router.register(r'report-jobs', ReportJobViewSet, basename='reportjob')
 
 urlpatterns = router.urls
\ No newline at end of file
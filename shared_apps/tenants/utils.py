@@ -0,0 +1,12 @@
+from django_tenants.utils import get_tenant_model, get_public_schema_name
+
+
+def tenant_schemas():
+    """
+    Esquemas de todos los tenants (sin el público), para tareas que recorren
+    cada empresa con schema_context.
+    """
+    return list(
+        get_tenant_model().objects.exclude(schema_name=get_public_schema_name())
+        .order_by('schema_name').values_list('schema_name', flat=True)
+    )
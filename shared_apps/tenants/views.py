@@ -1,6 +1,8 @@
+from django.db import connection
 from rest_framework import viewsets
-from .models import Company, Domain
-from .serializers import CompanySerializer, DomainSerializer
+from rest_framework.permissions import IsAuthenticated
+from .models import Company, Domain, ConsolidationGroup
+from .serializers import CompanySerializer, DomainSerializer, ConsolidationGroupSerializer
 
 class CompanyViewSet(viewsets.ModelViewSet):
     """
@@ -16,4 +18,19 @@ class DomainViewSet(viewsets.ModelViewSet):
     ver o editar los Dominios (Domains).
     """
     queryset = Domain.objects.all()
-    serializer_class = DomainSerializer
\ No newline at end of file
+    serializer_class = DomainSerializer
+
+class ConsolidationGroupViewSet(viewsets.ModelViewSet):
+    """
+    Grupos de consolidación de la empresa actual (la matriz del grupo).
+    """
+    serializer_class = ConsolidationGroupSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ConsolidationGroup.objects.filter(
+            parent__schema_name=connection.schema_name
+        ).prefetch_related('members', 'account_maps', 'elimination_rules')
+
+    def perform_create(self, serializer):
+        serializer.save(parent=Company.objects.get(schema_name=connection.schema_name))
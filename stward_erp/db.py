@@ -0,0 +1,37 @@
+"""
+Utilidades de base de datos compartidas por las apps de tenant.
+"""
+import time
+from django.db import connection
+
+IN_FLIGHT_WAIT_SECONDS = 30
+
+
+def stable_max_id(model, wait_seconds=IN_FLIGHT_WAIT_SECONDS):
+    """
+    MAX(id) de la tabla una vez terminadas las transacciones de escritura que seguían
+    abiertas al leerlo (las que tienen su xid bloqueado en pg_locks, salvo la propia).
+    Los ids se asignan al insertar pero las filas se ven al confirmar: una marca de
+    agua por id que avanzara hasta un MAX(id) simple podría saltar para siempre un
+    id menor confirmado después. Devuelve None si alguna sigue abierta tras wait_seconds.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    in_flight_sql = (
+        "SELECT ARRAY(SELECT transactionid::text::bigint FROM pg_locks "
+        "WHERE locktype = 'transactionid' AND mode = 'ExclusiveLock' AND pid <> pg_backend_pid()"
+    )
+    with connection.cursor() as cursor:
+        # Primero el MAX y después los xid en curso: una escritura con id menor que
+        # no se vio en el MAX ya había empezado y, o terminó, o aparece en la lista
+        cursor.execute(f"SELECT MAX(id) FROM {table}")
+        last_id = cursor.fetchone()[0]
+        cursor.execute(in_flight_sql + ")")
+        in_flight = cursor.fetchone()[0]
+        deadline = time.monotonic() + wait_seconds
+        while in_flight:
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+            cursor.execute(in_flight_sql + " AND transactionid::text::bigint = ANY(%s))", [in_flight])
+            in_flight = cursor.fetchone()[0]
+    return last_id or 0
@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _cursor_signer(scope):
+    # El esquema del tenant y el alcance (p. ej. cuenta y fechas del mayor) van en la sal:
+    # un cursor no sirve en otro tenant ni en otra consulta
+    return signing.Signer(salt=f"stward_erp.pagination:{connection.schema_name}:{scope}")
+
+
+def encode_cursor(position, scope=''):
+    """
+    Cursor opaco: JSON en base64 (url-safe) con la posición del último registro,
+    firmado con SECRET_KEY. Los cursores que arrastran saldos (mayor, kardex) no
+    se pueden alterar desde el cliente.
+    """
+    raw = json.dumps(position, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return _cursor_signer(scope).sign(base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii'))
+
+
+def decode_cursor(token, scope=''):
+    try:
+        payload = _cursor_signer(scope).unsign(token)
+        return json.loads(base64.urlsafe_b64decode(payload.encode('ascii')).decode('utf-8'))
+    except (signing.BadSignature, binascii.Error, UnicodeError, ValueError):
+        raise NotFound("Cursor inválido.")
+
+
+def keyset_filter(ordering, values):
+    """
+    Condición "después de `values`" para un orden de varias columnas, p. ej.
+    ('-date', '-id'): date < d OR (date = d AND id < i).
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+class HybridPagination(PageNumberPagination):
+    """
+    Paginación por número de página (la de siempre, para tablas tipo admin) o
+    por keyset cuando la petición trae ?cursor= (scroll infinito y clientes de
+    sincronización). En modo keyset no hay OFFSET ni COUNT(*): cada página es un
+    rango del índice a partir de la última fila vista.
+
+    La vista define el orden estable con `keyset_ordering`, que debe terminar en
+    una columna única (normalmente 'id'). Use ?cursor= vacío para la primera página.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    keyset_ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        self.ordering = getattr(view, 'keyset_ordering', self.keyset_ordering)
+        if not self.keyset:
+            # Las páginas numeradas también necesitan un orden estable
+            if not queryset.ordered:
+                queryset = queryset.order_by(*self.ordering)
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        token = request.query_params[self.cursor_query_param]
+        if token:
+            values = decode_cursor(token)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise NotFound("Cursor inválido.")
+            queryset = queryset.filter(keyset_filter(self.ordering, values))
+
+        # Se pide una fila de más para saber si existe una página siguiente
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_position = self.position_of(rows[-1]) if self.has_next else None
+        return rows
+
+    def position_of(self, instance):
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def get_next_cursor(self):
+        return encode_cursor(self.next_position) if self.next_position is not None else None
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('next_cursor', self.get_next_cursor()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['next_cursor'] = {'type': 'string', 'nullable': True}
+        return schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': "Cursor opaco de paginación keyset (vacío para la primera página).",
+            'schema': {'type': 'string'},
+        }]
@@ -133,6 +133,10 @@ USE_TZ = True
 
 # --- ARCHIVOS ESTÁTICOS ---
 STATIC_URL = 'static/'
+
+# Archivos generados (p. ej. resultados de reportes asíncronos), separados por tenant
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # --- DRF & SEGURIDAD JWT ---
@@ -181,10 +185,58 @@ CORS_ALLOWED_ORIGINS = [
 ]
 CORS_ALLOW_CREDENTIALS = True
 
+# --- CACHÉ ---
+# Redis si hay REDIS_URL; si no, memoria local (desarrollo y tests).
+# Las claves llevan el esquema del tenant (django_tenants.cache.make_key).
+REDIS_URL = os.getenv("REDIS_URL")
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache' if REDIS_URL
+        else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': REDIS_URL or 'stward-erp',
+        'KEY_FUNCTION': 'django_tenants.cache.make_key',
+        'REVERSE_KEY_FUNCTION': 'django_tenants.cache.reverse_key',
+    }
+}
+
+# --- REPORTES ---
+# Prefijos de código de las cuentas de Caja y Bancos (flujo de efectivo, método indirecto)
+ACCOUNTING_CASH_ACCOUNT_PREFIXES = ('1105', '1110')
+# Esquemas que se agregan en paralelo (un hilo y una conexión cada uno) en la consolidación
+CONSOLIDATION_MAX_WORKERS = int(os.getenv("CONSOLIDATION_MAX_WORKERS", "4"))
+# Plazo de crédito por defecto (días) para calcular el vencimiento en la antigüedad de saldos
+AGING_CREDIT_DAYS = int(os.getenv("AGING_CREDIT_DAYS", "30"))
+# Minutos sin avance tras los que un ReportJob en cola/en curso se da por perdido y deja de bloquear a los idénticos
+REPORT_JOB_STALE_MINUTES = int(os.getenv("REPORT_JOB_STALE_MINUTES", "30"))
+# Cada cuántos minutos se recalculan los indicadores del dashboard (KpiSnapshot)
+KPI_REFRESH_MINUTES = int(os.getenv("KPI_REFRESH_MINUTES", "5"))
+# Productos por tarea en la predicción de demanda nocturna (un chord de trozos por tenant)
+FORECAST_CHUNK_SIZE = int(os.getenv("FORECAST_CHUNK_SIZE", "2000"))
+
 # --- CELERY & REDIS (TAREAS ASÍNCRONAS & IA) ---
+from celery.schedules import crontab
+
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_BACKEND", "redis://redis:6379/0")
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = TIME_ZONE
\ No newline at end of file
+CELERY_TIMEZONE = TIME_ZONE
+# Tareas periódicas (requiere el servicio celery-beat)
+CELERY_BEAT_SCHEDULE = {
+    # Partición del año siguiente del Libro Diario, en los tenants que lo tengan particionado
+    'ensure-journal-partitions': {
+        'task': 'accounting.tasks.ensure_journal_partitions',
+        'schedule': crontab(day_of_month='1', hour='3', minute='0'),
+    },
+    # Indicadores del dashboard (solo se recalculan los que cambiaron)
+    'refresh-kpi-snapshots': {
+        'task': 'reports.tasks.refresh_kpi_snapshots',
+        'schedule': timedelta(minutes=KPI_REFRESH_MINUTES),
+    },
+    # Predicción de demanda de todos los tenants, repartida entre los workers
+    'forecast-stock-demand': {
+        'task': 'inventory.tasks.forecast_all_tenants',
+        'schedule': crontab(hour='2', minute='0'),
+    },
+}
@@ -0,0 +1,31 @@
+"""
+Utilidades compartidas por los tests de las apps de tenant.
+"""
+from decimal import Decimal
+from accounting.services import create_journal_entry
+
+
+def business_queries(context):
+    """
+    SQL capturado por un CaptureQueriesContext, sin los 'SET search_path' que
+    django_tenants añade por cursor (no son consultas de negocio).
+    """
+    return [q['sql'] for q in context.captured_queries if not q['sql'].startswith('SET search_path')]
+
+
+def post_entry(day, debit_account, credit_account, amount, description='Movimiento de prueba'):
+    """
+    Contabiliza un asiento de dos líneas por `amount`. Un importe negativo
+    invierte el Debe y el Haber.
+    """
+    amount = Decimal(amount)
+    if amount < 0:
+        debit_account, credit_account, amount = credit_account, debit_account, -amount
+    return create_journal_entry(
+        date=day,
+        description=description,
+        lines=[
+            {'account': debit_account, 'debit': amount, 'credit': 0},
+            {'account': credit_account, 'debit': 0, 'credit': amount},
+        ]
+    )
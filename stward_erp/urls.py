@@ -4,7 +4,11 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework_simplejwt.views import TokenRefreshView
 # Importamos nuestras vistas seguras
 from users.views import CustomTokenObtainPairView, LogoutView
-from reports.views import ProfitAndLossAPIView, BalanceSheetAPIView
+from reports.views import (
+    ProfitAndLossAPIView, BalanceSheetAPIView, TrialBalanceAPIView, GeneralLedgerExportView,
+    ConsolidatedReportAPIView, AgingReportAPIView, CashFlowAPIView, KpiSnapshotAPIView,
+    ItbmsDeclarationAPIView, TaxBookExportView,
+)
 from inventory.views import ProductKardexView 
 
 api_v1_patterns = [
@@ -21,6 +25,14 @@ api_v1_patterns = [
     # --- REPORTES Y KARDEX ---
     path('reports/profit-and-loss/', ProfitAndLossAPIView.as_view(), name='profit-and-loss'),
     path('reports/balance-sheet/', BalanceSheetAPIView.as_view(), name='balance-sheet'),
+    path('reports/trial-balance/', TrialBalanceAPIView.as_view(), name='trial-balance'),
+    path('reports/consolidated/', ConsolidatedReportAPIView.as_view(), name='consolidated-report'),
+    path('reports/kpis/', KpiSnapshotAPIView.as_view(), name='kpis'),
+    path('reports/cash-flow/', CashFlowAPIView.as_view(), name='cash-flow'),
+    path('reports/aging/', AgingReportAPIView.as_view(), name='aging-report'),
+    path('reports/itbms/declaration/', ItbmsDeclarationAPIView.as_view(), name='itbms-declaration'),
+    path('reports/itbms/book/export/', TaxBookExportView.as_view(), name='tax-book-export'),
+    path('reports/general-ledger/export/', GeneralLedgerExportView.as_view(), name='general-ledger-export'),
     path('products/<int:product_id>/kardex/', ProductKardexView.as_view(), name='product-kardex'),
 ]
 
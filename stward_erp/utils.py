@@ -0,0 +1,24 @@
+from datetime import date
+from rest_framework.exceptions import ValidationError
+
+
+def parse_date(value, name, default=None):
+    """
+    Convierte un valor AAAA-MM-DD (o un date) en date.
+    Devuelve `default` si viene vacío y lanza ValidationError (400) si es inválido.
+    """
+    if not value:
+        return default
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValidationError({name: f"Fecha inválida '{value}'. Use el formato AAAA-MM-DD."})
+
+
+def parse_date_param(request, name, default=None):
+    """
+    Lee un parámetro de fecha (AAAA-MM-DD) del query string.
+    """
+    return parse_date(request.query_params.get(name), name, default)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Account, JournalEntry, JournalItem
+from .models import Account, JournalEntry, JournalItem, AccountDailyBalance, FiscalPeriod, PeriodClosingBalance
+from .services import ledger_keys, refresh_daily_balances
 
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
@@ -39,10 +40,23 @@ class JournalEntryAdmin(admin.ModelAdmin):
     # ¡La magia! Le decimos que incluya el editor de items inline
     inlines = [JournalItemInline]
 
+    # Los asientos de periodos cerrados quedan en solo lectura
+    def has_change_permission(self, request, obj=None):
+        if obj and FiscalPeriod.closed_for([obj.date]):
+            return False
+        return super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        if obj and FiscalPeriod.closed_for([obj.date]):
+            return False
+        return super().has_delete_permission(request, obj)
+
     def save_model(self, request, obj, form, change):
         # Asigna automáticamente al usuario logueado al crear desde el admin
         if not obj.pk:
             obj.created_by = request.user
+        # Guardamos los pares (cuenta, fecha) previos para recalcular sus saldos
+        obj._ledger_keys = ledger_keys([obj.pk]) if obj.pk else set()
         super().save_model(request, obj, form, change)
 
     def save_related(self, request, form, formsets, change):
@@ -62,4 +76,54 @@ class JournalEntryAdmin(admin.ModelAdmin):
             raise ValidationError("¡El asiento no está balanceado! (Debe != Haber)")
 
         # Si todo está bien, guardamos
-        super().save_related(request, form, formsets, change)
\ No newline at end of file
+        super().save_related(request, form, formsets, change)
+
+        # Sincroniza los saldos diarios con las líneas guardadas
+        obj = form.instance
+        refresh_daily_balances(getattr(obj, '_ledger_keys', set()) | ledger_keys([obj.pk]))
+
+    def delete_model(self, request, obj):
+        keys = ledger_keys([obj.pk])
+        super().delete_model(request, obj)
+        refresh_daily_balances(keys)
+
+    def delete_queryset(self, request, queryset):
+        keys = ledger_keys(list(queryset.values_list('pk', flat=True)))
+        super().delete_queryset(request, queryset)
+        refresh_daily_balances(keys)
+
+
+@admin.register(AccountDailyBalance)
+class AccountDailyBalanceAdmin(admin.ModelAdmin):
+    """
+    Consulta de los saldos diarios (solo lectura: se mantienen automáticamente).
+    """
+    list_display = ('account', 'date', 'debit_total', 'credit_total')
+    list_filter = ('date',)
+    search_fields = ('account__code', 'account__name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class PeriodClosingBalanceInline(admin.TabularInline):
+    model = PeriodClosingBalance
+    fields = ('account', 'debit_total', 'credit_total')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(FiscalPeriod)
+class FiscalPeriodAdmin(admin.ModelAdmin):
+    """
+    Periodos fiscales. El cierre se hace desde la API (close/reopen) para
+    que siempre se genere la foto de saldos.
+    """
+    list_display = ('name', 'start_date', 'end_date', 'status', 'closed_at', 'closed_by')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'closed_at', 'closed_by')
+    inlines = [PeriodClosingBalanceInline]
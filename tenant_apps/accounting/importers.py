@@ -0,0 +1,248 @@
+import csv
+import json
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from .models import Account, JournalEntry, JournalItem, FiscalPeriod
+from .services import post_journal_entries
+
+DEFAULT_CHUNK_SIZE = 1000
+CENT = Decimal('0.01')
+# JournalItem.debit/credit son DecimalField(max_digits=12, decimal_places=2)
+MAX_AMOUNT = Decimal('9999999999.99')
+
+
+def read_csv_entries(stream):
+    """
+    Lee un CSV plano (una fila por línea de asiento) y agrupa las filas consecutivas
+    con la misma referencia. Columnas: entry_ref, date, description, account_code,
+    debit, credit, line_description.
+    Devuelve tuplas (fila_inicial, referencia, cabecera, líneas).
+    """
+    reader = csv.DictReader(stream)
+    current = None
+    for row_number, row in enumerate(reader, start=2):  # La fila 1 es el encabezado
+        ref = (row.get('entry_ref') or '').strip()
+        if current is None or ref != current[1] or not ref:
+            if current is not None:
+                yield current
+            header = {'date': row.get('date'), 'description': row.get('description')}
+            current = (row_number, ref, header, [])
+        current[3].append({
+            'account_code': row.get('account_code'),
+            'debit': row.get('debit'),
+            'credit': row.get('credit'),
+            'description': row.get('line_description') or '',
+        })
+    if current is not None:
+        yield current
+
+
+def read_jsonl_entries(stream):
+    """
+    Lee un JSONL con un asiento por línea:
+    {"ref": "...", "date": "AAAA-MM-DD", "description": "...",
+     "items": [{"account_code": "...", "debit": "...", "credit": "...", "description": "..."}]}
+    """
+    for row_number, raw in enumerate(stream, start=1):
+        if not raw.strip():
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            yield row_number, '', None, f"JSON inválido: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield row_number, '', None, "Cada línea debe ser un objeto JSON."
+            continue
+        header = {'date': data.get('date'), 'description': data.get('description')}
+        items = data.get('items') if isinstance(data.get('items'), list) else []
+        lines = [{
+            'account_code': item.get('account_code') if isinstance(item, dict) else None,
+            'debit': item.get('debit') if isinstance(item, dict) else None,
+            'credit': item.get('credit') if isinstance(item, dict) else None,
+            'description': (item.get('description') if isinstance(item, dict) else '') or '',
+        } for item in items]
+        yield row_number, str(data.get('ref') or ''), header, lines
+
+
+READERS = {
+    'csv': read_csv_entries,
+    'jsonl': read_jsonl_entries,
+}
+
+
+def detect_format(filename, requested=None):
+    """
+    Formato explícito o, si no viene, deducido de la extensión del archivo.
+    """
+    file_format = (requested or filename.rsplit('.', 1)[-1]).lower()
+    return 'jsonl' if file_format in ('json', 'ndjson') else file_format
+
+
+class JournalImporter:
+    """
+    Importación masiva del Libro Diario.
+    Valida cada asiento en memoria (cuentas precargadas, partida doble) y escribe
+    los válidos por lotes con bulk_create. Cada lote es su propia transacción,
+    de modo que un asiento inválido no bloquea al resto: se reporta por fila.
+    Si la BD rechaza un lote, sus asientos se reintentan uno a uno, cada uno en
+    su savepoint, y solo se reportan los que fallan de verdad.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, created_by=None):
+        self.chunk_size = max(1, int(chunk_size))
+        self.created_by = created_by
+        # Mapa código -> (id, tipo), cargado una sola vez
+        self.accounts = {
+            code: (account_id, account_type)
+            for code, account_id, account_type in Account.objects.values_list('code', 'id', 'account_type')
+        }
+        self.closed_periods = list(
+            FiscalPeriod.objects.filter(status='Closed').values_list('name', 'start_date', 'end_date')
+        )
+        self.entries_created = 0
+        self.lines_created = 0
+        self.errors = []
+
+    def run(self, entries):
+        """
+        `entries` es el iterable producido por read_csv_entries / read_jsonl_entries.
+        """
+        chunk = []
+        for row_number, ref, header, lines in entries:
+            if header is None:
+                # El lector ya detectó un error de formato
+                self.errors.append({'row': row_number, 'entry': ref, 'errors': [lines]})
+                continue
+
+            parsed, errors = self.validate(header, lines)
+            if errors:
+                self.errors.append({'row': row_number, 'entry': ref, 'errors': errors})
+                continue
+
+            chunk.append((row_number, ref, parsed))
+            if len(chunk) >= self.chunk_size:
+                self.write(chunk)
+                chunk = []
+
+        if chunk:
+            self.write(chunk)
+        return self.report()
+
+    def validate(self, header, lines):
+        errors = []
+
+        entry_date = None
+        try:
+            entry_date = date.fromisoformat(str(header.get('date') or '').strip())
+        except ValueError:
+            errors.append(f"Fecha inválida '{header.get('date')}'. Use AAAA-MM-DD.")
+        for name, start, end in self.closed_periods:
+            if entry_date and start <= entry_date <= end:
+                errors.append(f"El periodo fiscal '{name}' está cerrado.")
+
+        description = str(header.get('description') or '').strip()
+        if not description:
+            errors.append("El asiento no tiene descripción.")
+
+        if len(lines) < 2:
+            errors.append("Un asiento de partida doble debe tener al menos dos líneas (Debe y Haber).")
+
+        items = []
+        total_debit = total_credit = Decimal('0')
+        for index, line in enumerate(lines, start=1):
+            code = str(line.get('account_code') or '').strip()
+            account_id, account_type = self.accounts.get(code, (None, None))
+            if account_id is None:
+                errors.append(f"Línea {index}: la cuenta '{code}' no existe.")
+
+            debit = self._amount(line.get('debit'), index, 'debit', errors)
+            credit = self._amount(line.get('credit'), index, 'credit', errors)
+            if debit is None or credit is None:
+                continue
+            if debit > 0 and credit > 0:
+                errors.append(f"Línea {index}: no puede tener Débito y Crédito a la vez.")
+            if debit == 0 and credit == 0:
+                errors.append(f"Línea {index}: debe tener un valor de Débito o Crédito.")
+
+            total_debit += debit
+            total_credit += credit
+            items.append({
+                'account_id': account_id,
+                'account_type': account_type,
+                'debit': debit,
+                'credit': credit,
+                'description': str(line.get('description') or '')[:255],
+            })
+
+        if not errors and total_debit != total_credit:
+            errors.append(f"El asiento no está balanceado: Débitos ({total_debit}) != Créditos ({total_credit})")
+
+        parsed = {'date': entry_date, 'description': description[:255], 'items': items}
+        return parsed, errors
+
+    @staticmethod
+    def _amount(value, index, field, errors):
+        if value in (None, ''):
+            return Decimal('0')
+        try:
+            amount = Decimal(str(value).strip())
+        except InvalidOperation:
+            errors.append(f"Línea {index}: '{field}' no es un número válido ({value}).")
+            return None
+        if not amount.is_finite() or amount < 0 or amount > MAX_AMOUNT or amount != amount.quantize(CENT):
+            errors.append(f"Línea {index}: '{field}' debe ser positivo, con máximo 2 decimales ({value}).")
+            return None
+        return amount
+
+    def write(self, chunk):
+        try:
+            self.save(chunk)
+        except Exception as e:
+            if len(chunk) == 1:
+                self.reject(chunk[0], e)
+                return
+            # Un fallo de BD invalida el lote completo: se reintenta asiento por asiento
+            for row in chunk:
+                try:
+                    self.save([row])
+                except Exception as e:
+                    self.reject(row, e)
+
+    def save(self, chunk):
+        """
+        Escribe un lote de asientos ya validados en su propia transacción (o savepoint).
+        """
+        with transaction.atomic():
+            entries = JournalEntry.objects.bulk_create([
+                JournalEntry(date=parsed['date'], description=parsed['description'], created_by=self.created_by)
+                for _, _, parsed in chunk
+            ])
+            batch = []
+            all_items = []
+            for entry, (_, _, parsed) in zip(entries, chunk):
+                items = [
+                    JournalItem(journal_entry=entry, entry_date=entry.date, **item)
+                    for item in parsed['items']
+                ]
+                batch.append((entry, items))
+                all_items.extend(items)
+
+            JournalItem.objects.bulk_create(all_items, batch_size=self.chunk_size)
+            post_journal_entries(batch)
+
+        self.entries_created += len(entries)
+        self.lines_created += len(all_items)
+
+    def reject(self, row, error):
+        row_number, ref, _ = row
+        self.errors.append({'row': row_number, 'entry': ref, 'errors': [f"Error al guardar el asiento: {error}"]})
+
+    def report(self):
+        return {
+            'entries_created': self.entries_created,
+            'lines_created': self.lines_created,
+            'entries_rejected': len(self.errors),
+            'errors': self.errors,
+        }
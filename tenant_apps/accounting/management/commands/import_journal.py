@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from accounting.importers import JournalImporter, READERS, DEFAULT_CHUNK_SIZE, detect_format
+
+
+class Command(BaseCommand):
+    """
+    Importa asientos históricos desde un CSV/JSONL en streaming.
+        python manage.py tenant_command import_journal diario_2023.csv --schema=<esquema>
+    """
+    help = "Importa asientos contables masivamente desde un archivo CSV o JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Ruta del archivo a importar.")
+        parser.add_argument('--format', dest='file_format', choices=sorted(READERS), help="Por defecto, según la extensión.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Asientos por lote (bulk_create).")
+        parser.add_argument('--username', help="Usuario que figurará como creador de los asientos.")
+
+    def handle(self, *args, **options):
+        file_format = detect_format(options['path'], options['file_format'])
+        if file_format not in READERS:
+            raise CommandError(f"Formato '{file_format}' no soportado. Use csv o jsonl.")
+
+        created_by = None
+        if options['username']:
+            try:
+                created_by = get_user_model().objects.get(username=options['username'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"El usuario '{options['username']}' no existe.")
+
+        importer = JournalImporter(chunk_size=options['chunk_size'], created_by=created_by)
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            report = importer.run(READERS[file_format](stream))
+
+        for error in report['errors']:
+            self.stdout.write(f"Fila {error['row']} ({error['entry'] or 's/ref'}): {'; '.join(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Asientos creados: {report['entries_created']} | Líneas: {report['lines_created']} | "
+            f"Rechazados: {report['entries_rejected']}"
+        ))
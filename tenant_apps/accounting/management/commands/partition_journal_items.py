@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounting.partitioning import partition_journal_items, ensure_year_partitions, existing_partitions
+
+
+class Command(BaseCommand):
+    """
+    Convierte las líneas de asiento en una tabla particionada por año (opcional).
+    Al ser una app de inquilino se ejecuta por esquema:
+        python manage.py tenant_command partition_journal_items --schema=<esquema>
+        python manage.py all_tenants_command partition_journal_items
+    Es idempotente: si la tabla ya está particionada solo crea los años que falten.
+    """
+    help = "Particiona accounting_journalitem por año (RANGE sobre entry_date)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years-ahead',
+            type=int,
+            default=1,
+            help="Años futuros para los que se crean particiones (por defecto 1)."
+        )
+
+    def handle(self, *args, **options):
+        years_ahead = max(0, options['years_ahead'])
+
+        if partition_journal_items(extra_years=years_ahead):
+            self.stdout.write(self.style.SUCCESS("Libro Diario convertido a tabla particionada."))
+        else:
+            year = timezone.now().year
+            created = ensure_year_partitions(range(year, year + years_ahead + 1))
+            self.stdout.write(f"La tabla ya estaba particionada. Particiones nuevas: {len(created)}.")
+
+        self.stdout.write(", ".join(sorted(existing_partitions())))
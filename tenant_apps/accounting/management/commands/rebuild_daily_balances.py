@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounting.services import rebuild_daily_balances, verify_daily_balances
+
+
+class Command(BaseCommand):
+    """
+    Reconstruye o verifica los saldos diarios (AccountDailyBalance) desde el Libro Diario.
+    Al ser una app de inquilino se ejecuta por esquema:
+        python manage.py tenant_command rebuild_daily_balances --schema=<esquema>
+        python manage.py all_tenants_command rebuild_daily_balances --verify
+    """
+    help = "Reconstruye (o verifica con --verify) la tabla de saldos diarios por cuenta."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help="Solo compara los saldos con el Libro Diario, sin modificar nada."
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = verify_daily_balances()
+            for row in mismatches:
+                self.stdout.write(
+                    f"Cuenta {row['account_id']} | {row['date']} | "
+                    f"esperado {row['expected']} | guardado {row['stored']}"
+                )
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} saldos diarios no cuadran con el Libro Diario.")
+            self.stdout.write(self.style.SUCCESS("Los saldos diarios cuadran con el Libro Diario."))
+            return
+
+        rows = rebuild_daily_balances()
+        self.stdout.write(self.style.SUCCESS(f"Saldos diarios reconstruidos: {rows} filas."))
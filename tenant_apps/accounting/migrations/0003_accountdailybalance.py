@@ -0,0 +1,42 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=16)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=16)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='accounting.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='acc_dailybal_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='accountdailybalance',
+            constraint=models.UniqueConstraint(fields=('account', 'date'), name='acc_dailybal_account_date_uniq'),
+        ),
+        # Carga inicial de los saldos diarios a partir del Libro Diario existente
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO accounting_accountdailybalance (account_id, date, debit_total, credit_total)
+                SELECT i.account_id, e.date, SUM(i.debit), SUM(i.credit)
+                FROM accounting_journalitem i
+                JOIN accounting_journalentry e ON e.id = i.journal_entry_id
+                GROUP BY i.account_id, e.date
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0003_accountdailybalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='accounting.account')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='accounting.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'ancestor'], name='acc_closure_desc_anc_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='accountclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='acc_closure_anc_desc_uniq'),
+        ),
+        # Carga inicial de la tabla de cierre a partir del árbol existente (parent)
+        migrations.RunSQL(
+            sql="""
+                WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+                    SELECT id, id, 0 FROM accounting_account
+                    UNION ALL
+                    SELECT tree.ancestor_id, child.id, tree.depth + 1
+                    FROM tree
+                    JOIN accounting_account child ON child.parent_id = tree.descendant_id
+                )
+                INSERT INTO accounting_accountclosure (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, descendant_id, depth FROM tree
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounting', '0004_accountclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FiscalPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('status', models.CharField(choices=[('Open', 'Abierto'), ('Closed', 'Cerrado')], default='Open', max_length=10)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closed_fiscal_periods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['start_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodClosingBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=16)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=16)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='closing_balances', to='accounting.account')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closing_balances', to='accounting.fiscalperiod')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='periodclosingbalance',
+            constraint=models.UniqueConstraint(fields=('period', 'account'), name='acc_closing_period_account_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='fiscalperiod',
+            constraint=models.CheckConstraint(check=models.Q(('start_date__lte', models.F('end_date'))), name='acc_fiscalperiod_dates_check'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0005_fiscalperiod'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['date', 'id'], name='acc_entry_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:23
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_denormalized(apps, schema_editor):
+    """
+    Rellena entry_date y account_type por rangos de id. La migración no es atómica,
+    así que cada lote se confirma por separado y solo bloquea sus propias filas.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT MIN(id), MAX(id) FROM accounting_journalitem")
+        min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            return
+        for start in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                """
+                UPDATE accounting_journalitem i
+                SET entry_date = e.date, account_type = a.account_type
+                FROM accounting_journalentry e, accounting_account a
+                WHERE e.id = i.journal_entry_id AND a.id = i.account_id
+                  AND i.id >= %s AND i.id < %s
+                """,
+                [start, start + BACKFILL_BATCH_SIZE],
+            )
+
+
+class Migration(migrations.Migration):
+    # Lotes confirmados uno a uno e índices CONCURRENTLY: no se bloquea la escritura
+    atomic = False
+
+    dependencies = [
+        ('accounting', '0006_journalentry_date_id_index'),
+    ]
+
+    operations = [
+        # Columnas NULL sin default: agregarlas no reescribe la tabla
+        migrations.AddField(
+            model_name='journalitem',
+            name='account_type',
+            field=models.CharField(choices=[('ASSET', 'Activo'), ('LIABILITY', 'Pasivo'), ('EQUITY', 'Patrimonio'), ('REVENUE', 'Ingreso'), ('EXPENSE', 'Gasto')], editable=False, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='journalitem',
+            name='entry_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_denormalized, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='journalitem',
+            index=models.Index(fields=['account_type', 'entry_date'], include=('debit', 'credit'), name='acc_item_type_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='journalitem',
+            index=models.Index(fields=['account', 'entry_date'], include=('debit', 'credit'), name='acc_item_account_date_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from .versioning import bump_ledger_version
 
 class Account(models.Model):
     """
@@ -14,6 +15,8 @@ class Account(models.Model):
         ('REVENUE', 'Ingreso'),
         ('EXPENSE', 'Gasto'),
     ]
+    # Tipos de naturaleza deudora: su saldo es Debe - Haber (el resto, Haber - Debe)
+    DEBIT_NATURE_TYPES = ('ASSET', 'EXPENSE')
 
     name = models.CharField(max_length=100)
     # El código contable (ej: "110-001" para Bancos)
@@ -32,10 +35,94 @@ class Account(models.Model):
     def __str__(self):
         return f"{self.code} - {self.name}"
 
+    def clean(self):
+        # Evita ciclos: una cuenta no puede colgar de sí misma ni de una subcuenta suya
+        if self.pk and self.parent_id and AccountClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError("Una cuenta no puede tener como padre a una de sus subcuentas.")
+
+    def save(self, *args, **kwargs):
+        # Mantiene la tabla de cierre (AccountClosure) sincronizada con el árbol
+        is_new = self.pk is None
+        old_parent_id = old_type = None
+        if not is_new:
+            old_parent_id, old_type = Account.objects.filter(pk=self.pk).values_list(
+                'parent_id', 'account_type'
+            ).first() or (None, None)
+
+        with transaction.atomic():
+            if not is_new and old_parent_id != self.parent_id:
+                self.clean()
+            super().save(*args, **kwargs)
+
+            if is_new:
+                AccountClosure.insert_node(self)
+            elif old_parent_id != self.parent_id:
+                AccountClosure.move_subtree(self)
+
+            # Copia desnormalizada del tipo en las líneas de asiento
+            if not is_new and old_type != self.account_type:
+                JournalItem.objects.filter(account=self).update(account_type=self.account_type)
+            # El Plan de Cuentas forma parte de los reportes cacheados
+            bump_ledger_version()
+
+    def delete(self, *args, **kwargs):
+        bump_ledger_version()
+        return super().delete(*args, **kwargs)
+
     class Meta:
         ordering = ['code'] # Ordena las cuentas por su código
 
 
+class AccountClosure(models.Model):
+    """
+    Tabla de cierre (closure table) del Plan de Cuentas.
+    Guarda un registro por cada par ancestro/descendiente (incluida la propia cuenta
+    con depth=0), para consultar un subárbol completo con un solo JOIN.
+    """
+    ancestor = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+    @classmethod
+    def insert_node(cls, account):
+        links = [cls(ancestor=account, descendant=account, depth=0)]
+        if account.parent_id:
+            links += [
+                cls(ancestor_id=link.ancestor_id, descendant=account, depth=link.depth + 1)
+                for link in cls.objects.filter(descendant_id=account.parent_id)
+            ]
+        cls.objects.bulk_create(links)
+
+    @classmethod
+    def move_subtree(cls, account):
+        subtree = list(cls.objects.filter(ancestor_id=account.pk).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+        # 1. Desconectar el subárbol de sus antiguos ancestros
+        cls.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+        # 2. Conectarlo bajo los ancestros del nuevo padre
+        if account.parent_id:
+            cls.objects.bulk_create([
+                cls(ancestor_id=link.ancestor_id, descendant_id=descendant_id, depth=link.depth + depth + 1)
+                for link in cls.objects.filter(descendant_id=account.parent_id)
+                for descendant_id, depth in subtree
+            ])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='acc_closure_anc_desc_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'ancestor'], name='acc_closure_desc_anc_idx'),
+        ]
+
+
 class JournalEntry(models.Model):
     """
     La cabecera de un Asiento Contable (Libro Diario).
@@ -55,7 +142,27 @@ class JournalEntry(models.Model):
     def __str__(self):
         return f"Asiento #{self.id} - {self.date} - {self.description}"
 
-    
+    def clean(self):
+        # No se puede contabilizar ni mover asientos dentro de un periodo cerrado
+        dates = [self.date]
+        if self.pk:
+            dates += list(JournalEntry.objects.filter(pk=self.pk).values_list('date', flat=True))
+        closed = FiscalPeriod.closed_for(dates)
+        if closed:
+            raise ValidationError(f"El periodo fiscal '{closed.name}' está cerrado.")
+
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        super().save(*args, **kwargs)
+        # Copia desnormalizada de la fecha en las líneas de asiento
+        if not is_new:
+            self.items.exclude(entry_date=self.date).update(entry_date=self.date)
+
+    class Meta:
+        indexes = [
+            # Paginación keyset del Libro Diario (date, id)
+            models.Index(fields=['date', 'id'], name='acc_entry_date_id_idx'),
+        ]
 
 
 class JournalItem(models.Model):
@@ -76,6 +183,12 @@ class JournalItem(models.Model):
     credit = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
     description = models.CharField(max_length=255, blank=True)
 
+    # Copias desnormalizadas de JournalEntry.date y Account.account_type, para que los
+    # reportes filtren por fecha y tipo sin JOIN. Se mantienen al escribir (save,
+    # rutas bulk de services/importers, JournalEntry.save y Account.save).
+    entry_date = models.DateField(null=True, editable=False)
+    account_type = models.CharField(max_length=10, choices=Account.ACCOUNT_TYPE_CHOICES, null=True, editable=False)
+
     def __str__(self):
         if self.debit > 0:
             return f"{self.account.name} | Debe: {self.debit}"
@@ -86,4 +199,136 @@ class JournalItem(models.Model):
         if self.debit > 0 and self.credit > 0:
             raise ValidationError("Una línea de asiento no puede tener Débito y Crédito a la vez.")
         if self.debit == 0 and self.credit == 0:
-            raise ValidationError("Una línea de asiento debe tener un valor de Débito o Crédito.")
\ No newline at end of file
+            raise ValidationError("Una línea de asiento debe tener un valor de Débito o Crédito.")
+
+    def denormalize(self):
+        """
+        Copia la fecha del asiento y el tipo de cuenta. bulk_create no llama a save(),
+        así que las rutas masivas deben llamarlo antes de insertar.
+        """
+        self.entry_date = self.journal_entry.date
+        self.account_type = self.account.account_type
+        return self
+
+    def save(self, *args, **kwargs):
+        self.denormalize()
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            # Índices de cobertura: los agregados por tipo/cuenta y fecha se resuelven
+            # con index-only scans, sin leer la tabla ni hacer JOIN.
+            models.Index(fields=['account_type', 'entry_date'], include=['debit', 'credit'], name='acc_item_type_date_idx'),
+            models.Index(fields=['account', 'entry_date'], include=['debit', 'credit'], name='acc_item_account_date_idx'),
+        ]
+
+class AccountDailyBalance(models.Model):
+    """
+    Totales de Debe/Haber por cuenta y por día.
+    Se actualiza en la misma transacción en la que se contabiliza cada asiento,
+    así los reportes agregan esta tabla en lugar de todo el Libro Diario.
+    """
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name='daily_balances'
+    )
+    date = models.DateField()
+    debit_total = models.DecimalField(max_digits=16, decimal_places=2, default=0.00)
+    credit_total = models.DecimalField(max_digits=16, decimal_places=2, default=0.00)
+
+    def __str__(self):
+        return f"{self.account.code} | {self.date} | D: {self.debit_total} H: {self.credit_total}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='acc_dailybal_account_date_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='acc_dailybal_date_idx'),
+        ]
+
+
+
+class FiscalPeriod(models.Model):
+    """
+    Periodo fiscal (mes, trimestre o año) que puede cerrarse.
+    Al cerrarlo se congelan los saldos acumulados de cada cuenta
+    (PeriodClosingBalance) y se bloquea contabilizar dentro de sus fechas.
+    """
+    STATUS_CHOICES = [
+        ('Open', 'Abierto'),
+        ('Closed', 'Cerrado'),
+    ]
+
+    name = models.CharField(max_length=50, unique=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Open')
+    closed_at = models.DateTimeField(null=True, blank=True)
+    closed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='closed_fiscal_periods'
+    )
+
+    def __str__(self):
+        return f"{self.name} ({self.start_date} - {self.end_date}) [{self.get_status_display()}]"
+
+    def clean(self):
+        if self.start_date and self.end_date:
+            if self.start_date > self.end_date:
+                raise ValidationError("La fecha inicial no puede ser posterior a la final.")
+            overlapping = FiscalPeriod.objects.filter(
+                start_date__lte=self.end_date, end_date__gte=self.start_date
+            ).exclude(pk=self.pk)
+            if overlapping.exists():
+                raise ValidationError("El periodo se solapa con otro periodo fiscal.")
+
+    @classmethod
+    def closed_for(cls, dates):
+        """
+        Primer periodo cerrado que contiene alguna de las fechas dadas (o None).
+        """
+        dates = [d for d in set(dates) if d]
+        if not dates:
+            return None
+        query = models.Q()
+        for day in dates:
+            query |= models.Q(start_date__lte=day, end_date__gte=day)
+        return cls.objects.filter(query, status='Closed').first()
+
+    @classmethod
+    def last_closed_before(cls, day):
+        """
+        Último periodo cerrado que termina antes de `day`: su foto de saldos
+        sirve de punto de partida para los reportes.
+        """
+        return cls.objects.filter(status='Closed', end_date__lt=day).order_by('-end_date').first()
+
+    class Meta:
+        ordering = ['start_date']
+        constraints = [
+            models.CheckConstraint(check=models.Q(start_date__lte=models.F('end_date')), name='acc_fiscalperiod_dates_check'),
+        ]
+
+
+class PeriodClosingBalance(models.Model):
+    """
+    Foto (snapshot) de los totales acumulados de Debe/Haber de una cuenta
+    al cierre de un periodo fiscal, desde el inicio de la contabilidad.
+    """
+    period = models.ForeignKey(FiscalPeriod, on_delete=models.CASCADE, related_name='closing_balances')
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='closing_balances')
+    debit_total = models.DecimalField(max_digits=16, decimal_places=2, default=0.00)
+    credit_total = models.DecimalField(max_digits=16, decimal_places=2, default=0.00)
+
+    def __str__(self):
+        return f"{self.period.name} | {self.account.code} | D: {self.debit_total} H: {self.credit_total}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'account'], name='acc_closing_period_account_uniq'),
+        ]
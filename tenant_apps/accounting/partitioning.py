@@ -0,0 +1,170 @@
+"""
+Particionado declarativo (PostgreSQL) de las líneas de asiento por año.
+
+Es opcional y se aplica por esquema de tenant con el comando
+`partition_journal_items`. Tras la conversión, accounting_journalitem es una tabla
+particionada por RANGE (entry_date) con una partición por año más una DEFAULT,
+y las consultas filtradas por entry_date solo leen las particiones del rango.
+
+Notas:
+- La PK física pasa a ser (id, entry_date): PostgreSQL exige que las claves únicas
+  incluyan la columna de partición. Para el ORM `id` sigue siendo la PK y su
+  unicidad la garantiza la secuencia.
+- AddIndexConcurrently no funciona sobre tablas particionadas: los índices nuevos
+  de JournalItem deben crearse con AddIndex normal.
+"""
+from datetime import date
+from django.db import connection, transaction
+from .models import JournalItem
+
+DEFAULT_PARTITION_SUFFIX = 'default'
+
+
+def _table():
+    return JournalItem._meta.db_table
+
+
+def partition_name(year):
+    return f"{_table()}_y{year}"
+
+
+def is_partitioned(table=None):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relkind = 'p' FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relname = %s AND n.nspname = current_schema()",
+            [table or _table()]
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def existing_partitions():
+    """
+    Nombres de las particiones de la tabla en el esquema actual.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "JOIN pg_namespace n ON n.oid = p.relnamespace "
+            "WHERE p.relname = %s AND n.nspname = current_schema()",
+            [_table()]
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _create_year_partition(cursor, year):
+    table = connection.ops.quote_name(_table())
+    cursor.execute(
+        f"CREATE TABLE {connection.ops.quote_name(partition_name(year))} PARTITION OF {table} "
+        f"FOR VALUES FROM (%s) TO (%s)",
+        [date(year, 1, 1), date(year + 1, 1, 1)]
+    )
+
+
+def partition_journal_items(extra_years=1):
+    """
+    Convierte accounting_journalitem del esquema actual en tabla particionada por año.
+    Crea particiones desde el primer año con datos hasta el año actual + `extra_years`.
+    Todo ocurre en una transacción con la tabla bloqueada; devuelve False si ya
+    estaba particionada.
+    """
+    if is_partitioned():
+        return False
+
+    table = _table()
+    quote = connection.ops.quote_name
+    quoted = quote(table)
+    legacy_name = f"{table}_legacy"
+    sequence_name = f"{table}_part_id_seq"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quoted} IN ACCESS EXCLUSIVE MODE")
+        # Las FKs de Django son DEFERRABLE: se validan ya para poder borrar la tabla vieja
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        # La clave de partición no puede ser NULL (filas previas al backfill)
+        cursor.execute(
+            f"UPDATE {quoted} i SET entry_date = e.date, account_type = a.account_type "
+            f"FROM accounting_journalentry e, accounting_account a "
+            f"WHERE e.id = i.journal_entry_id AND a.id = i.account_id "
+            f"AND (i.entry_date IS NULL OR i.account_type IS NULL)"
+        )
+
+        # Índices (salvo la PK) y FKs/CHECKs a recrear con los mismos nombres
+        cursor.execute(
+            "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = %s::regclass AND NOT indisprimary",
+            [table]
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('f', 'c')",
+            [table]
+        )
+        constraints = cursor.fetchall()
+
+        cursor.execute(f"SELECT MIN(entry_date), COALESCE(MAX(id), 0) FROM {quoted}")
+        first_date, max_id = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {quoted} RENAME TO {quote(legacy_name)}")
+        cursor.execute(
+            f"CREATE TABLE {quoted} (LIKE {quote(legacy_name)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (entry_date)"
+        )
+        cursor.execute(f"ALTER TABLE {quoted} ALTER COLUMN entry_date SET NOT NULL")
+        cursor.execute(f"ALTER TABLE {quoted} ADD PRIMARY KEY (id, entry_date)")
+
+        # Secuencia propia que continúa donde iba la columna identity original
+        cursor.execute(f"CREATE SEQUENCE {quote(sequence_name)} START WITH {max_id + 1} OWNED BY {quoted}.id")
+        cursor.execute(f"ALTER TABLE {quoted} ALTER COLUMN id SET DEFAULT nextval('{sequence_name}')")
+
+        first_year = first_date.year if first_date else date.today().year
+        for year in range(first_year, date.today().year + extra_years + 1):
+            _create_year_partition(cursor, year)
+        cursor.execute(f"CREATE TABLE {quote(f'{table}_{DEFAULT_PARTITION_SUFFIX}')} PARTITION OF {quoted} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {quoted} SELECT * FROM {quote(legacy_name)}")
+        cursor.execute(f"DROP TABLE {quote(legacy_name)}")
+
+        for definition in index_defs:
+            cursor.execute(definition)
+        for name, definition in constraints:
+            cursor.execute(f"ALTER TABLE {quoted} ADD CONSTRAINT {quote(name)} {definition}")
+        cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+    return True
+
+
+def ensure_year_partitions(years):
+    """
+    Crea las particiones anuales que falten (sin efecto si la tabla no está particionada).
+    Las filas de esos años que hubieran caído en la partición DEFAULT se mueven a la nueva.
+    """
+    if not is_partitioned():
+        return []
+
+    table = connection.ops.quote_name(_table())
+    default = connection.ops.quote_name(f"{_table()}_{DEFAULT_PARTITION_SUFFIX}")
+    existing = existing_partitions()
+    created = []
+    for year in sorted(set(years)):
+        if partition_name(year) in existing:
+            continue
+        bounds = [date(year, 1, 1), date(year + 1, 1, 1)]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE journalitem_moved AS "
+                f"SELECT * FROM {default} WHERE entry_date >= %s AND entry_date < %s",
+                bounds
+            )
+            cursor.execute(f"DELETE FROM {default} WHERE entry_date >= %s AND entry_date < %s", bounds)
+            _create_year_partition(cursor, year)
+            cursor.execute(f"INSERT INTO {table} SELECT * FROM journalitem_moved")
+            cursor.execute("DROP TABLE journalitem_moved")
+        created.append(partition_name(year))
+    return created
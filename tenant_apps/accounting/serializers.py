@@ -1,6 +1,7 @@
 from rest_framework import serializers
-from .models import Account, JournalEntry, JournalItem
-from django.db import transaction
+from django.core.exceptions import ValidationError as DjangoValidationError
+from .models import Account, AccountClosure, JournalEntry, JournalItem, FiscalPeriod
+from .services import create_journal_entry
 
 class AccountSerializer(serializers.ModelSerializer):
     """
@@ -10,6 +11,14 @@ class AccountSerializer(serializers.ModelSerializer):
         model = Account
         fields = ['id', 'name', 'code', 'account_type', 'parent', 'description']
 
+    def validate_parent(self, parent):
+        # Un movimiento no puede dejar a la cuenta colgando de su propio subárbol
+        if parent and self.instance and AccountClosure.objects.filter(
+            ancestor=self.instance, descendant=parent
+        ).exists():
+            raise serializers.ValidationError("Una cuenta no puede tener como padre a una de sus subcuentas.")
+        return parent
+
 class JournalItemSerializer(serializers.ModelSerializer):
     """
     Serializer para una línea de un asiento contable (Debe/Haber).
@@ -20,7 +29,7 @@ class JournalItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = JournalItem
         # Excluimos 'journal_entry' porque será manejado por el serializer padre
-        exclude = ['journal_entry']
+        exclude = ['journal_entry', 'entry_date', 'account_type']
 
     def validate(self, data):
         # Llama a la validación del modelo que escribimos
@@ -46,6 +55,14 @@ class JournalEntrySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'created_by']
 
+    def validate_date(self, value):
+        # Bloqueo de periodos cerrados (también para mover un asiento fuera de uno)
+        dates = [value] + ([self.instance.date] if self.instance else [])
+        closed = FiscalPeriod.closed_for(dates)
+        if closed:
+            raise serializers.ValidationError(f"El periodo fiscal '{closed.name}' está cerrado.")
+        return value
+
     def validate_items(self, items):
         """
         Valida la lista de items.
@@ -74,7 +91,6 @@ class JournalEntrySerializer(serializers.ModelSerializer):
                 )
         return data
 
-    @transaction.atomic
     def create(self, validated_data):
         """
         Sobrescribe el método 'create' para manejar la creación anidada.
@@ -82,12 +98,37 @@ class JournalEntrySerializer(serializers.ModelSerializer):
         # 1. Extraer los datos de los items
         items_data = validated_data.pop('items')
 
-        # 2. Crear la cabecera del Asiento (JournalEntry)
+        # 2. Crear cabecera + líneas y actualizar los saldos diarios
         # El 'created_by' se añadirá en el ViewSet
-        entry = JournalEntry.objects.create(**validated_data)
+        return create_journal_entry(lines=items_data, **validated_data)
+
 
-        # 3. Crear cada línea de Item enlazada al Asiento
-        for item_data in items_data:
-            JournalItem.objects.create(journal_entry=entry, **item_data)
 
-        return entry
\ No newline at end of file
+class FiscalPeriodSerializer(serializers.ModelSerializer):
+    """
+    Serializer para los Periodos Fiscales. El estado solo cambia con close/reopen.
+    """
+    closed_by_username = serializers.CharField(source='closed_by.username', read_only=True, allow_null=True)
+
+    class Meta:
+        model = FiscalPeriod
+        fields = ['id', 'name', 'start_date', 'end_date', 'status', 'closed_at', 'closed_by_username']
+        read_only_fields = ['status', 'closed_at']
+
+    def validate(self, data):
+        instance = FiscalPeriod(**{**self._current_values(), **data})
+        try:
+            instance.clean()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+        return data
+
+    def _current_values(self):
+        if not self.instance:
+            return {}
+        return {
+            'pk': self.instance.pk,
+            'name': self.instance.name,
+            'start_date': self.instance.start_date,
+            'end_date': self.instance.end_date,
+        }
@@ -0,0 +1,437 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import connection, transaction
+from django.db.models import Sum, Q, F, Value, DecimalField, FilteredRelation, OuterRef, Subquery, Window
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError, NotFound
+from stward_erp.pagination import encode_cursor, decode_cursor, keyset_filter
+from .models import (
+    Account, JournalEntry, JournalItem, AccountDailyBalance, FiscalPeriod, PeriodClosingBalance,
+)
+from .versioning import bump_ledger_version
+
+
+def create_journal_entry(date, description, lines, created_by=None):
+    """
+    Crea un asiento completo (cabecera + líneas) y lo contabiliza.
+    `lines` es una lista de dicts con los campos de JournalItem
+    (account, debit, credit, description).
+    Lanza ValidationError si Débitos != Créditos, comparando los importes
+    redondeados a centavos como los guarda JournalItem.
+    """
+    debits = sum(_cents(line.get('debit')) for line in lines)
+    credits = sum(_cents(line.get('credit')) for line in lines)
+    if debits != credits:
+        raise ValidationError(f"El asiento no está balanceado: Débitos ({debits}) != Créditos ({credits})")
+
+    with transaction.atomic():
+        entry = JournalEntry.objects.create(
+            date=date,
+            description=description,
+            created_by=created_by
+        )
+        items = JournalItem.objects.bulk_create(
+            [JournalItem(journal_entry=entry, **line).denormalize() for line in lines]
+        )
+        post_journal_entry(entry, items)
+    return entry
+
+
+def _cents(value):
+    return Decimal(value or 0).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def post_journal_entry(entry, items=None):
+    """
+    Suma las líneas del asiento a los saldos diarios (AccountDailyBalance).
+    Debe llamarse dentro de la misma transacción que creó las líneas.
+    """
+    if items is None:
+        items = entry.items.all()
+    post_journal_entries([(entry, items)])
+
+
+def post_journal_entries(batch):
+    """
+    Versión por lotes de post_journal_entry: recibe pares (asiento, líneas)
+    y aplica todos los saldos diarios con un único INSERT ... ON CONFLICT.
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for entry, items in batch:
+        for item in items:
+            totals = deltas[(item.account_id, entry.date)]
+            totals[0] += Decimal(item.debit)
+            totals[1] += Decimal(item.credit)
+
+    _upsert_daily_balances(
+        (account_id, date, debit, credit)
+        for (account_id, date), (debit, credit) in deltas.items()
+    )
+    # Se valida DESPUÉS de escribir: ver close_fiscal_period
+    ensure_open_periods(date for _, date in deltas)
+    bump_ledger_version()
+
+
+def ensure_open_periods(dates):
+    """
+    Bloqueo de periodos: lanza ValidationError si alguna fecha cae en un periodo cerrado.
+    """
+    closed = FiscalPeriod.closed_for(dates)
+    if closed:
+        raise ValidationError(f"El periodo fiscal '{closed.name}' está cerrado. No se puede contabilizar en él.")
+
+
+def _upsert_daily_balances(rows):
+    """
+    INSERT ... ON CONFLICT que incrementa los totales existentes.
+    Las filas se ordenan por (cuenta, fecha) para que dos asientos concurrentes
+    bloqueen los saldos siempre en el mismo orden (sin deadlocks).
+    """
+    rows = sorted(rows)
+    if not rows:
+        return
+
+    table = connection.ops.quote_name(AccountDailyBalance._meta.db_table)
+    placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+    params = [value for row in rows for value in row]
+    sql = (
+        f"INSERT INTO {table} (account_id, date, debit_total, credit_total) "
+        f"VALUES {placeholders} "
+        f"ON CONFLICT (account_id, date) DO UPDATE SET "
+        f"debit_total = {table}.debit_total + EXCLUDED.debit_total, "
+        f"credit_total = {table}.credit_total + EXCLUDED.credit_total"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def ledger_keys(entry_ids):
+    """
+    Pares (cuenta, fecha) afectados por los asientos indicados, leídos de la BD.
+    Se usan para recalcular los saldos cuando un asiento se edita o se elimina.
+    """
+    return set(
+        JournalItem.objects.filter(journal_entry_id__in=entry_ids)
+        .values_list('account_id', 'entry_date')
+        .distinct()
+    )
+
+
+def refresh_daily_balances(keys):
+    """
+    Recalcula desde el Libro Diario los saldos de los pares (cuenta, fecha) dados.
+    Es la ruta lenta pero exacta, usada en ediciones y borrados.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return
+
+    with transaction.atomic():
+        account_ids = {account_id for account_id, _ in keys}
+        dates = {date for _, date in keys}
+
+        totals = {
+            (row['account_id'], row['entry_date']): row
+            for row in JournalItem.objects.filter(
+                account_id__in=account_ids,
+                entry_date__in=dates
+            ).values('account_id', 'entry_date').annotate(
+                debit_total=Sum('debit'), credit_total=Sum('credit')
+            )
+        }
+
+        for account_id, date in keys:
+            row = totals.get((account_id, date))
+            if row is None:
+                AccountDailyBalance.objects.filter(account_id=account_id, date=date).delete()
+                continue
+            AccountDailyBalance.objects.update_or_create(
+                account_id=account_id,
+                date=date,
+                defaults={
+                    'debit_total': row['debit_total'],
+                    'credit_total': row['credit_total'],
+                }
+            )
+
+        ensure_open_periods(dates)
+        bump_ledger_version()
+
+
+def rebuild_daily_balances():
+    """
+    Reconstruye por completo la tabla de saldos diarios desde el Libro Diario.
+    """
+    balance_table = connection.ops.quote_name(AccountDailyBalance._meta.db_table)
+    item_table = connection.ops.quote_name(JournalItem._meta.db_table)
+
+    # Sin JOIN: la fecha va desnormalizada en la línea (índice account, entry_date)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {balance_table}")
+        cursor.execute(
+            f"INSERT INTO {balance_table} (account_id, date, debit_total, credit_total) "
+            f"SELECT account_id, entry_date, SUM(debit), SUM(credit) "
+            f"FROM {item_table} "
+            f"GROUP BY account_id, entry_date"
+        )
+        bump_ledger_version()
+        return cursor.rowcount
+
+
+def verify_daily_balances():
+    """
+    Compara los saldos diarios con el Libro Diario.
+    Devuelve la lista de diferencias (vacía si todo cuadra).
+    """
+    expected = {
+        (row['account_id'], row['entry_date']): (row['debit_total'], row['credit_total'])
+        for row in JournalItem.objects.values('account_id', 'entry_date').annotate(
+            debit_total=Sum('debit'), credit_total=Sum('credit')
+        )
+    }
+    stored = {
+        (row['account_id'], row['date']): (row['debit_total'], row['credit_total'])
+        for row in AccountDailyBalance.objects.values('account_id', 'date', 'debit_total', 'credit_total')
+    }
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        if expected.get(key) != stored.get(key):
+            account_id, date = key
+            mismatches.append({
+                'account_id': account_id,
+                'date': date,
+                'expected': expected.get(key),
+                'stored': stored.get(key),
+            })
+    return mismatches
+
+
+def account_tree(as_of=None):
+    """
+    Devuelve el Plan de Cuentas como árbol anidado, con Debe/Haber/Saldo
+    acumulados de cada cuenta y todas sus subcuentas.
+    Los acumulados salen de una sola consulta: AccountClosure + saldos diarios.
+    """
+    zero = Value(Decimal('0.00'), output_field=DecimalField())
+    balance_filter = None
+    if as_of:
+        balance_filter = Q(descendant_links__descendant__daily_balances__date__lte=as_of)
+
+    rows = Account.objects.annotate(
+        rolled_debit=Coalesce(
+            Sum('descendant_links__descendant__daily_balances__debit_total', filter=balance_filter), zero
+        ),
+        rolled_credit=Coalesce(
+            Sum('descendant_links__descendant__daily_balances__credit_total', filter=balance_filter), zero
+        ),
+    ).values(
+        'id', 'code', 'name', 'account_type', 'parent_id', 'rolled_debit', 'rolled_credit'
+    ).order_by('code')
+
+    nodes = {}
+    for row in rows:
+        debit, credit = row.pop('rolled_debit'), row.pop('rolled_credit')
+        if row['account_type'] in Account.DEBIT_NATURE_TYPES:
+            balance = debit - credit
+        else:
+            balance = credit - debit
+        nodes[row['id']] = {**row, 'debit': debit, 'credit': credit, 'balance': balance, 'children': []}
+
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node['parent_id'])
+        (parent['children'] if parent else roots).append(node)
+    return roots
+
+
+
+def _zero():
+    return Value(Decimal('0.00'), output_field=DecimalField())
+
+
+def snapshot_ledger(until, before=None):
+    """
+    Punto de partida para agregar saldos sin recorrer toda la historia.
+    Toma el último cierre fiscal que termina antes de `before` (por defecto, hasta
+    `until` inclusive) y devuelve (queryset, cierre):
+      - el queryset de Account trae 'snapshot_debit'/'snapshot_credit' (foto del cierre)
+      - y la relación 'movements': los saldos diarios posteriores al cierre y hasta `until`.
+    """
+    snapshot = FiscalPeriod.last_closed_before(before or until + timedelta(days=1))
+
+    condition = Q(daily_balances__date__lte=until)
+    if snapshot:
+        condition &= Q(daily_balances__date__gt=snapshot.end_date)
+        closing = PeriodClosingBalance.objects.filter(period=snapshot, account=OuterRef('pk'))
+        snapshot_debit = Coalesce(Subquery(closing.values('debit_total')[:1]), _zero())
+        snapshot_credit = Coalesce(Subquery(closing.values('credit_total')[:1]), _zero())
+    else:
+        snapshot_debit = snapshot_credit = _zero()
+
+    queryset = Account.objects.annotate(
+        movements=FilteredRelation('daily_balances', condition=condition),
+        snapshot_debit=snapshot_debit,
+        snapshot_credit=snapshot_credit,
+    )
+    return queryset, snapshot
+
+
+def cumulative_balances(as_of):
+    """
+    Totales acumulados de Debe/Haber por cuenta hasta `as_of` (inclusive),
+    partiendo del último cierre: una sola consulta agrupada por cuenta.
+    """
+    queryset, snapshot = snapshot_ledger(as_of)
+    zero = _zero()
+    rows = queryset.annotate(
+        debit_total=Coalesce(Sum('movements__debit_total'), zero) + F('snapshot_debit'),
+        credit_total=Coalesce(Sum('movements__credit_total'), zero) + F('snapshot_credit'),
+    )
+    return rows, snapshot
+
+
+LEDGER_PAGE_SIZE = 100
+LEDGER_ORDERING = ('entry_date', 'id')
+
+
+def _natural_balance(account, debit, credit):
+    return debit - credit if account.account_type in Account.DEBIT_NATURE_TYPES else credit - debit
+
+
+def account_ledger(account, start_date=None, end_date=None, cursor=None, page_size=LEDGER_PAGE_SIZE):
+    """
+    Mayor de una cuenta con saldo corrido, paginado por keyset (entry_date, id).
+    El saldo corrido es un SUM() OVER (ORDER BY entry_date, id) calculado en la BD
+    sobre las líneas posteriores al cursor, más el saldo arrastrado en el propio
+    cursor: cualquier página cuesta lo mismo que la primera.
+    En la primera página el saldo inicial sale de los saldos acumulados antes de
+    `start_date` (último cierre fiscal + saldos diarios).
+    El cursor va firmado para esta cuenta y rango: el saldo arrastrado no se puede alterar.
+    """
+    scope = f"ledger:{account.pk}:{start_date}:{end_date}"
+    items = JournalItem.objects.filter(account=account)
+    if start_date:
+        items = items.filter(entry_date__gte=start_date)
+    if end_date:
+        items = items.filter(entry_date__lte=end_date)
+
+    if cursor:
+        position = decode_cursor(cursor, scope)
+        if not isinstance(position, list) or len(position) != 3:
+            raise NotFound("Cursor inválido.")
+        last_date, last_id, carried = position
+        items = items.filter(keyset_filter(LEDGER_ORDERING, [last_date, last_id]))
+        opening = Decimal(carried)
+    elif start_date:
+        rows, _ = cumulative_balances(start_date - timedelta(days=1))
+        totals = rows.filter(pk=account.pk).values('debit_total', 'credit_total').get()
+        opening = _natural_balance(account, totals['debit_total'], totals['credit_total'])
+    else:
+        opening = Decimal('0.00')
+
+    if account.account_type in Account.DEBIT_NATURE_TYPES:
+        signed = F('debit') - F('credit')
+    else:
+        signed = F('credit') - F('debit')
+    rows = list(
+        items.annotate(
+            running=Window(
+                Sum(signed),
+                order_by=[F(field).asc() for field in LEDGER_ORDERING],
+                frame=RowRange(start=None, end=0),
+            )
+        ).order_by(*LEDGER_ORDERING).values(
+            'id', 'journal_entry_id', 'entry_date', 'journal_entry__description',
+            'description', 'debit', 'credit', 'running',
+        )[:page_size + 1]
+    )
+
+    has_next = len(rows) > page_size
+    movements = [{
+        'id': row['id'],
+        'entry_id': row['journal_entry_id'],
+        'date': row['entry_date'],
+        'entry_description': row['journal_entry__description'],
+        'description': row['description'],
+        'debit': row['debit'],
+        'credit': row['credit'],
+        'balance': opening + row['running'],
+    } for row in rows[:page_size]]
+
+    next_cursor = None
+    if has_next:
+        last = movements[-1]
+        next_cursor = encode_cursor([last['date'], last['id'], str(last['balance'])], scope)
+
+    return {
+        'account': {'id': account.id, 'code': account.code, 'name': account.name, 'account_type': account.account_type},
+        'start_date': start_date,
+        'end_date': end_date,
+        'opening_balance': opening,
+        'results': movements,
+        'next_cursor': next_cursor,
+    }
+
+
+def close_fiscal_period(period, user):
+    """
+    Cierra un periodo fiscal: congela los saldos acumulados de cada cuenta a su
+    fecha final y bloquea nuevas contabilizaciones dentro del periodo.
+    """
+    balance_table = connection.ops.quote_name(AccountDailyBalance._meta.db_table)
+
+    with transaction.atomic():
+        period = FiscalPeriod.objects.select_for_update().get(pk=period.pk)
+        if period.status == 'Closed':
+            raise ValidationError("Este periodo fiscal ya está cerrado.")
+        if FiscalPeriod.objects.filter(status='Open', end_date__lt=period.start_date).exists():
+            raise ValidationError("Debe cerrar primero los periodos fiscales anteriores.")
+
+        # Espera a que terminen los asientos en curso y frena los nuevos hasta el COMMIT.
+        # Como post_journal_entries valida el periodo DESPUÉS de escribir, todo asiento
+        # concurrente o bien queda en la foto, o bien ve el periodo cerrado y se revierte.
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {balance_table} IN SHARE MODE")
+
+        rows, _ = cumulative_balances(period.end_date)
+        PeriodClosingBalance.objects.bulk_create([
+            PeriodClosingBalance(
+                period=period,
+                account_id=row['id'],
+                debit_total=row['debit_total'],
+                credit_total=row['credit_total'],
+            )
+            for row in rows.values('id', 'debit_total', 'credit_total')
+            if row['debit_total'] or row['credit_total']
+        ])
+
+        period.status = 'Closed'
+        period.closed_at = timezone.now()
+        period.closed_by = user
+        period.save()
+        bump_ledger_version()
+    return period
+
+
+def reopen_fiscal_period(period):
+    """
+    Reabre el último periodo cerrado y descarta su foto de saldos.
+    """
+    with transaction.atomic():
+        period = FiscalPeriod.objects.select_for_update().get(pk=period.pk)
+        if period.status != 'Closed':
+            raise ValidationError("Este periodo fiscal no está cerrado.")
+        if FiscalPeriod.objects.filter(status='Closed', start_date__gt=period.start_date).exists():
+            raise ValidationError("Solo se puede reabrir el último periodo cerrado.")
+
+        period.closing_balances.all().delete()
+        period.status = 'Open'
+        period.closed_at = None
+        period.closed_by = None
+        period.save()
+        bump_ledger_version()
+    return period
@@ -0,0 +1,22 @@
+from celery import shared_task
+from django.utils import timezone
+from django_tenants.utils import schema_context
+from tenants.utils import tenant_schemas
+from .partitioning import ensure_year_partitions
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def ensure_journal_partitions():
+    """
+    Crea con antelación la partición del año siguiente en cada tenant con el
+    Libro Diario particionado (los demás se omiten).
+    """
+    year = timezone.now().year
+    for schema in tenant_schemas():
+        with schema_context(schema):
+            created = ensure_year_partitions([year, year + 1])
+        if created:
+            logger.info(f"Particiones creadas en {schema}: {', '.join(created)}")
@@ -1,3 +1,454 @@
-from django.test import TestCase
+import base64
+import io
+import json
+from datetime import date
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from rest_framework.exceptions import ValidationError as DRFValidationError
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.models import User
+from accounting.models import (
+    Account, AccountClosure, JournalEntry, JournalItem, AccountDailyBalance, FiscalPeriod, PeriodClosingBalance,
+)
+from accounting.serializers import JournalEntrySerializer
+from accounting.views import AccountViewSet, JournalEntryViewSet
+from accounting.partitioning import (
+    partition_journal_items, ensure_year_partitions, existing_partitions, is_partitioned,
+)
+from accounting.importers import JournalImporter, read_csv_entries, read_jsonl_entries
+from stward_erp.testing import business_queries, post_entry
+from accounting.services import (
+    create_journal_entry, ledger_keys, refresh_daily_balances,
+    rebuild_daily_balances, verify_daily_balances, account_tree,
+    close_fiscal_period, reopen_fiscal_period,
+)
 
-# Create your tests here.
+
+class DailyBalanceTests(TenantTestCase):
+    """
+    Los saldos diarios deben cuadrar siempre con el Libro Diario.
+    """
+
+    def setUp(self):
+        self.cash = Account.objects.create(name='Caja', code='1105', account_type='ASSET')
+        self.sales = Account.objects.create(name='Ventas', code='4135', account_type='REVENUE')
+
+    def test_posting_accumulates_per_account_and_day(self):
+        post_entry(date(2025, 3, 1), self.cash, self.sales, Decimal('100.00'))
+        post_entry(date(2025, 3, 1), self.cash, self.sales, Decimal('50.00'))
+        post_entry(date(2025, 3, 2), self.cash, self.sales, Decimal('10.00'))
+
+        cash_day = AccountDailyBalance.objects.get(account=self.cash, date=date(2025, 3, 1))
+        self.assertEqual(cash_day.debit_total, Decimal('150.00'))
+        self.assertEqual(cash_day.credit_total, Decimal('0.00'))
+        self.assertEqual(AccountDailyBalance.objects.count(), 4)
+        self.assertEqual(verify_daily_balances(), [])
+
+    def test_unbalanced_entry_is_rejected(self):
+        with self.assertRaises(DRFValidationError):
+            create_journal_entry(
+                date=date(2025, 3, 1),
+                description='Descuadrado',
+                lines=[
+                    {'account': self.cash, 'debit': Decimal('107.00'), 'credit': 0},
+                    {'account': self.sales, 'debit': 0, 'credit': Decimal('100.00')},
+                ]
+            )
+        self.assertFalse(JournalEntry.objects.exists())
+        self.assertFalse(AccountDailyBalance.objects.exists())
+
+    def test_serializer_create_posts_balances(self):
+        serializer = JournalEntrySerializer(data={
+            'date': '2025-05-10',
+            'description': 'Asiento manual',
+            'items': [
+                {'account': self.cash.id, 'debit': '25.00', 'credit': '0'},
+                {'account': self.sales.id, 'debit': '0', 'credit': '25.00'},
+            ]
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        sales_day = AccountDailyBalance.objects.get(account=self.sales, date=date(2025, 5, 10))
+        self.assertEqual(sales_day.credit_total, Decimal('25.00'))
+
+    def test_refresh_moves_balances_when_entry_changes_date(self):
+        entry = post_entry(date(2025, 3, 1), self.cash, self.sales, Decimal('100.00'))
+        keys = ledger_keys([entry.pk])
+
+        entry.date = date(2025, 4, 1)
+        entry.save()
+        refresh_daily_balances(keys | ledger_keys([entry.pk]))
+
+        self.assertFalse(AccountDailyBalance.objects.filter(date=date(2025, 3, 1)).exists())
+        self.assertEqual(AccountDailyBalance.objects.filter(date=date(2025, 4, 1)).count(), 2)
+        self.assertEqual(verify_daily_balances(), [])
+
+    def test_items_carry_entry_date_and_account_type(self):
+        entry = post_entry(date(2025, 3, 1), self.cash, self.sales, Decimal('100.00'))
+        self.assertEqual(
+            set(entry.items.values_list('entry_date', 'account_type')),
+            {(date(2025, 3, 1), 'ASSET'), (date(2025, 3, 1), 'REVENUE')}
+        )
+
+        entry.date = date(2025, 3, 5)
+        entry.save()
+        self.sales.account_type = 'EQUITY'
+        self.sales.save()
+        self.assertEqual(
+            set(entry.items.values_list('entry_date', 'account_type')),
+            {(date(2025, 3, 5), 'ASSET'), (date(2025, 3, 5), 'EQUITY')}
+        )
+
+    def test_verify_detects_drift_and_rebuild_fixes_it(self):
+        post_entry(date(2025, 3, 1), self.cash, self.sales, Decimal('100.00'))
+        AccountDailyBalance.objects.filter(account=self.cash).update(debit_total=Decimal('1.00'))
+
+        self.assertEqual(len(verify_daily_balances()), 1)
+        rebuild_daily_balances()
+        self.assertEqual(verify_daily_balances(), [])
+
+
+class AccountClosureTests(TenantTestCase):
+    """
+    La tabla de cierre debe seguir al árbol en altas, movimientos y borrados.
+    """
+
+    def setUp(self):
+        self.assets = Account.objects.create(name='Activos', code='1', account_type='ASSET')
+        self.current = Account.objects.create(name='Corriente', code='11', account_type='ASSET', parent=self.assets)
+        self.cash = Account.objects.create(name='Caja', code='1105', account_type='ASSET', parent=self.current)
+        self.banks = Account.objects.create(name='Bancos', code='1110', account_type='ASSET', parent=self.current)
+        self.capital = Account.objects.create(name='Capital', code='3105', account_type='EQUITY')
+
+    def _descendants(self, account):
+        return set(
+            AccountClosure.objects.filter(ancestor=account).values_list('descendant__code', flat=True)
+        )
+
+    def test_insert_links_all_ancestors(self):
+        self.assertEqual(self._descendants(self.assets), {'1', '11', '1105', '1110'})
+        self.assertEqual(AccountClosure.objects.get(ancestor=self.assets, descendant=self.cash).depth, 2)
+
+    def test_move_subtree_relinks_descendants(self):
+        other = Account.objects.create(name='No corriente', code='12', account_type='ASSET')
+        self.current.parent = other
+        self.current.save()
+
+        self.assertEqual(self._descendants(self.assets), {'1'})
+        self.assertEqual(self._descendants(other), {'12', '11', '1105', '1110'})
+        self.assertEqual(AccountClosure.objects.get(ancestor=other, descendant=self.cash).depth, 2)
+
+    def test_cannot_move_under_own_descendant(self):
+        self.assets.parent = self.cash
+        with self.assertRaises(ValidationError):
+            self.assets.save()
+
+    def test_delete_removes_links(self):
+        self.banks.delete()
+        self.assertEqual(self._descendants(self.assets), {'1', '11', '1105'})
+
+    def test_tree_rolls_up_balances_in_one_query(self):
+        create_journal_entry(
+            date=date(2025, 1, 15),
+            description='Aporte de capital',
+            lines=[
+                {'account': self.cash, 'debit': Decimal('300.00'), 'credit': 0},
+                {'account': self.banks, 'debit': Decimal('700.00'), 'credit': 0},
+                {'account': self.capital, 'debit': 0, 'credit': Decimal('1000.00')},
+            ]
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            tree = account_tree()
+        self.assertEqual(len(business_queries(context)), 1)
+
+        roots = {node['code']: node for node in tree}
+        self.assertEqual(roots['1']['balance'], Decimal('1000.00'))
+        self.assertEqual(roots['1']['children'][0]['balance'], Decimal('1000.00'))
+        self.assertEqual(roots['3105']['balance'], Decimal('1000.00'))
+        self.assertEqual(account_tree(as_of=date(2024, 12, 31))[0]['balance'], Decimal('0.00'))
+
+
+class JournalImportTests(TenantTestCase):
+    """
+    La importación masiva guarda los asientos válidos por lotes y reporta el resto.
+    """
+
+    def setUp(self):
+        self.cash = Account.objects.create(name='Caja', code='1105', account_type='ASSET')
+        self.sales = Account.objects.create(name='Ventas', code='4135', account_type='REVENUE')
+
+    def test_csv_import_writes_valid_entries_and_reports_errors(self):
+        content = io.StringIO(
+            "entry_ref,date,description,account_code,debit,credit,line_description\n"
+            "A1,2023-01-05,Venta 1,1105,100.00,,Cobro\n"
+            "A1,2023-01-05,Venta 1,4135,,100.00,Ingreso\n"
+            "A2,2023-01-06,Venta 2,1105,50.00,,\n"
+            "A2,2023-01-06,Venta 2,9999,,50.00,\n"
+            "A3,2023-01-07,Venta 3,1105,10.00,,\n"
+            "A3,2023-01-07,Venta 3,4135,,9.00,\n"
+            "A4,2023-01-07,Venta 4,1105,20.00,,\n"
+            "A4,2023-01-07,Venta 4,4135,,20.00,\n"
+            "A5,2023-01-08,Venta 5,1105,5.00,,\n"
+            "A5,2023-01-08,Venta 5,4135,,5.00,\n"
+        )
+        report = JournalImporter(chunk_size=2).run(read_csv_entries(content))
+
+        self.assertEqual(report['entries_created'], 3)
+        self.assertEqual(report['lines_created'], 6)
+        self.assertEqual([error['row'] for error in report['errors']], [4, 6])
+        self.assertIn("'9999' no existe", report['errors'][0]['errors'][0])
+        self.assertIn("no está balanceado", report['errors'][1]['errors'][0])
+
+        self.assertEqual(JournalEntry.objects.count(), 3)
+        self.assertEqual(verify_daily_balances(), [])
+        self.assertFalse(JournalItem.objects.filter(Q(entry_date__isnull=True) | Q(account_type__isnull=True)).exists())
+
+    def test_failed_chunk_is_retried_entry_by_entry(self):
+        content = io.StringIO(
+            "entry_ref,date,description,account_code,debit,credit,line_description\n"
+            "B1,2023-03-01,Venta 1,1105,10.00,,\n"
+            "B1,2023-03-01,Venta 1,4135,,10.00,\n"
+            "B2,2023-04-01,Venta 2,1105,20.00,,\n"
+            "B2,2023-04-01,Venta 2,4135,,20.00,\n"
+            "B3,2023-03-02,Venta 3,1105,30.00,,\n"
+            "B3,2023-03-02,Venta 3,4135,,30.00,\n"
+        )
+        importer = JournalImporter(chunk_size=10)
+        # Abril se cierra después de cargar los periodos: solo la BD rechaza el asiento B2
+        FiscalPeriod.objects.create(
+            name='2023-04', start_date=date(2023, 4, 1), end_date=date(2023, 4, 30), status='Closed'
+        )
+        report = importer.run(read_csv_entries(content))
+
+        self.assertEqual((report['entries_created'], report['lines_created']), (2, 4))
+        self.assertEqual([(error['row'], error['entry']) for error in report['errors']], [(4, 'B2')])
+        self.assertIn("está cerrado", report['errors'][0]['errors'][0])
+        self.assertEqual(set(JournalEntry.objects.values_list('description', flat=True)), {'Venta 1', 'Venta 3'})
+        self.assertEqual(verify_daily_balances(), [])
+
+    def test_jsonl_import(self):
+        content = io.StringIO(
+            json.dumps({
+                'ref': 'J1', 'date': '2023-02-01', 'description': 'Venta',
+                'items': [
+                    {'account_code': '1105', 'debit': '12.50'},
+                    {'account_code': '4135', 'credit': '12.50'},
+                ]
+            }) + "\n{no es json}\n"
+        )
+        report = JournalImporter().run(read_jsonl_entries(content))
+
+        self.assertEqual(report['entries_created'], 1)
+        self.assertEqual(report['errors'][0]['row'], 2)
+        balance = AccountDailyBalance.objects.get(account=self.sales)
+        self.assertEqual(balance.credit_total, Decimal('12.50'))
+
+
+class FiscalPeriodCloseTests(TenantTestCase):
+    """
+    El cierre congela los saldos acumulados y bloquea el periodo.
+    """
+
+    def setUp(self):
+        self.cash = Account.objects.create(name='Caja', code='1105', account_type='ASSET')
+        self.sales = Account.objects.create(name='Ventas', code='4135', account_type='REVENUE')
+        self.january = FiscalPeriod.objects.create(name='2025-01', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31))
+        self.february = FiscalPeriod.objects.create(name='2025-02', start_date=date(2025, 2, 1), end_date=date(2025, 2, 28))
+
+    def test_close_stores_cumulative_snapshot_from_previous_close(self):
+        post_entry(date(2024, 12, 31), self.cash, self.sales, '10.00')
+        post_entry(date(2025, 1, 15), self.cash, self.sales, '20.00')
+        close_fiscal_period(self.january, None)
+        post_entry(date(2025, 2, 10), self.cash, self.sales, '5.00')
+        close_fiscal_period(self.february, None)
+
+        closing = PeriodClosingBalance.objects.get(period=self.february, account=self.cash)
+        self.assertEqual(closing.debit_total, Decimal('35.00'))
+        self.january.refresh_from_db()
+        self.assertEqual(self.january.status, 'Closed')
+
+    def test_posting_into_closed_period_is_rejected(self):
+        close_fiscal_period(self.january, None)
+        with self.assertRaises(DRFValidationError):
+            post_entry(date(2025, 1, 20), self.cash, self.sales, '1.00')
+        self.assertFalse(JournalEntry.objects.exists())
+
+        serializer = JournalEntrySerializer(data={
+            'date': '2025-01-20',
+            'description': 'Fuera de plazo',
+            'items': [
+                {'account': self.cash.id, 'debit': '1.00', 'credit': '0'},
+                {'account': self.sales.id, 'debit': '0', 'credit': '1.00'},
+            ]
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('date', serializer.errors)
+
+    def test_periods_close_in_order_and_reopen_last_only(self):
+        with self.assertRaises(DRFValidationError):
+            close_fiscal_period(self.february, None)
+
+        close_fiscal_period(self.january, None)
+        close_fiscal_period(self.february, None)
+        with self.assertRaises(DRFValidationError):
+            reopen_fiscal_period(self.january)
+
+        reopen_fiscal_period(self.february)
+        self.assertFalse(PeriodClosingBalance.objects.filter(period=self.february).exists())
+        post_entry(date(2025, 2, 15), self.cash, self.sales, '1.00')
+
+
+class JournalEntryPaginationTests(TenantTestCase):
+    """
+    ?cursor= recorre el Libro Diario por keyset (date, id) sin OFFSET ni COUNT.
+    """
+
+    def setUp(self):
+        self.cash = Account.objects.create(name='Caja', code='1105', account_type='ASSET')
+        self.sales = Account.objects.create(name='Ventas', code='4135', account_type='REVENUE')
+        self.user = User.objects.create_user(username='contador', password='x')
+        self.entries = [
+            post_entry(day, self.cash, self.sales, '1.00')
+            for day in [date(2025, 1, 2), date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 3), date(2025, 1, 1)]
+        ]
+
+    def _list(self, params):
+        request = APIRequestFactory().get('/api/journal-entries/', params)
+        force_authenticate(request, user=self.user)
+        return JournalEntryViewSet.as_view({'get': 'list'})(request)
+
+    def test_cursor_walks_all_entries_newest_first(self):
+        seen = []
+        cursor = ''
+        with CaptureQueriesContext(connection) as context:
+            while cursor is not None:
+                data = self._list({'cursor': cursor, 'page_size': 2}).data
+                seen += [(row['date'], row['id']) for row in data['results']]
+                cursor = data['next_cursor']
+        self.assertNotIn('count', data)
+        self.assertFalse([sql for sql in business_queries(context) if 'COUNT(' in sql or 'OFFSET' in sql])
+
+        expected = sorted(((e.date, e.id) for e in self.entries), reverse=True)
+        self.assertEqual([entry_id for _, entry_id in seen], [entry_id for _, entry_id in expected])
+
+    def test_page_number_mode_is_kept(self):
+        data = self._list({'page': 1}).data
+        self.assertEqual(data['count'], 5)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self._list({'cursor': 'no-es-un-cursor'}).status_code, 404)
+
+
+class JournalPartitioningTests(TenantTestCase):
+    """
+    La conversión a tabla particionada conserva los datos, la secuencia y el ORM.
+    """
+
+    def setUp(self):
+        self.cash = Account.objects.create(name='Caja', code='1105', account_type='ASSET')
+        self.sales = Account.objects.create(name='Ventas', code='4135', account_type='REVENUE')
+
+    def test_convert_keeps_rows_and_prunes_by_year(self):
+        post_entry(date(2023, 6, 1), self.cash, self.sales, '10.00')
+        last = post_entry(date(2024, 6, 1), self.cash, self.sales, '10.00')
+        last_id = last.items.order_by('-id').values_list('id', flat=True).first()
+
+        self.assertTrue(partition_journal_items())
+        self.assertTrue(is_partitioned())
+        self.assertFalse(partition_journal_items())
+        self.assertIn('accounting_journalitem_y2023', existing_partitions())
+        self.assertEqual(JournalItem.objects.count(), 4)
+
+        # La secuencia continúa y el ORM sigue funcionando sobre la tabla padre
+        entry = post_entry(date(2024, 7, 1), self.cash, self.sales, '10.00')
+        self.assertGreater(min(entry.items.values_list('id', flat=True)), last_id)
+        self.assertEqual(verify_daily_balances(), [])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN SELECT SUM(debit) FROM accounting_journalitem "
+                "WHERE entry_date BETWEEN '2024-01-01' AND '2024-12-31'"
+            )
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        self.assertIn('accounting_journalitem_y2024', plan)
+        self.assertNotIn('accounting_journalitem_y2023', plan)
+
+    def test_missing_year_moves_rows_out_of_default(self):
+        partition_journal_items(extra_years=0)
+        far = post_entry(date(2040, 1, 15), self.cash, self.sales, '10.00')
+
+        self.assertEqual(ensure_year_partitions([2040]), ['accounting_journalitem_y2040'])
+        self.assertEqual(ensure_year_partitions([2040]), [])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM accounting_journalitem_y2040")
+            self.assertEqual(cursor.fetchone()[0], 2)
+        self.assertEqual(far.items.count(), 2)
+
+
+class AccountLedgerTests(TenantTestCase):
+    """
+    Mayor por cuenta: saldo corrido en la BD y paginación keyset con saldo arrastrado.
+    """
+
+    def setUp(self):
+        self.cash = Account.objects.create(name='Caja', code='1105', account_type='ASSET')
+        self.sales = Account.objects.create(name='Ventas', code='4135', account_type='REVENUE')
+        self.user = User.objects.create_user(username='contador', password='x')
+        for day, amount in [(date(2024, 12, 1), '100.00'), (date(2025, 1, 5), '10.00'),
+                            (date(2025, 1, 5), '-4.00'), (date(2025, 2, 1), '20.00'),
+                            (date(2025, 3, 1), '30.00')]:
+            post_entry(day, self.cash, self.sales, Decimal(amount))
+
+    def _ledger(self, params):
+        request = APIRequestFactory().get(f'/api/accounts/{self.cash.pk}/ledger/', params)
+        force_authenticate(request, user=self.user)
+        return AccountViewSet.as_view({'get': 'ledger'})(request, pk=self.cash.pk).data
+
+    def test_pages_carry_running_balance(self):
+        params = {'start_date': '2025-01-01', 'page_size': 2}
+        first = self._ledger(params)
+        self.assertEqual(first['opening_balance'], Decimal('100.00'))
+        self.assertEqual([row['balance'] for row in first['results']], [Decimal('110.00'), Decimal('106.00')])
+
+        with CaptureQueriesContext(connection) as context:
+            second = self._ledger({**params, 'cursor': first['next_cursor']})
+        queries = business_queries(context)
+        # Cuenta (get_object) + una sola consulta con la función de ventana
+        self.assertEqual(len(queries), 2)
+        self.assertIn('OVER', queries[1])
+        self.assertEqual([row['balance'] for row in second['results']], [Decimal('126.00'), Decimal('156.00')])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_tampered_cursor_is_rejected(self):
+        first = self._ledger({'start_date': '2025-01-01', 'page_size': 2})
+        payload, signature = first['next_cursor'].rsplit(':', 1)
+        position = json.loads(base64.urlsafe_b64decode(payload))
+        position[2] = '1000000.00'
+        forged = base64.urlsafe_b64encode(json.dumps(position).encode()).decode() + ':' + signature
+
+        request = APIRequestFactory().get('/', {'start_date': '2025-01-01', 'cursor': forged})
+        force_authenticate(request, user=self.user)
+        self.assertEqual(AccountViewSet.as_view({'get': 'ledger'})(request, pk=self.cash.pk).status_code, 404)
+        # Un cursor auténtico tampoco vale para otro rango de fechas
+        request = APIRequestFactory().get('/', {'start_date': '2024-01-01', 'cursor': first['next_cursor']})
+        force_authenticate(request, user=self.user)
+        self.assertEqual(AccountViewSet.as_view({'get': 'ledger'})(request, pk=self.cash.pk).status_code, 404)
+
+    def test_opening_balance_uses_closed_snapshot(self):
+        period = FiscalPeriod.objects.create(name='2024', start_date=date(2024, 1, 1), end_date=date(2024, 12, 31))
+        close_fiscal_period(period, None)
+        data = self._ledger({'start_date': '2025-02-01'})
+        self.assertEqual(data['opening_balance'], Decimal('106.00'))
+        self.assertEqual(data['results'][-1]['balance'], Decimal('156.00'))
+
+        # La cuenta de ingresos es de naturaleza acreedora
+        request = APIRequestFactory().get('/', {})
+        force_authenticate(request, user=self.user)
+        sales = AccountViewSet.as_view({'get': 'ledger'})(request, pk=self.sales.pk).data
+        self.assertEqual(sales['results'][-1]['balance'], Decimal('156.00'))
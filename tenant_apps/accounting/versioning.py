@@ -0,0 +1,58 @@
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+# Las claves se aíslan por tenant con la KEY_FUNCTION de django_tenants (ver CACHES)
+LEDGER_VERSION_KEY = 'accounting:ledger_version'
+TREASURY_VERSION_KEY = 'treasury:movements_version'
+
+
+def data_version(key):
+    """
+    Versión actual de un conjunto de datos del tenant (p. ej. el Libro Diario).
+    Cambia cada vez que esos datos cambian, así que sirve como clave de caché.
+    Se inicializa con un timestamp: si la clave se pierde, la nueva versión nunca
+    coincide con una anterior.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_data_version(key):
+    """
+    Incrementa la versión cuando la transacción actual confirma: un lector nunca
+    guarda datos anteriores al COMMIT bajo la versión nueva.
+    """
+    transaction.on_commit(lambda: _increment(key))
+
+
+def ledger_version():
+    """
+    Versión del Libro Diario: cambia cada vez que se contabiliza, edita o cierra algo.
+    """
+    return data_version(LEDGER_VERSION_KEY)
+
+
+def bump_ledger_version():
+    bump_data_version(LEDGER_VERSION_KEY)
+
+
+def treasury_version():
+    """
+    Versión de los movimientos de Tesorería (cobros y pagos no pasan por el Libro Diario).
+    """
+    return data_version(TREASURY_VERSION_KEY)
+
+
+def bump_treasury_version():
+    bump_data_version(TREASURY_VERSION_KEY)
@@ -1,6 +1,20 @@
-from rest_framework import viewsets
-from .models import Account, JournalEntry
-from .serializers import AccountSerializer, JournalEntrySerializer
+import io
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.db import transaction
+from stward_erp.pagination import HybridPagination
+from stward_erp.utils import parse_date_param
+from .models import Account, JournalEntry, FiscalPeriod
+from .serializers import AccountSerializer, JournalEntrySerializer, FiscalPeriodSerializer
+from .services import (
+    ledger_keys, refresh_daily_balances, account_tree, account_ledger, close_fiscal_period, reopen_fiscal_period,
+    LEDGER_PAGE_SIZE,
+)
+from .importers import JournalImporter, READERS, DEFAULT_CHUNK_SIZE, detect_format
 
 class AccountViewSet(viewsets.ModelViewSet):
     """
@@ -8,8 +22,38 @@ class AccountViewSet(viewsets.ModelViewSet):
     """
     queryset = Account.objects.all()
     serializer_class = AccountSerializer
-    # Opcional: Para optimizar, podríamos añadir .prefetch_related('children')
-    # si a menudo necesitamos mostrar el árbol completo.
+
+    @action(detail=False, methods=['get'], url_path='tree')
+    def tree(self, request):
+        """
+        Árbol completo del Plan de Cuentas con saldos acumulados por nodo.
+        Acepta ?as_of=AAAA-MM-DD para calcular los saldos a una fecha.
+        """
+        return Response(account_tree(as_of=parse_date_param(request, 'as_of')))
+
+    @action(detail=True, methods=['get'], url_path='ledger')
+    def ledger(self, request, pk=None):
+        """
+        Mayor de la cuenta con saldo corrido (?start_date, ?end_date).
+        Se pagina con ?cursor= (el 'next_cursor' de la página anterior) y ?page_size=.
+        """
+        try:
+            page_size = int(request.query_params.get('page_size', LEDGER_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'page_size': "Debe ser un entero."})
+
+        data = account_ledger(
+            self.get_object(),
+            start_date=parse_date_param(request, 'start_date'),
+            end_date=parse_date_param(request, 'end_date'),
+            cursor=request.query_params.get('cursor'),
+            page_size=min(max(page_size, 1), HybridPagination.max_page_size),
+        )
+        if data['next_cursor']:
+            data['next'] = replace_query_param(request.build_absolute_uri(), 'cursor', data['next_cursor'])
+        else:
+            data['next'] = None
+        return Response(data)
 
 class JournalEntryViewSet(viewsets.ModelViewSet):
     """
@@ -21,7 +65,85 @@ class JournalEntryViewSet(viewsets.ModelViewSet):
         'items', 'items__account'
     )
     serializer_class = JournalEntrySerializer
+    # ?cursor= activa la paginación keyset (más recientes primero)
+    pagination_class = HybridPagination
+    keyset_ordering = ('-date', '-id')
 
     def perform_create(self, serializer):
         # Asigna automáticamente el usuario logueado al crear el asiento
-        serializer.save(created_by=self.request.user)
\ No newline at end of file
+        serializer.save(created_by=self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # Si cambia la fecha del asiento, los saldos diarios se mueven de día
+        keys = ledger_keys([serializer.instance.pk])
+        serializer.save()
+        refresh_daily_balances(keys | ledger_keys([serializer.instance.pk]))
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        keys = ledger_keys([instance.pk])
+        instance.delete()
+        refresh_daily_balances(keys)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_entries(self, request):
+        """
+        Importación masiva desde un archivo CSV o JSONL (campo 'file').
+        El archivo se procesa en streaming y se guarda por lotes ('chunk_size').
+        Devuelve un reporte con los asientos creados y los errores por fila.
+        """
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response({'detail': 'Archivo no proporcionado.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = detect_format(uploaded_file.name, request.data.get('file_format'))
+        if file_format not in READERS:
+            return Response(
+                {'detail': f"Formato '{file_format}' no soportado. Use csv o jsonl."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            chunk_size = int(request.data.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        except (TypeError, ValueError):
+            return Response({'detail': 'chunk_size debe ser un entero.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+        importer = JournalImporter(chunk_size=chunk_size, created_by=request.user)
+        report = importer.run(READERS[file_format](stream))
+        return Response(report, status=status.HTTP_200_OK)
+
+
+
+class FiscalPeriodViewSet(viewsets.ModelViewSet):
+    """
+    Endpoint de la API para los Periodos Fiscales y su cierre.
+    """
+    queryset = FiscalPeriod.objects.all().select_related('closed_by')
+    serializer_class = FiscalPeriodSerializer
+
+    def _ensure_open(self, instance):
+        if instance.status == 'Closed':
+            raise ValidationError("No se puede modificar un periodo cerrado. Reábralo primero.")
+
+    def perform_update(self, serializer):
+        self._ensure_open(serializer.instance)
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        self._ensure_open(instance)
+        instance.delete()
+
+    @action(detail=True, methods=['post'], url_path='close')
+    def close(self, request, pk=None):
+        """
+        Cierra el periodo: congela los saldos por cuenta y bloquea la contabilización.
+        """
+        period = close_fiscal_period(self.get_object(), request.user)
+        return Response(self.get_serializer(period).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'], url_path='reopen')
+    def reopen(self, request, pk=None):
+        period = reopen_fiscal_period(self.get_object())
+        return Response(self.get_serializer(period).data, status=status.HTTP_200_OK)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, UnitOfMeasure, Product
+from .models import Category, UnitOfMeasure, Product, StockMove, ForecastRun
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -15,4 +15,15 @@ class UnitOfMeasureAdmin(admin.ModelAdmin):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'unit_of_measure', 'sku')
     search_fields = ('name', 'sku')
-    list_filter = ('category', 'unit_of_measure') # Add filters
\ No newline at end of file
+    list_filter = ('category', 'unit_of_measure') # Add filters
+@admin.register(StockMove)
+class StockMoveAdmin(admin.ModelAdmin):
+    list_display = ('date', 'product', 'quantity', 'unit_cost', 'source_type', 'source_id')
+    list_filter = ('source_type',)
+    search_fields = ('product__name', 'product__sku')
+    raw_id_fields = ('product', 'journal_entry')
+
+@admin.register(ForecastRun)
+class ForecastRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'status', 'chunks_done', 'chunks_total', 'forecasts', 'duration_seconds')
+    list_filter = ('status',)
@@ -0,0 +1,318 @@
+"""
+Predicción de demanda por producto (regresión lineal de las ventas diarias).
+
+Todo el catálogo se procesa de una vez: una consulta agrupada trae la serie
+diaria de cada producto, los ajustes por mínimos cuadrados se resuelven en
+forma cerrada con NumPy para todos los productos a la vez (sumas por producto
+con np.bincount) y las predicciones se guardan con un solo bulk_create.
+
+La demanda son las salidas de almacén por venta del kardex (StockMove con
+source_type 'sales_order'), fechadas el día de la factura: se escriben al
+facturar y no se modifican, así que una orden en borrador o confirmada cuenta
+el día que se factura, sin importar cuándo se creó.
+
+Las sumas de cada producto (ProductDemandStats) se guardan junto con una marca
+de agua (DemandForecastState, el último StockMove procesado): la pasada
+incremental solo suma los días con movimientos nuevos, resta los días que salen
+de la ventana y vuelve a predecir esos productos. Notas:
+- El límite superior es stward_erp.db.stable_max_id, no un simple MAX(id): una
+  factura en curso con un id menor no queda detrás de la marca de agua. Si alguna
+  sigue abierta tras FORECAST_IN_FLIGHT_WAIT_SECONDS, la pasada incremental no
+  suma movimientos nuevos y el recálculo completo se pospone.
+- Los estadísticos son float; el recálculo completo también corrige el redondeo
+  acumulado.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+from django.db.models import Sum, F, Q
+from django.utils import timezone
+from stward_erp.db import stable_max_id
+from .models import Product, ProductDemand, DemandForecastState, ProductDemandStats, StockMove
+
+FORECAST_HISTORY_DAYS = 180  # Analizar últimos 6 meses
+FORECAST_HORIZON_DAYS = 30
+# Días con ventas necesarios para ajustar una tendencia
+MIN_OBSERVATIONS = 10
+STATS_FIELDS = ('n', 'sum_x', 'sum_y', 'sum_xx', 'sum_xy', 'sum_yy')
+# Espera máxima a las facturas en curso antes de fijar el último movimiento a considerar
+FORECAST_IN_FLIGHT_WAIT_SECONDS = 30
+
+
+def demand_moves(start_date, product_ids=None, until_id=None):
+    moves = StockMove.objects.filter(source_type='sales_order', date__gte=start_date)
+    if product_ids is not None:
+        moves = moves.filter(product_id__in=product_ids)
+    if until_id is not None:
+        moves = moves.filter(id__lte=until_id)
+    return moves
+
+
+def sold(**extra):
+    # Las salidas tienen cantidad negativa en el kardex
+    return Sum(-F('quantity'), **extra)
+
+
+def demand_history(start_date, product_ids=None, until_id=None):
+    """
+    Ventas diarias (product_id, fecha, cantidad) desde `start_date`, en una sola
+    consulta agrupada por producto y día.
+    """
+    return demand_moves(start_date, product_ids, until_id).values_list('product_id', 'date').annotate(
+        daily_qty=sold()
+    ).order_by('product_id', 'date')
+
+
+def product_chunks(chunk_size, today=None, history_days=FORECAST_HISTORY_DAYS, until_id=None):
+    """
+    Ids de los productos con ventas en la ventana, en trozos de `chunk_size`
+    (los demás no tienen serie que ajustar).
+    """
+    today = today or timezone.now().date()
+    ids = list(
+        demand_moves(today - timedelta(days=history_days), until_id=until_id)
+        .values_list('product_id', flat=True).order_by('product_id').distinct()
+    )
+    return [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+
+def trend_sums(product_index, x, y, products):
+    """
+    Sumas n, Σx, Σy, Σx², Σxy, Σy² de las observaciones de cada producto.
+    `product_index` indica a qué producto (0..products-1) pertenece cada punto.
+    """
+    return (
+        np.bincount(product_index, minlength=products).astype(float),
+        np.bincount(product_index, weights=x, minlength=products),
+        np.bincount(product_index, weights=y, minlength=products),
+        np.bincount(product_index, weights=x * x, minlength=products),
+        np.bincount(product_index, weights=x * y, minlength=products),
+        np.bincount(product_index, weights=y * y, minlength=products),
+    )
+
+
+def solve_trends(n, sx, sy, sxx, sxy, syy):
+    """
+    Recta y = intercept + slope * x de cada producto por mínimos cuadrados, en
+    forma cerrada a partir de sus sumas. Devuelve (n, intercept, slope, r2).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        safe_n = np.where(n > 0, n, 1)
+        var_x = sxx - sx * sx / safe_n
+        cov_xy = sxy - sx * sy / safe_n
+        var_y = syy - sy * sy / safe_n
+        slope = np.where(var_x > 0, cov_xy / np.where(var_x > 0, var_x, 1), 0.0)
+        intercept = (sy - slope * sx) / safe_n
+        # R² = varianza explicada / varianza total (1 si la serie es constante, como sklearn)
+        r2 = np.where(var_y > 0, slope * cov_xy / np.where(var_y > 0, var_y, 1), 1.0)
+    return n, intercept, slope, np.clip(r2, 0.0, 1.0)
+
+
+def recommend(predicted, stock):
+    """
+    Acción sugerida para cada producto según la demanda prevista y el stock.
+    """
+    return np.where(
+        predicted > stock, 'Restock',
+        # Más de 3 meses de inventario según la predicción
+        np.where((predicted > 0) & (stock > predicted * 3), 'Overstock', 'Mantener'),
+    )
+
+
+def store_stats(product_ids, sums):
+    """
+    Guarda (upsert) los estadísticos de los productos; los que se quedan sin
+    días en la ventana se borran.
+    """
+    rows = list(zip(product_ids, *(column.tolist() for column in sums)))
+    empty = [row[0] for row in rows if row[1] <= 0]
+    if empty:
+        ProductDemandStats.objects.filter(product_id__in=empty).delete()
+    ProductDemandStats.objects.bulk_create(
+        [
+            ProductDemandStats(product_id=pk, n=int(n), **dict(zip(STATS_FIELDS[1:], values)))
+            for pk, n, *values in rows if n > 0
+        ],
+        update_conflicts=True, unique_fields=['product'], update_fields=list(STATS_FIELDS),
+    )
+
+
+def forecast_demand(today=None, history_days=FORECAST_HISTORY_DAYS, horizon_days=FORECAST_HORIZON_DAYS,
+                    product_ids=None, until_id=None):
+    """
+    Predice la demanda de los próximos `horizon_days` días de cada producto con
+    al menos MIN_OBSERVATIONS días de ventas (hasta el StockMove `until_id`), guarda
+    sus estadísticos y las predicciones. Devuelve las ProductDemand creadas.
+    """
+    today = today or timezone.now().date()
+    start_date = today - timedelta(days=history_days)
+
+    rows = list(demand_history(start_date, product_ids, until_id))
+    if not rows:
+        return []
+    ids, days, quantities = zip(*rows)
+    unique_ids, product_index = np.unique(np.array(ids), return_inverse=True)
+    # Días desde el inicio de la ventana: la misma recta que con ordinales, sin perder precisión
+    x = np.array([(day - start_date).days for day in days], dtype=float)
+    y = np.array(quantities, dtype=float)
+    sums = trend_sums(product_index, x, y, len(unique_ids))
+    store_stats(unique_ids.tolist(), sums)
+    return save_forecasts(today, start_date, horizon_days, unique_ids, *solve_trends(*sums))
+
+
+def save_forecasts(today, origin, horizon_days, product_ids, n, intercept, slope, r2):
+    """
+    Proyecta cada recta sobre los próximos días (sin ventas negativas), decide la
+    acción frente al stock actual y crea las predicciones con un bulk_create.
+    Las x de las rectas son días contados desde `origin`.
+    """
+    fitted = n >= MIN_OBSERVATIONS
+    product_ids, intercept, slope, r2 = product_ids[fitted], intercept[fitted], slope[fitted], r2[fitted]
+    if not len(product_ids):
+        return []
+
+    offset = (today - origin).days
+    future_x = offset + np.arange(1, horizon_days + 1, dtype=float)
+    predicted = np.clip(intercept[:, None] + slope[:, None] * future_x[None, :], 0, None).sum(axis=1)
+
+    stock_by_id = dict(Product.objects.filter(pk__in=product_ids.tolist()).values_list('id', 'current_stock'))
+    stock = np.array([float(stock_by_id.get(pk, 0)) for pk in product_ids.tolist()])
+    actions = recommend(predicted, stock)
+
+    period_end = today + timedelta(days=horizon_days)
+    return ProductDemand.objects.bulk_create([
+        ProductDemand(
+            product_id=pk,
+            forecast_period_start=today,
+            forecast_period_end=period_end,
+            predicted_quantity=Decimal(f"{quantity:.2f}"),
+            confidence_score=round(float(confidence), 2),
+            recommended_action=action,
+        )
+        for pk, quantity, confidence, action in zip(product_ids.tolist(), predicted, r2, actions.tolist())
+        if pk in stock_by_id
+    ])
+
+
+def last_move_id():
+    """
+    Último StockMove que ya no puede quedar detrás de otro por confirmar, o None
+    si hay escrituras abiertas tras FORECAST_IN_FLIGHT_WAIT_SECONDS.
+    """
+    return stable_max_id(StockMove, FORECAST_IN_FLIGHT_WAIT_SECONDS)
+
+
+def incremental_state(history_days=FORECAST_HISTORY_DAYS):
+    """
+    Marca de agua vigente, o None si hace falta un recálculo completo (nunca se
+    hizo uno, cambió la ventana o hay uno en curso).
+    """
+    state = DemandForecastState.objects.first()
+    if state is None or state.history_days != history_days:
+        return None
+    return state
+
+
+def begin_full_refresh():
+    """
+    Inicia un recálculo completo: fija el último StockMove a considerar (las
+    ventas posteriores quedan para la siguiente pasada) y descarta la marca de
+    agua y los estadísticos, así ninguna pasada incremental parte de datos a
+    medias. Devuelve None, sin descartar nada, si el límite no se pudo fijar.
+    """
+    until_id = last_move_id()
+    if until_id is None:
+        return None
+    DemandForecastState.objects.all().delete()
+    ProductDemandStats.objects.all().delete()
+    return until_id
+
+
+def finish_full_refresh(today, until_id, history_days=FORECAST_HISTORY_DAYS):
+    start_date = today - timedelta(days=history_days)
+    return DemandForecastState.objects.create(
+        last_move_id=until_id, window_start=start_date, origin=start_date, history_days=history_days,
+    )
+
+
+def incremental_changes(state, window_start, until_id):
+    """
+    Variación de los estadísticos de cada producto desde la marca de agua, con
+    dos consultas agrupadas: los días que salen de la ventana (se restan) y los
+    días con movimientos nuevos (se resta el punto anterior del día y se suma el nuevo).
+    """
+    deltas = defaultdict(lambda: np.zeros(len(STATS_FIELDS)))
+
+    def add(product_id, day, quantity, sign):
+        x, y = float((day - state.origin).days), float(quantity)
+        deltas[product_id] += sign * np.array([1.0, x, y, x * x, x * y, y * y])
+
+    if window_start > state.window_start:
+        expired = demand_moves(state.window_start, until_id=state.last_move_id).filter(
+            date__lt=window_start
+        ).values_list('product_id', 'date').annotate(daily_qty=sold()).order_by()
+        for product_id, day, quantity in expired:
+            add(product_id, day, quantity, -1)
+
+    if until_id > state.last_move_id:
+        is_new = Q(id__gt=state.last_move_id)
+        new_products = demand_moves(window_start, until_id=until_id).filter(is_new).values('product_id')
+        changed = demand_moves(window_start, until_id=until_id).filter(product_id__in=new_products).values_list(
+            'product_id', 'date'
+        ).annotate(
+            daily_qty=sold(), added=sold(filter=is_new)
+        ).filter(added__gt=0).order_by()
+        for product_id, day, quantity, added in changed:
+            if quantity - added:
+                add(product_id, day, quantity - added, -1)
+            add(product_id, day, quantity, 1)
+    return deltas
+
+
+def forecast_incremental(state, today=None, horizon_days=FORECAST_HORIZON_DAYS):
+    """
+    Pasada incremental: actualiza los estadísticos de los productos con ventas
+    nuevas (o con días que salen de la ventana), vuelve a predecir solo esos y
+    avanza la marca de agua. Devuelve las ProductDemand creadas.
+    """
+    today = today or timezone.now().date()
+    window_start = today - timedelta(days=state.history_days)
+    until_id = last_move_id()
+    if until_id is None:
+        # Facturas aún abiertas: esta pasada solo saca de la ventana los días vencidos
+        until_id = state.last_move_id
+
+    deltas = incremental_changes(state, window_start, until_id)
+    forecasts = []
+    if deltas:
+        product_ids = sorted(deltas)
+        current = {
+            row[0]: np.array(row[1:], dtype=float)
+            for row in ProductDemandStats.objects.filter(product_id__in=product_ids).values_list('product_id', *STATS_FIELDS)
+        }
+        matrix = np.array([current.get(pk, np.zeros(len(STATS_FIELDS))) + deltas[pk] for pk in product_ids])
+        sums = tuple(matrix.T)
+        store_stats(product_ids, sums)
+        forecasts = save_forecasts(today, state.origin, horizon_days, np.array(product_ids), *solve_trends(*sums))
+
+    DemandForecastState.objects.filter(pk=state.pk).update(last_move_id=until_id, window_start=window_start)
+    return forecasts
+
+
+def update_demand_forecasts(today=None, full=False, history_days=FORECAST_HISTORY_DAYS,
+                            horizon_days=FORECAST_HORIZON_DAYS):
+    """
+    Predicción de demanda del tenant actual: incremental desde la marca de agua
+    si existe, o un recálculo completo (siempre con `full=True`).
+    """
+    today = today or timezone.now().date()
+    state = None if full else incremental_state(history_days)
+    if state is not None:
+        return forecast_incremental(state, today, horizon_days)
+    until_id = begin_full_refresh()
+    if until_id is None:
+        return []
+    forecasts = forecast_demand(today, history_days, horizon_days, until_id=until_id)
+    finish_full_refresh(today, until_id, history_days)
+    return forecasts
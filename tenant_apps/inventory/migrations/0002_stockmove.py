@@ -0,0 +1,33 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0007_journalitem_denormalized'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMove',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Costo Unitario')),
+                ('source_type', models.CharField(choices=[('purchase_order', 'Recepción de Compra'), ('sales_order', 'Factura de Venta')], max_length=20)),
+                ('source_id', models.PositiveIntegerField()),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('journal_entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_moves', to='accounting.journalentry')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_moves', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'date', 'id'], name='stock_move_product_date_idx'), models.Index(fields=['source_type', 'source_id'], name='stock_move_source_idx')],
+            },
+        ),
+    ]
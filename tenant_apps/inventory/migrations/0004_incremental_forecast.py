@@ -0,0 +1,53 @@
+# Generated by Django 4.2.13 on 2026-10-18 08:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_forecastrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecastState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_item_id', models.BigIntegerField(default=0)),
+                ('window_start', models.DateField()),
+                ('origin', models.DateField()),
+                ('history_days', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductDemandStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='demand_stats', serialize=False, to='inventory.product')),
+                ('n', models.IntegerField(default=0)),
+                ('sum_x', models.FloatField(default=0)),
+                ('sum_y', models.FloatField(default=0)),
+                ('sum_xx', models.FloatField(default=0)),
+                ('sum_xy', models.FloatField(default=0)),
+                ('sum_yy', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='forecastrun',
+            name='forecast_date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AddField(
+            model_name='forecastrun',
+            name='mode',
+            field=models.CharField(choices=[('full', 'Recálculo completo'), ('incremental', 'Incremental')], default='full', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='forecastrun',
+            name='until_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
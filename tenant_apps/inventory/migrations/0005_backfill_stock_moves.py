@@ -0,0 +1,128 @@
+# Generated by Django 4.2.13 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def _batches(cursor, table, condition):
+    cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table} WHERE {condition}")
+    min_id, max_id = cursor.fetchone()
+    if min_id is None:
+        return
+    for start in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+        yield start, start + BACKFILL_BATCH_SIZE
+
+
+def backfill_stock_moves(apps, schema_editor):
+    """
+    Kardex de los documentos anteriores a StockMove, por rangos de id de documento
+    y un lote confirmado a la vez:
+
+    1. Entradas de las compras recibidas, al precio de cada línea y con fecha de recepción.
+    2. Salidas de las ventas facturadas, con fecha de factura, al costo promedio de las
+       entradas del producto hasta esa fecha (el costo corrido exacto no se puede
+       reconstruir: no se guardaba).
+    3. Un saldo inicial por producto con la diferencia contra current_stock, fechado un
+       día antes de su primer movimiento, para que el kardex cierre en el stock actual.
+
+    Los documentos que ya tienen movimientos no se tocan. El asiento se enlaza por la
+    descripción con la que lo crean los servicios.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        for start, end in list(_batches(cursor, 'purchasing_purchaseorder', "status IN ('Received', 'Completed')")):
+            cursor.execute(
+                """
+                INSERT INTO inventory_stockmove
+                    (product_id, date, quantity, unit_cost, source_type, source_id, journal_entry_id, description, created_at)
+                SELECT i.product_id, COALESCE(o.received_date, o.order_date), i.quantity, i.unit_price,
+                       'purchase_order', o.id,
+                       (SELECT MIN(e.id) FROM accounting_journalentry e
+                        WHERE e.description LIKE 'Recepción PO-' || o.id || ' |%%'),
+                       'Entrada PO-' || o.id, now()
+                FROM purchasing_poitem i
+                JOIN purchasing_purchaseorder o ON o.id = i.purchase_order_id
+                WHERE o.status IN ('Received', 'Completed')
+                  AND o.id >= %s AND o.id < %s
+                  AND NOT EXISTS (
+                      SELECT 1 FROM inventory_stockmove m
+                      WHERE m.source_type = 'purchase_order' AND m.source_id = o.id
+                  )
+                ORDER BY o.id, i.id
+                """,
+                [start, end],
+            )
+
+        for start, end in list(_batches(cursor, 'sales_salesorder', "status = 'Invoiced'")):
+            cursor.execute(
+                """
+                INSERT INTO inventory_stockmove
+                    (product_id, date, quantity, unit_cost, source_type, source_id, journal_entry_id, description, created_at)
+                SELECT i.product_id, COALESCE(o.invoice_date, o.order_date), -i.quantity,
+                       COALESCE((
+                           SELECT ROUND(SUM(m.quantity * m.unit_cost) / NULLIF(SUM(m.quantity), 0), 2)
+                           FROM inventory_stockmove m
+                           WHERE m.product_id = i.product_id AND m.source_type = 'purchase_order'
+                             AND m.date <= COALESCE(o.invoice_date, o.order_date)
+                       ), 0),
+                       'sales_order', o.id,
+                       (SELECT MIN(e.id) FROM accounting_journalentry e
+                        WHERE e.description LIKE 'Factura de Venta - Orden #' || o.id || ' -%%'),
+                       'Salida SO-' || o.id, now()
+                FROM sales_soitem i
+                JOIN sales_salesorder o ON o.id = i.sales_order_id
+                WHERE o.status = 'Invoiced'
+                  AND o.id >= %s AND o.id < %s
+                  AND NOT EXISTS (
+                      SELECT 1 FROM inventory_stockmove m
+                      WHERE m.source_type = 'sales_order' AND m.source_id = o.id
+                  )
+                ORDER BY o.id, i.id
+                """,
+                [start, end],
+            )
+
+        for start, end in list(_batches(cursor, 'inventory_product', 'TRUE')):
+            cursor.execute(
+                """
+                INSERT INTO inventory_stockmove
+                    (product_id, date, quantity, unit_cost, source_type, source_id, journal_entry_id, description, created_at)
+                SELECT p.id, COALESCE(s.first_date - 1, CURRENT_DATE), p.current_stock - COALESCE(s.stock, 0),
+                       COALESCE(s.purchase_cost, 0), 'opening', 0, NULL, 'Saldo inicial', now()
+                FROM inventory_product p
+                LEFT JOIN (
+                    SELECT m.product_id, MIN(m.date) AS first_date, SUM(m.quantity) AS stock,
+                           ROUND(
+                               SUM(m.quantity * m.unit_cost) FILTER (WHERE m.source_type = 'purchase_order')
+                               / NULLIF(SUM(m.quantity) FILTER (WHERE m.source_type = 'purchase_order'), 0), 2
+                           ) AS purchase_cost
+                    FROM inventory_stockmove m
+                    WHERE m.product_id >= %s AND m.product_id < %s
+                    GROUP BY m.product_id
+                ) s ON s.product_id = p.id
+                WHERE p.id >= %s AND p.id < %s
+                  AND p.current_stock <> COALESCE(s.stock, 0)
+                """,
+                [start, end, start, end],
+            )
+
+
+class Migration(migrations.Migration):
+    # Lotes confirmados uno a uno: no se bloquean los documentos mientras corre
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0004_incremental_forecast'),
+        ('purchasing', '0006_received_date'),
+        ('sales', '0008_invoice_date'),
+        ('accounting', '0007_journalitem_denormalized'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmove',
+            name='source_type',
+            field=models.CharField(choices=[('purchase_order', 'Recepción de Compra'), ('sales_order', 'Factura de Venta'), ('opening', 'Saldo Inicial')], max_length=20),
+        ),
+        migrations.RunPython(backfill_stock_moves, migrations.RunPython.noop),
+    ]
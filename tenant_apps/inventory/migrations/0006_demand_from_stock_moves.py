@@ -0,0 +1,28 @@
+# Generated by Django 4.2.13 on 2026-10-18 11:40
+
+from django.db import migrations
+
+
+def reset_incremental_state(apps, schema_editor):
+    """
+    La marca de agua guardada era un id de SOItem: se descarta con sus
+    estadísticos y la próxima predicción hace un recálculo completo.
+    """
+    apps.get_model('inventory', 'DemandForecastState').objects.all().delete()
+    apps.get_model('inventory', 'ProductDemandStats').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_backfill_stock_moves'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='demandforecaststate',
+            old_name='last_item_id',
+            new_name='last_move_id',
+        ),
+        migrations.RunPython(reset_incremental_state, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # ... (Mantén Category, UnitOfMeasure, Product como están) ...
 
@@ -53,4 +54,112 @@ class ProductDemand(models.Model):
     ])
 
     def __str__(self):
-        return f"Forecast {self.product.name}: {self.predicted_quantity}"
\ No newline at end of file
+        return f"Forecast {self.product.name}: {self.predicted_quantity}"
+
+class StockMove(models.Model):
+    """
+    Movimiento de inventario de un producto (kardex). La cantidad es con signo:
+    positiva en las entradas y negativa en las salidas; el valor del movimiento
+    es quantity * unit_cost.
+    """
+    SOURCE_CHOICES = [
+        ('purchase_order', 'Recepción de Compra'),
+        ('sales_order', 'Factura de Venta'),
+        ('opening', 'Saldo Inicial'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='stock_moves')
+    date = models.DateField()
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Costo Unitario")
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.PositiveIntegerField()
+    journal_entry = models.ForeignKey(
+        'accounting.JournalEntry', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_moves'
+    )
+    description = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.date} {self.product.name}: {self.quantity}"
+
+    class Meta:
+        indexes = [
+            # Kardex por producto en orden (date, id), paginado por keyset
+            models.Index(fields=['product', 'date', 'id'], name='stock_move_product_date_idx'),
+            models.Index(fields=['source_type', 'source_id'], name='stock_move_source_idx'),
+        ]
+
+
+class ForecastRun(models.Model):
+    """
+    Ejecución de la predicción de demanda en un tenant. Los productos se reparten
+    en trozos que procesan varios workers; cada trozo terminado suma su avance aquí.
+    """
+    STATUS_CHOICES = [
+        ('Running', 'Procesando'),
+        ('Done', 'Terminado'),
+        ('Failed', 'Fallido'),
+    ]
+    MODE_CHOICES = [
+        ('full', 'Recálculo completo'),
+        ('incremental', 'Incremental'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Running')
+    mode = models.CharField(max_length=12, choices=MODE_CHOICES, default='full')
+    forecast_date = models.DateField(default=timezone.localdate)
+    # Último StockMove considerado en un recálculo completo (la marca de agua que deja al terminar)
+    until_id = models.BigIntegerField(default=0)
+    chunks_total = models.PositiveIntegerField(default=0)
+    chunks_done = models.PositiveIntegerField(default=0)
+    products = models.PositiveIntegerField(default=0)
+    forecasts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        return round(100 * self.chunks_done / self.chunks_total) if self.chunks_total else 100
+
+    def __str__(self):
+        return f"Predicción #{self.id} [{self.get_status_display()}] {self.chunks_done}/{self.chunks_total}"
+
+    class Meta:
+        ordering = ['-started_at']
+
+
+class DemandForecastState(models.Model):
+    """
+    Marca de agua de la predicción incremental de un tenant (una sola fila): hasta
+    qué StockMove de venta y desde qué fecha están acumuladas las ProductDemandStats.
+    Las x de la regresión son días contados desde `origin`.
+    """
+    last_move_id = models.BigIntegerField(default=0)
+    window_start = models.DateField()
+    origin = models.DateField()
+    history_days = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Demanda hasta StockMove {self.last_move_id} (desde {self.window_start})"
+
+
+class ProductDemandStats(models.Model):
+    """
+    Estadísticos suficientes de la regresión de ventas diarias de un producto
+    (n, Σx, Σy, Σx², Σxy, Σy² de los días con ventas en la ventana): basta con
+    sumar o restar días para actualizar el ajuste.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='demand_stats')
+    n = models.IntegerField(default=0)
+    sum_x = models.FloatField(default=0)
+    sum_y = models.FloatField(default=0)
+    sum_xx = models.FloatField(default=0)
+    sum_xy = models.FloatField(default=0)
+    sum_yy = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"Estadísticos de demanda {self.product_id} (n={self.n})"
@@ -0,0 +1,157 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum, F, Case, When, Value, DecimalField, ExpressionWrapper, Window
+from django.db.models.expressions import RowRange
+from rest_framework.exceptions import NotFound
+from stward_erp.pagination import encode_cursor, decode_cursor, keyset_filter
+from .models import Product, StockMove
+
+KARDEX_PAGE_SIZE = 100
+KARDEX_ORDERING = ('date', 'id')
+
+
+def _move_value():
+    return ExpressionWrapper(F('quantity') * F('unit_cost'), output_field=DecimalField(max_digits=24, decimal_places=4))
+
+
+def apply_stock_changes(changes):
+    """
+    Aplica variaciones de stock, una lista de (product_id, cantidad con signo),
+    sin leer ni reescribir el producto completo: las cantidades se suman por
+    producto y se aplican con un solo UPDATE current_stock = current_stock + delta.
+    Antes se bloquean las filas en orden de id, así dos documentos con los mismos
+    productos nunca se esperan en círculo (sin deadlocks).
+    Devuelve {product_id: delta} de lo aplicado.
+    """
+    totals = defaultdict(Decimal)
+    for product_id, quantity in changes:
+        totals[product_id] += Decimal(quantity)
+    totals = {product_id: quantity for product_id, quantity in sorted(totals.items()) if quantity}
+    if not totals:
+        return {}
+
+    with transaction.atomic():
+        locked = list(
+            Product.objects.filter(pk__in=totals).order_by('pk').select_for_update().values_list('pk', flat=True)
+        )
+        delta = Case(
+            *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in totals.items()],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        Product.objects.filter(pk__in=locked).update(current_stock=F('current_stock') + delta)
+    return totals
+
+
+def average_costs(product_ids):
+    """
+    Costo promedio ponderado de cada producto según sus movimientos: una sola
+    consulta agrupada. Los productos sin existencias valorizadas no aparecen.
+    """
+    rows = StockMove.objects.filter(product_id__in=product_ids).values('product_id').annotate(
+        stock=Sum('quantity'), stock_value=Sum(_move_value())
+    ).order_by()
+    return {
+        row['product_id']: (row['stock_value'] / row['stock']).quantize(Decimal('0.01'))
+        for row in rows if row['stock'] and row['stock'] > 0
+    }
+
+
+def record_stock_moves(moves, date, source_type, source_id, journal_entry=None):
+    """
+    Registra en el kardex los movimientos de un documento. `moves` es una lista
+    de (producto, cantidad con signo, costo unitario, descripción).
+    """
+    return StockMove.objects.bulk_create([
+        StockMove(
+            product=product, date=date, quantity=quantity, unit_cost=unit_cost,
+            source_type=source_type, source_id=source_id,
+            journal_entry=journal_entry, description=description,
+        )
+        for product, quantity, unit_cost, description in moves
+    ])
+
+
+def product_kardex(product, start_date=None, end_date=None, cursor=None, page_size=KARDEX_PAGE_SIZE):
+    """
+    Kardex de un producto con existencia y valor corridos, paginado por keyset
+    (date, id). Igual que el mayor de cuentas, los acumulados son un
+    SUM() OVER (ORDER BY date, id) calculado en la BD sobre los movimientos
+    posteriores al cursor, más lo arrastrado en el propio cursor (firmado para
+    este producto y rango).
+    """
+    scope = f"kardex:{product.pk}:{start_date}:{end_date}"
+    moves = StockMove.objects.filter(product=product)
+    if start_date:
+        moves = moves.filter(date__gte=start_date)
+    if end_date:
+        moves = moves.filter(date__lte=end_date)
+
+    if cursor:
+        position = decode_cursor(cursor, scope)
+        if not isinstance(position, list) or len(position) != 4:
+            raise NotFound("Cursor inválido.")
+        last_date, last_id, carried_quantity, carried_value = position
+        moves = moves.filter(keyset_filter(KARDEX_ORDERING, [last_date, last_id]))
+        opening_quantity, opening_value = Decimal(carried_quantity), Decimal(carried_value)
+    elif start_date:
+        totals = StockMove.objects.filter(product=product, date__lt=start_date).aggregate(
+            stock=Sum('quantity'), stock_value=Sum(_move_value())
+        )
+        opening_quantity = totals['stock'] or Decimal('0.00')
+        opening_value = totals['stock_value'] or Decimal('0.00')
+    else:
+        opening_quantity = opening_value = Decimal('0.00')
+
+    def running(expression):
+        return Window(
+            Sum(expression),
+            order_by=[F(field).asc() for field in KARDEX_ORDERING],
+            frame=RowRange(start=None, end=0),
+        )
+
+    rows = list(
+        moves.annotate(
+            value=_move_value(),
+            running_quantity=running(F('quantity')),
+            running_value=running(_move_value()),
+        ).order_by(*KARDEX_ORDERING).values(
+            'id', 'date', 'quantity', 'unit_cost', 'value', 'source_type', 'source_id',
+            'journal_entry_id', 'description', 'running_quantity', 'running_value',
+        )[:page_size + 1]
+    )
+
+    has_next = len(rows) > page_size
+    results = [{
+        'id': row['id'],
+        'date': row['date'],
+        'type': 'ENTRADA' if row['quantity'] > 0 else 'SALIDA',
+        'description': row['description'],
+        'source_type': row['source_type'],
+        'source_id': row['source_id'],
+        'journal_id': row['journal_entry_id'],
+        'quantity': row['quantity'],
+        'unit_cost': row['unit_cost'],
+        'amount': abs(row['value']).quantize(Decimal('0.01')),
+        'balance_quantity': opening_quantity + row['running_quantity'],
+        'balance_value': (opening_value + row['running_value']).quantize(Decimal('0.01')),
+    } for row in rows[:page_size]]
+
+    next_cursor = None
+    if has_next:
+        # El valor se arrastra sin redondear para no acumular diferencias entre páginas
+        last = rows[page_size - 1]
+        next_cursor = encode_cursor([
+            last['date'], last['id'],
+            str(opening_quantity + last['running_quantity']), str(opening_value + last['running_value']),
+        ], scope)
+
+    return {
+        'product': {'id': product.id, 'name': product.name, 'sku': product.sku, 'current_stock': product.current_stock},
+        'start_date': start_date,
+        'end_date': end_date,
+        'opening_quantity': opening_quantity,
+        'opening_value': opening_value.quantize(Decimal('0.01')),
+        'results': results,
+        'next_cursor': next_cursor,
+    }
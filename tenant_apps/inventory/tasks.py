@@ -1,97 +1,199 @@
-from celery import shared_task
+from celery import shared_task, chord
+from django.conf import settings
+from django.db.models import F
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Sum, F
-from .models import Product, ProductDemand
-from sales.models import SOItem
-import numpy as np
-from sklearn.linear_model import LinearRegression
+from django_tenants.utils import schema_context
+from tenants.utils import tenant_schemas
 import logging
+import time
+from .forecasting import (
+    forecast_demand, forecast_incremental, product_chunks, update_demand_forecasts,
+    incremental_state, begin_full_refresh, finish_full_refresh,
+)
+from .models import ForecastRun
 
 logger = logging.getLogger(__name__)
 
 @shared_task
-def predict_stock_demand():
+def predict_stock_demand(schema_name, full=False):
     """
     Motor de IA para Predicción de Demanda (Nivel 1: Regresión Lineal Robusta).
-    Analiza histórico de ventas diarias y proyecta los próximos 30 días.
+    Analiza histórico de ventas diarias y proyecta los próximos 30 días de los
+    productos con ventas nuevas, o de todo el catálogo con `full=True`
+    (ver inventory.forecasting). Para todos los tenants en paralelo use
+    forecast_all_tenants.
     """
-    logger.info("🧠 Iniciando Motor de IA: Predicción de Demanda...")
-    
-    products = Product.objects.all()
+    logger.info(f"🧠 Iniciando Motor de IA: Predicción de Demanda ({schema_name})...")
+    started = time.perf_counter()
+
+    with schema_context(schema_name):
+        forecasts = update_demand_forecasts(full=full)
+
+    restock = sum(1 for forecast in forecasts if forecast.recommended_action == 'Restock')
+    logger.info(
+        f"🏁 Proceso de IA Finalizado en {schema_name}: {len(forecasts)} predicciones "
+        f"({restock} a reabastecer) en {time.perf_counter() - started:.2f}s."
+    )
+    return len(forecasts)
+
+
+@shared_task
+def forecast_all_tenants(chunk_size=None, full=False):
+    """
+    Orquestador nocturno: lanza un chord por tenant, con una tarea incremental
+    si tiene marca de agua o, si necesita un recálculo completo (o con
+    `full=True`), una tarea por trozo de productos. Los workers disponibles los
+    procesan en paralelo y finish_forecast_runs cierra la ForecastRun de cada
+    tenant: un trozo que falla solo deja fallida la de su tenant.
+    Devuelve {esquema: id del chord}.
+    """
+    chunk_size = chunk_size or settings.FORECAST_CHUNK_SIZE
     today = timezone.now().date()
-    start_date = today - timedelta(days=180) # Analizar últimos 6 meses
-    next_month = today + timedelta(days=30)
-
-    for product in products:
-        # 1. Extracción de Datos (ETL)
-        # Agrupamos ventas por día para crear una serie de tiempo
-        history = SOItem.objects.filter(
-            product=product,
-            sales_order__status__in=['Confirmed', 'Invoiced', 'Shipped'],
-            sales_order__order_date__gte=start_date
-        ).values('sales_order__order_date').annotate(
-            daily_qty=Sum('quantity')
-        ).order_by('sales_order__order_date')
-
-        if len(history) < 10:
-            logger.warning(f"⚠️ Datos insuficientes para predecir producto: {product.name}")
-            continue
-
-        # 2. Preprocesamiento para Scikit-Learn
-        # Convertimos fechas a números ordinales para que el modelo las entienda
-        dates = []
-        quantities = []
-        
-        for entry in history:
-            dates.append([entry['sales_order__order_date'].toordinal()])
-            quantities.append(float(entry['daily_qty']))
-
-        X = np.array(dates)
-        y = np.array(quantities)
-
-        # 3. Entrenamiento (Training)
-        # Usamos Regresión Lineal (rápida y efectiva para tendencias simples)
-        model = LinearRegression()
-        model.fit(X, y)
-
-        # 4. Inferencia (Prediction)
-        # Predecimos la venta diaria promedio para el próximo mes
-        future_dates = []
-        for i in range(1, 31):
-            future_date = today + timedelta(days=i)
-            future_dates.append([future_date.toordinal()])
-        
-        predicted_daily_sales = model.predict(future_dates)
-        
-        # Sumamos las ventas diarias predichas para obtener el total mensual, asegurando no negativos
-        total_predicted_qty = sum([max(0, qty) for qty in predicted_daily_sales])
-        
-        # Cálculo de confianza simple basado en la varianza (R^2)
-        confidence = model.score(X, y)
-        if confidence < 0: confidence = 0 # Ajuste visual
-
-        # 5. Lógica de Negocio (Enterprise Logic)
-        current_stock = float(product.current_stock)
-        recommended_action = 'Mantener'
-        
-        # Si la demanda supera el stock + 10% buffer
-        if total_predicted_qty > current_stock:
-            recommended_action = 'Restock'
-        # Si tenemos más de 3 meses de inventario basado en la predicción
-        elif total_predicted_qty > 0 and current_stock > (total_predicted_qty * 3):
-            recommended_action = 'Overstock'
-
-        # 6. Persistencia
-        ProductDemand.objects.create(
-            product=product,
-            forecast_period_start=today,
-            forecast_period_end=next_month,
-            predicted_quantity=round(total_predicted_qty, 2),
-            confidence_score=round(confidence, 2),
-            recommended_action=recommended_action
+    chords = {}
+    for schema in tenant_schemas():
+        with schema_context(schema):
+            if not full and incremental_state() is not None:
+                run = ForecastRun.objects.create(mode='incremental', forecast_date=today, chunks_total=1)
+                chords[schema] = _launch(schema, run, [forecast_tenant_incremental.s(schema, run.pk)])
+                continue
+            until_id = begin_full_refresh()
+            if until_id is None:
+                logger.warning(f"Predicción de demanda en {schema}: facturas en curso, el recálculo se pospone.")
+                continue
+            chunks = product_chunks(chunk_size, today, until_id=until_id)
+            if not chunks:
+                finish_full_refresh(today, until_id)
+                continue
+            run = ForecastRun.objects.create(
+                mode='full', forecast_date=today, until_id=until_id, chunks_total=len(chunks)
+            )
+        chords[schema] = _launch(schema, run, [forecast_chunk.s(schema, run.pk, product_ids) for product_ids in chunks])
+
+    if not chords:
+        logger.info("Predicción de demanda: ningún tenant con ventas que analizar.")
+    return chords
+
+
+def _launch(schema_name, run, header):
+    """
+    Chord de las tareas de un tenant. Si el chord no llega a su callback (un
+    worker perdido, por ejemplo), el errback deja la ForecastRun como fallida.
+    """
+    logger.info(f"Predicción de demanda en {schema_name}: {len(header)} trozos en cola.")
+    callback = finish_forecast_runs.s().on_error(fail_forecast_run.si(schema_name, run.pk))
+    return chord(header)(callback).id
+
+
+@shared_task
+def forecast_chunk(schema_name, run_id, product_ids):
+    """
+    Predice la demanda de un trozo de productos dentro del esquema del tenant y
+    suma su avance a la ForecastRun.
+    """
+    with schema_context(schema_name):
+        run = ForecastRun.objects.get(pk=run_id)
+        return _run_chunk(schema_name, run, lambda: forecast_demand(
+            today=run.forecast_date, product_ids=product_ids, until_id=run.until_id
+        ), len(product_ids))
+
+
+@shared_task
+def forecast_tenant_incremental(schema_name, run_id):
+    """
+    Pasada incremental de un tenant: solo los productos con ventas nuevas desde
+    la marca de agua.
+    """
+    with schema_context(schema_name):
+        run = ForecastRun.objects.get(pk=run_id)
+        state = incremental_state()
+        return _run_chunk(schema_name, run, lambda: forecast_incremental(state, run.forecast_date))
+
+
+def _run_chunk(schema_name, run, compute, products=None):
+    """
+    Ejecuta un trozo de una ForecastRun y suma su avance. Un error no se
+    propaga: se anota en la ForecastRun y se devuelve en el resultado, así el
+    callback del chord igual cierra la ejecución.
+    """
+    started = time.perf_counter()
+    try:
+        forecasts = compute()
+    except Exception as exc:
+        logger.exception(f"Predicción de demanda en {schema_name}: falló un trozo de la ejecución {run.pk}.")
+        ForecastRun.objects.filter(pk=run.pk).update(error=str(exc))
+        return {
+            'schema': schema_name,
+            'run_id': run.pk,
+            'products': 0,
+            'forecasts': 0,
+            'seconds': round(time.perf_counter() - started, 4),
+            'error': str(exc),
+        }
+    # En la pasada incremental los productos procesados son los que recibieron predicción
+    products = len(forecasts) if products is None else products
+    ForecastRun.objects.filter(pk=run.pk).update(
+        chunks_done=F('chunks_done') + 1,
+        products=F('products') + products,
+        forecasts=F('forecasts') + len(forecasts),
+    )
+    return {
+        'schema': schema_name,
+        'run_id': run.pk,
+        'products': products,
+        'forecasts': len(forecasts),
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+
+
+@shared_task
+def finish_forecast_runs(results):
+    """
+    Callback del chord: agrega los resultados por tenant, cierra cada ForecastRun
+    con su duración y devuelve el resumen. Si algún trozo falló, la ejecución
+    queda fallida y un recálculo completo no deja marca de agua (la siguiente
+    noche se vuelve a hacer completo).
+    """
+    summary = {}
+    for result in results:
+        tenant = summary.setdefault(result['schema'], {
+            'run_id': result['run_id'], 'chunks': 0, 'failed_chunks': 0, 'products': 0, 'forecasts': 0,
+            'worker_seconds': 0.0,
+        })
+        tenant['chunks'] += 1
+        tenant['failed_chunks'] += 1 if result.get('error') else 0
+        tenant['products'] += result['products']
+        tenant['forecasts'] += result['forecasts']
+        tenant['worker_seconds'] = round(tenant['worker_seconds'] + result['seconds'], 4)
+
+    finished_at = timezone.now()
+    for schema, tenant in summary.items():
+        with schema_context(schema):
+            run = ForecastRun.objects.get(pk=tenant['run_id'])
+            if tenant['failed_chunks']:
+                run.status = 'Failed'
+            else:
+                if run.mode == 'full':
+                    # La marca de agua solo se fija cuando terminaron bien todos los trozos
+                    finish_full_refresh(run.forecast_date, run.until_id)
+                run.status = 'Done'
+            run.finished_at = finished_at
+            run.duration_seconds = (finished_at - run.started_at).total_seconds()
+            run.save(update_fields=['status', 'finished_at', 'duration_seconds'])
+        tenant['status'] = run.status
+        tenant['duration_seconds'] = run.duration_seconds
+        logger.info(
+            f"Predicción de demanda en {schema}: {tenant['forecasts']} predicciones de "
+            f"{tenant['products']} productos ({tenant['chunks']} trozos, {tenant['failed_chunks']} fallidos) "
+            f"en {run.duration_seconds:.2f}s."
         )
-        
-        logger.info(f"✅ Predicción para {product.name}: {total_predicted_qty:.2f} unidades (Acción: {recommended_action})")
+    return summary
 
-    logger.info("🏁 Proceso de IA Finalizado.")
\ No newline at end of file
+
+@shared_task
+def fail_forecast_run(schema_name, run_id):
+    """
+    Errback del chord de un tenant: marca su ForecastRun como fallida si quedó
+    abierta.
+    """
+    with schema_context(schema_name):
+        ForecastRun.objects.filter(pk=run_id, status='Running').update(status='Failed', finished_at=timezone.now())
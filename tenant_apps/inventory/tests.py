@@ -1,3 +1,387 @@
-from django.test import TestCase
+import threading
+from unittest import mock
+from importlib import import_module
+from types import SimpleNamespace
+from datetime import date, timedelta
+from decimal import Decimal
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from django_tenants.utils import schema_context
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.models import User
+from stward_erp.testing import business_queries
+from accounting.models import Account
+from purchasing.models import Supplier, PurchaseOrder, POItem
+from purchasing.services import receive_purchase_order
+from sales.models import Customer, SalesOrder, SOItem
+from sales.services import invoice_sales_order
+from inventory.models import Category, UnitOfMeasure, Product, ProductDemand, StockMove
+from inventory.forecasting import STATS_FIELDS, forecast_demand, update_demand_forecasts
+from inventory.models import ForecastRun, DemandForecastState, ProductDemandStats
+from inventory.tasks import forecast_all_tenants
+from stward_erp.celery import app as celery_app
+from inventory.services import product_kardex, apply_stock_changes, record_stock_moves
+from inventory.views import ProductKardexView
 
-# Create your tests here.
+
+class StockMoveTests(TenantTestCase):
+
+    def setUp(self):
+        Account.objects.create(name='Proveedores', code='2205', account_type='LIABILITY')
+        Account.objects.create(name='Clientes', code='110505', account_type='ASSET')
+        inventory = Account.objects.create(name='Inventario', code='1435', account_type='ASSET')
+        income = Account.objects.create(name='Ventas', code='4135', account_type='REVENUE')
+        Account.objects.create(name='Costo de Ventas', code='6135', account_type='EXPENSE')
+        category = Category.objects.create(name='Bebidas', asset_account=inventory, income_account=income)
+        unit = UnitOfMeasure.objects.create(name='Unidad', abbreviation='und')
+        self.product = Product.objects.create(name='Café', sku='CAF-1', category=category, unit_of_measure=unit)
+        # Nombre que contiene al del otro producto: el kardex anterior los mezclaba
+        self.other = Product.objects.create(name='Café Molido', sku='CAF-2', category=category, unit_of_measure=unit)
+        self.supplier = Supplier.objects.create(name='Proveedor Uno')
+        self.customer = Customer.objects.create(name='Cliente Uno', ruc='155555-1-2025', taxpayer_type='Extranjero')
+        self.user = User.objects.create_user(username='bodega', password='x')
+
+    def receive(self, lines, supplier=None, tax_rate='0'):
+        order = PurchaseOrder.objects.create(supplier=supplier or self.supplier, status='Submitted')
+        for product, quantity, cost in lines:
+            POItem.objects.create(
+                purchase_order=order, product=product, quantity=Decimal(quantity),
+                unit_price=Decimal(cost), tax_rate=Decimal(tax_rate),
+            )
+        order.calculate_totals()
+        return receive_purchase_order(order, self.user)
+
+    def invoice(self, product, quantity, price, tax_rate='0'):
+        order = SalesOrder.objects.create(customer=self.customer)
+        SOItem.objects.create(
+            sales_order=order, product=product, quantity=Decimal(quantity),
+            unit_price=Decimal(price), tax_rate=Decimal(tax_rate),
+        )
+        order.calculate_totals()
+        return invoice_sales_order(order, self.user)
+
+    def test_documents_write_moves_and_sales_use_average_cost(self):
+        self.receive([(self.product, '10', '2.00'), (self.other, '5', '9.00')])
+        self.receive([(self.product, '10', '4.00')])
+        self.invoice(self.product, '5', '10.00')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, Decimal('15.00'))
+        out = StockMove.objects.get(product=self.product, source_type='sales_order')
+        self.assertEqual(out.quantity, Decimal('-5.00'))
+        self.assertEqual(out.unit_cost, Decimal('3.00'))
+        self.assertIsNotNone(out.journal_entry_id)
+
+        kardex = product_kardex(self.product)
+        self.assertEqual([row['type'] for row in kardex['results']], ['ENTRADA', 'ENTRADA', 'SALIDA'])
+        self.assertEqual([row['balance_quantity'] for row in kardex['results']], [Decimal('10'), Decimal('20'), Decimal('15')])
+        self.assertEqual(kardex['results'][-1]['balance_value'], Decimal('45.00'))
+
+    def test_taxed_documents_post_balanced_itbms_lines(self):
+        Account.objects.create(name='ITBMS por Pagar', code='2408', account_type='LIABILITY')
+        Account.objects.create(name='ITBMS Crédito Fiscal', code='1355', account_type='ASSET')
+        Account.objects.create(name='ITBMS Retenido por Pagar', code='2367', account_type='LIABILITY')
+        local = Supplier.objects.create(name='Proveedor Local', supplier_type='Local')
+
+        def amounts(entry):
+            return {
+                item.account.code: (item.debit, item.credit)
+                for item in entry.items.select_related('account')
+            }
+
+        # Compra de 80.00 + 7%: 50% del ITBMS se retiene y se entera a la DGI
+        received = amounts(self.receive([(self.product, '4', '20.00')], supplier=local, tax_rate='0.07'))
+        self.assertEqual(received, {
+            '1435': (Decimal('80.00'), Decimal('0.00')),
+            '1355': (Decimal('5.60'), Decimal('0.00')),
+            '2205': (Decimal('0.00'), Decimal('82.80')),
+            '2367': (Decimal('0.00'), Decimal('2.80')),
+        })
+
+        invoiced = amounts(self.invoice(self.product, '2', '50.00', tax_rate='0.07'))
+        self.assertEqual(invoiced, {
+            '110505': (Decimal('107.00'), Decimal('0.00')),
+            '4135': (Decimal('0.00'), Decimal('100.00')),
+            '2408': (Decimal('0.00'), Decimal('7.00')),
+            # Costo de lo vendido: 2 unidades a 20.00 salen del inventario
+            '6135': (Decimal('40.00'), Decimal('0.00')),
+            '1435': (Decimal('0.00'), Decimal('40.00')),
+        })
+
+    def test_backfill_rebuilds_kardex_of_older_documents(self):
+        backfill = import_module('inventory.migrations.0005_backfill_stock_moves').backfill_stock_moves
+        self.receive([(self.product, '10', '2.00')])
+        self.receive([(self.product, '10', '4.00')])
+        self.invoice(self.product, '5', '10.00')
+        # Documentos anteriores al kardex y un ajuste manual de stock que nunca se registró
+        StockMove.objects.all().delete()
+        Product.objects.filter(pk=self.product.pk).update(current_stock=Decimal('16.00'))
+        Product.objects.filter(pk=self.other.pk).update(current_stock=Decimal('3.00'))
+
+        backfill(None, SimpleNamespace(connection=connection))
+        backfill(None, SimpleNamespace(connection=connection))
+
+        sale = StockMove.objects.get(product=self.product, source_type='sales_order')
+        self.assertEqual(sale.quantity, Decimal('-5.00'))
+        self.assertEqual(sale.unit_cost, Decimal('3.00'))
+        self.assertIsNotNone(sale.journal_entry_id)
+        self.assertEqual(StockMove.objects.filter(source_type='purchase_order').count(), 2)
+        self.assertFalse(StockMove.objects.filter(source_type='purchase_order', journal_entry__isnull=True).exists())
+        for product in (self.product, self.other):
+            product.refresh_from_db()
+            kardex = product_kardex(product)
+            self.assertEqual(kardex['results'][0]['source_type'], 'opening')
+            self.assertEqual(kardex['results'][-1]['balance_quantity'], product.current_stock)
+
+    def test_kardex_pages_carry_running_balances(self):
+        for day, quantity in ((1, '3'), (2, '-1'), (3, '4'), (4, '-2'), (5, '1')):
+            StockMove.objects.create(
+                product=self.product, date=date(2025, 3, day), quantity=Decimal(quantity),
+                unit_cost=Decimal('2.50'), source_type='purchase_order', source_id=day,
+            )
+        StockMove.objects.create(
+            product=self.other, date=date(2025, 3, 2), quantity=Decimal('50'),
+            unit_cost=Decimal('1.00'), source_type='purchase_order', source_id=99,
+        )
+        full = product_kardex(self.product)['results']
+
+        rows, cursor = [], None
+        while True:
+            with CaptureQueriesContext(connection) as context:
+                page = product_kardex(self.product, cursor=cursor, page_size=2)
+            self.assertEqual(len(business_queries(context)), 1)
+            rows += page['results']
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(rows, full)
+        self.assertEqual(rows[-1]['balance_quantity'], Decimal('5'))
+        self.assertEqual(rows[-1]['balance_value'], Decimal('12.50'))
+
+        ranged = product_kardex(self.product, start_date=date(2025, 3, 3))
+        self.assertEqual(ranged['opening_quantity'], Decimal('2'))
+        self.assertEqual(ranged['opening_value'], Decimal('5.00'))
+        self.assertEqual(ranged['results'][0]['balance_quantity'], Decimal('6'))
+
+    def test_view_returns_kardex_and_404(self):
+        self.receive([(self.product, '2', '3.00')])
+        request = APIRequestFactory().get('/', {'page_size': '1'})
+        force_authenticate(request, user=self.user)
+        response = ProductKardexView.as_view()(request, product_id=self.product.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['amount'], Decimal('6.00'))
+        self.assertIsNone(response.data['next'])
+
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        self.assertEqual(ProductKardexView.as_view()(request, product_id=0).status_code, 404)
+
+
+class DemandForecastTests(TenantTestCase):
+
+    def setUp(self):
+        unit = UnitOfMeasure.objects.create(name='Unidad', abbreviation='und')
+        self.customer = Customer.objects.create(name='Cliente Uno', ruc='155555-1-2025', taxpayer_type='Extranjero')
+        self.today = timezone.now().date()
+        self.growing = Product.objects.create(name='Café', sku='CAF-1', unit_of_measure=unit, current_stock=Decimal('5'))
+        self.steady = Product.objects.create(name='Té', sku='TE-1', unit_of_measure=unit, current_stock=Decimal('500'))
+        self.rare = Product.objects.create(name='Cacao', sku='CAC-1', unit_of_measure=unit)
+        self.series = {self.growing: [], self.steady: []}
+        for offset in range(12):
+            day = self.today - timedelta(days=60 - offset * 5)
+            self.sell(self.growing, day, Decimal(2 + offset))
+            self.sell(self.steady, day, Decimal('3') + (offset % 2))
+            self.series[self.growing].append(((day - self.today).days, 2 + offset))
+            self.series[self.steady].append(((day - self.today).days, 3 + offset % 2))
+        self.sell(self.rare, self.today - timedelta(days=3), Decimal('1'))
+
+    def sell(self, product, day, quantity):
+        order = SalesOrder.objects.create(customer=self.customer, status='Invoiced', invoice_date=day)
+        SOItem.objects.create(sales_order=order, product=product, quantity=quantity, unit_price=Decimal('1'))
+        record_stock_moves([(product, -quantity, Decimal('1'), f"Salida SO-{order.pk}")], day, 'sales_order', order.pk)
+
+    def test_one_query_fit_matches_least_squares_and_bulk_creates(self):
+        with CaptureQueriesContext(connection) as context:
+            forecasts = forecast_demand(today=self.today)
+        sql = business_queries(context)
+        # Serie de ventas, upsert de estadísticos, stock actual e INSERT masivo
+        self.assertEqual(len(sql), 4)
+
+        by_product = {forecast.product_id: forecast for forecast in forecasts}
+        self.assertNotIn(self.rare.id, by_product)
+        for product, points in self.series.items():
+            x, y = np.array(points, dtype=float).T
+            slope, intercept = np.polyfit(x, y, 1)
+            expected = np.clip(intercept + slope * np.arange(1, 31), 0, None).sum()
+            self.assertAlmostEqual(float(by_product[product.id].predicted_quantity), expected, places=1)
+        self.assertEqual(by_product[self.growing.id].recommended_action, 'Restock')
+        self.assertEqual(by_product[self.growing.id].confidence_score, 1.0)
+        self.assertEqual(by_product[self.steady.id].recommended_action, 'Overstock')
+        self.assertEqual(ProductDemand.objects.count(), 2)
+
+    def test_orchestrator_runs_a_chord_of_chunks_per_tenant(self):
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+        forecast_all_tenants.delay(chunk_size=2)
+
+        # Tres productos con ventas en trozos de 2: dos tareas; Cacao no alcanza a ajustarse
+        run = ForecastRun.objects.get()
+        self.assertEqual((run.status, run.chunks_done, run.chunks_total, run.progress), ('Done', 2, 2, 100))
+        self.assertEqual((run.products, run.forecasts), (3, 2))
+        self.assertIsNotNone(run.duration_seconds)
+        self.assertEqual(ProductDemand.objects.count(), 2)
+
+    def test_failed_chunk_only_fails_its_own_tenant_run(self):
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+        schema = connection.schema_name
+        calls = []
+
+        def flaky(**kwargs):
+            calls.append(kwargs['product_ids'])
+            if len(calls) == 1:
+                raise RuntimeError('worker sin memoria')
+            return forecast_demand(**kwargs)
+
+        # Dos "tenants" (el mismo esquema dos veces): cada uno con su propio chord
+        with mock.patch('inventory.tasks.tenant_schemas', return_value=[schema, schema]), \
+                mock.patch('inventory.tasks.forecast_demand', side_effect=flaky):
+            chords = forecast_all_tenants.delay(chunk_size=2).get()
+
+        self.assertEqual(list(chords), [schema])
+        failed, done = ForecastRun.objects.order_by('pk')
+        self.assertEqual((failed.status, failed.chunks_done, failed.chunks_total), ('Failed', 1, 2))
+        self.assertEqual(failed.error, 'worker sin memoria')
+        self.assertIsNotNone(failed.finished_at)
+        self.assertEqual((done.status, done.chunks_done), ('Done', 2))
+        # Solo el recálculo que terminó bien deja marca de agua
+        self.assertEqual(DemandForecastState.objects.get().last_move_id, done.until_id)
+
+    def predictions(self, forecasts):
+        return {forecast.product_id: forecast.predicted_quantity for forecast in forecasts}
+
+    def test_incremental_pass_only_refits_products_with_new_sales(self):
+        update_demand_forecasts(today=self.today - timedelta(days=1), history_days=60)
+        state = DemandForecastState.objects.get()
+        self.assertEqual(ProductDemandStats.objects.count(), 3)
+
+        self.sell(self.growing, self.today - timedelta(days=10), Decimal('4'))
+        self.sell(self.growing, self.today, Decimal('20'))
+        with CaptureQueriesContext(connection) as context:
+            incremental = update_demand_forecasts(today=self.today, history_days=60)
+        self.assertEqual([forecast.product_id for forecast in incremental], [self.growing.id])
+        self.assertGreater(DemandForecastState.objects.get().last_move_id, state.last_move_id)
+        # Sin nada nuevo, la pasada siguiente no predice nada
+        self.assertEqual(update_demand_forecasts(today=self.today, history_days=60), [])
+
+        full = update_demand_forecasts(today=self.today, full=True, history_days=60)
+        self.assertEqual(self.predictions(incremental)[self.growing.id], self.predictions(full)[self.growing.id])
+        sql = business_queries(context)
+        # Marca de agua, último id y escrituras en curso, días que salen, días nuevos,
+        # estadísticos (lectura y upsert), stock, predicciones y avance de la marca:
+        # no depende del número de productos
+        self.assertEqual(len(sql), 10)
+
+    def test_draft_orders_count_when_invoiced(self):
+        category = Category.objects.create(
+            name='Bebidas', income_account=Account.objects.create(name='Ventas', code='4135', account_type='REVENUE')
+        )
+        Account.objects.create(name='Clientes', code='110505', account_type='ASSET')
+        Product.objects.filter(pk=self.growing.pk).update(category=category)
+        # Borrador creado antes de la primera pasada y facturado entre las dos
+        draft = SalesOrder.objects.create(customer=self.customer)
+        SOItem.objects.create(
+            sales_order=draft, product=self.growing, quantity=Decimal('9'), unit_price=Decimal('1'), tax_rate=Decimal('0'),
+        )
+        draft.calculate_totals()
+        update_demand_forecasts(today=self.today, history_days=60)
+        self.assertEqual(update_demand_forecasts(today=self.today, history_days=60), [])
+
+        invoice_sales_order(draft, User.objects.create_user(username='ventas', password='x'))
+        incremental = update_demand_forecasts(today=self.today, history_days=60)
+        stats = ProductDemandStats.objects.values_list('product_id', *STATS_FIELDS).order_by('product_id')
+        incremental_stats = list(stats)
+
+        full = update_demand_forecasts(today=self.today, full=True, history_days=60)
+        self.assertEqual([forecast.product_id for forecast in incremental], [self.growing.id])
+        self.assertEqual(self.predictions(incremental)[self.growing.id], self.predictions(full)[self.growing.id])
+        for incremental_row, full_row in zip(incremental_stats, stats, strict=True):
+            self.assertEqual(incremental_row[:2], full_row[:2])
+            np.testing.assert_allclose(incremental_row[2:], full_row[2:])
+
+    def test_incremental_pass_drops_days_leaving_the_window(self):
+        update_demand_forecasts(today=self.today - timedelta(days=5), history_days=58)
+        stats = ProductDemandStats.objects.get(product=self.steady)
+        self.assertEqual(stats.n, 12)
+
+        incremental = update_demand_forecasts(today=self.today, history_days=58)
+        # El día -60 sale de la ventana en los dos productos que vendieron ese día
+        self.assertEqual(ProductDemandStats.objects.get(product=self.steady).n, 11)
+        full = update_demand_forecasts(today=self.today, full=True, history_days=58)
+        for product_id, quantity in self.predictions(full).items():
+            self.assertAlmostEqual(float(self.predictions(incremental)[product_id]), float(quantity), places=2)
+
+
+class StockConcurrencyTests(TenantTestCase):
+    """
+    Los hilos usan sus propias conexiones y no ven la transacción del test: los
+    productos se crean confirmados en setUpClass (se borran con el esquema).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        unit = UnitOfMeasure.objects.create(name='Unidad', abbreviation='und')
+        cls.products = [
+            Product.objects.create(name=f'Producto {i}', sku=f'P-{i}', unit_of_measure=unit, current_stock=Decimal('100'))
+            for i in range(3)
+        ]
+
+    def test_parallel_receipts_and_sales_lose_no_updates(self):
+        schema = connection.schema_name
+        ids = [product.id for product in self.products]
+        threads, rounds = 8, 25
+        errors = []
+        barrier = threading.Barrier(threads)
+
+        def worker(number):
+            try:
+                barrier.wait()
+                with schema_context(schema):
+                    for i in range(rounds):
+                        # Cada hilo recorre los productos en un orden distinto
+                        order = ids if (number + i) % 2 else list(reversed(ids))
+                        with transaction.atomic():
+                            apply_stock_changes([(pk, Decimal('3')) for pk in order])
+                            apply_stock_changes([(order[0], Decimal('-1')), (order[-1], Decimal('-2'))])
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        stock = dict(Product.objects.filter(pk__in=ids).values_list('id', 'current_stock'))
+        operations = threads * rounds
+        # Los extremos reciben 3 y venden 1 o 2 según el orden (la mitad de las veces cada uno)
+        self.assertEqual(stock[ids[1]], Decimal('100') + 3 * operations)
+        self.assertEqual(stock[ids[0]] + stock[ids[2]], Decimal('200') + (6 - 3) * operations)
+        self.assertEqual(stock[ids[0]], Decimal('100') + operations * Decimal('1.5'))
+
+    def test_changes_are_summed_per_product_in_one_update(self):
+        first, second, _ = self.products
+        with CaptureQueriesContext(connection) as context:
+            applied = apply_stock_changes([(second.id, 2), (first.id, 5), (second.id, -2), (first.id, '0.5')])
+        self.assertEqual(applied, {first.id: Decimal('5.5')})
+        sql = [q['sql'] for q in context.captured_queries if q['sql'].startswith(('SELECT', 'UPDATE'))]
+        self.assertEqual(len(sql), 2)
+        self.assertIn('FOR UPDATE', sql[0])
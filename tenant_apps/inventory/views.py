@@ -1,9 +1,13 @@
 from rest_framework import viewsets, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from stward_erp.pagination import HybridPagination
+from stward_erp.utils import parse_date_param
 from .models import Category, UnitOfMeasure, Product
 from .serializers import CategorySerializer, UnitOfMeasureSerializer, ProductSerializer
-from accounting.models import JournalItem 
+from .services import product_kardex, KARDEX_PAGE_SIZE
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
@@ -20,40 +24,30 @@ class ProductViewSet(viewsets.ModelViewSet):
 # --- VISTA DE KARDEX (HISTORIAL DE MOVIMIENTOS) ---
 class ProductKardexView(APIView):
     """
-    Devuelve los movimientos contables (Entradas/Salidas) de un producto.
+    Devuelve los movimientos de inventario (Entradas/Salidas) de un producto con
+    existencia y valor corridos (?start_date, ?end_date).
+    Se pagina con ?cursor= (el 'next_cursor' de la página anterior) y ?page_size=.
     """
     def get(self, request, product_id):
         try:
             product = Product.objects.get(id=product_id)
-            
-            # Validación
-            if not product.category or not product.category.asset_account:
-                return Response(
-                    {'detail': 'Este producto no tiene cuenta de activo configurada en su categoría.'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Buscamos movimientos en la cuenta de activo que mencionen al producto
-            movements = JournalItem.objects.filter(
-                account=product.category.asset_account,
-                description__icontains=product.name 
-            ).select_related('journal_entry').order_by('-journal_entry__date', '-id')
-
-            data = []
-            
-            for mov in movements:
-                # Débito = Entrada, Crédito = Salida
-                mov_type = "ENTRADA" if mov.debit > 0 else "SALIDA"
-                
-                data.append({
-                    'date': mov.journal_entry.date,
-                    'type': mov_type,
-                    'description': mov.description,
-                    'amount': mov.debit if mov.debit > 0 else mov.credit,
-                    'journal_id': mov.journal_entry.id
-                })
-
-            return Response(data, status=status.HTTP_200_OK)
-
         except Product.DoesNotExist:
-            return Response({'detail': 'Producto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({'detail': 'Producto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            page_size = int(request.query_params.get('page_size', KARDEX_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'page_size': "Debe ser un entero."})
+
+        data = product_kardex(
+            product,
+            start_date=parse_date_param(request, 'start_date'),
+            end_date=parse_date_param(request, 'end_date'),
+            cursor=request.query_params.get('cursor'),
+            page_size=min(max(page_size, 1), HybridPagination.max_page_size),
+        )
+        if data['next_cursor']:
+            data['next'] = replace_query_param(request.build_absolute_uri(), 'cursor', data['next_cursor'])
+        else:
+            data['next'] = None
+        return Response(data, status=status.HTTP_200_OK)
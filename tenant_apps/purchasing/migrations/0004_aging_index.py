@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchasing', '0003_poitem_tax_rate_purchaseorder_apply_retention_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(condition=models.Q(('status__in', ['Received', 'Completed'])), fields=['supplier', 'order_date', 'id'], include=('payable_amount',), name='po_open_ap_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchasing', '0004_aging_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(condition=models.Q(('status__in', ['Received', 'Completed'])), fields=['order_date', 'id'], name='po_received_date_idx'),
+        ),
+    ]
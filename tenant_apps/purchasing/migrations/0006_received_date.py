@@ -0,0 +1,69 @@
+# Generated by Django 4.2.13 on 2026-10-18 08:50
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_received_date(apps, schema_editor):
+    """
+    Fecha de recepción de las compras ya recibidas, por rangos de id: la de su
+    entrada de almacén (el asiento de la recepción) si existe, o si no la única
+    fecha guardada, order_date. Cada lote se confirma por separado.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT MIN(id), MAX(id) FROM purchasing_purchaseorder WHERE status IN ('Received', 'Completed')"
+        )
+        min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            return
+        for start in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                """
+                UPDATE purchasing_purchaseorder o
+                SET received_date = COALESCE((
+                    SELECT MIN(m.date) FROM inventory_stockmove m
+                    WHERE m.source_type = 'purchase_order' AND m.source_id = o.id
+                ), o.order_date)
+                WHERE o.status IN ('Received', 'Completed') AND o.received_date IS NULL
+                  AND o.id >= %s AND o.id < %s
+                """,
+                [start, start + BACKFILL_BATCH_SIZE],
+            )
+
+
+class Migration(migrations.Migration):
+    # Lotes confirmados uno a uno e índices CONCURRENTLY: no se bloquea la escritura
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0002_stockmove'),
+        ('purchasing', '0005_tax_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='received_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Fecha de Recepción'),
+        ),
+        migrations.RunPython(backfill_received_date, migrations.RunPython.noop),
+        RemoveIndexConcurrently(
+            model_name='purchaseorder',
+            name='po_open_ap_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='purchaseorder',
+            name='po_received_date_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='purchaseorder',
+            index=models.Index(condition=models.Q(('status__in', ['Received', 'Completed'])), fields=['supplier', 'received_date', 'id'], include=('payable_amount',), name='po_open_ap_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='purchaseorder',
+            index=models.Index(condition=models.Q(('status__in', ['Received', 'Completed'])), fields=['received_date', 'id'], name='po_receipt_date_idx'),
+        ),
+    ]
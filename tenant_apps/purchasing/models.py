@@ -36,6 +36,8 @@ class PurchaseOrder(models.Model):
     supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT, related_name='purchase_orders')
     order_date = models.DateField(auto_now_add=True)
     expected_delivery_date = models.DateField(null=True, blank=True)
+    # Fecha de recepción (la fija receive_purchase_order): es la que cuenta para el ITBMS y la antigüedad
+    received_date = models.DateField(null=True, blank=True, verbose_name="Fecha de Recepción")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Draft')
     
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
@@ -96,6 +98,20 @@ class PurchaseOrder(models.Model):
     def __str__(self):
         return f"PO-{self.id} | {self.supplier.name}"
 
+    class Meta:
+        indexes = [
+            # Antigüedad de CxP: compras recibidas de cada proveedor en orden FIFO
+            models.Index(
+                fields=['supplier', 'received_date', 'id'], include=['payable_amount'],
+                condition=models.Q(status__in=['Received', 'Completed']), name='po_open_ap_idx',
+            ),
+            # Declaración de ITBMS y libro de compras: compras recibidas por rango de fecha de recepción
+            models.Index(
+                fields=['received_date', 'id'], condition=models.Q(status__in=['Received', 'Completed']),
+                name='po_receipt_date_idx',
+            ),
+        ]
+
 class POItem(models.Model):
     purchase_order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='items')
     # Usamos string reference para evitar importación circular
@@ -45,6 +45,7 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
             'supplier',
             'supplier_name', 
             'order_date', 
+            'received_date',
             'expected_delivery_date', 
             'status', 
             'created_by', 
@@ -64,7 +65,7 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
             'items'
         ]
         read_only_fields = [
-            'order_date', 'created_by',
+            'order_date', 'received_date', 'created_by',
             'subtotal', 'tax_amount', 'retention_amount', 
             'total_amount', 'payable_amount'
         ]
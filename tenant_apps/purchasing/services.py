@@ -1,13 +1,21 @@
+from decimal import Decimal
 from django.db import transaction
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
-from accounting.models import JournalEntry, JournalItem, Account
+from accounting.models import Account
+from accounting.services import create_journal_entry
+from inventory.services import apply_stock_changes, record_stock_moves
+
+CENT = Decimal('0.01')
+
 
 def receive_purchase_order(purchase_order, user):
     """
     1. Valida que la orden no esté ya recibida.
-    2. Aumenta el stock físico en el modelo Product.
-    3. Genera el asiento contable (Débito a Inventario / Crédito a Proveedores).
+    2. Aumenta el stock físico en el modelo Product y registra las entradas en el kardex.
+    3. Genera el asiento contable: Débito a Inventario y a ITBMS Crédito Fiscal (1355),
+       Crédito a Proveedores por lo que se les paga y a ITBMS Retenido por Pagar (2367)
+       por la retención que se entera a la DGI.
     """
     if purchase_order.status == 'Completed':
         raise ValidationError("Esta orden ya ha sido recibida anteriormente.")
@@ -21,25 +29,33 @@ def receive_purchase_order(purchase_order, user):
     except Account.DoesNotExist:
         raise ValidationError("Falta configurar la cuenta '2205' (Proveedores) en el Plan de Cuentas.")
 
-    with transaction.atomic():
-        # A. Crear Cabecera del Asiento
-        entry = JournalEntry.objects.create(
-            date=timezone.now().date(),
-            description=f"Recepción PO-{purchase_order.id} | Prov: {purchase_order.supplier.name}",
-            created_by=user
-        )
+    tax_amount = Decimal(purchase_order.tax_amount).quantize(CENT)
+    retention_amount = Decimal(purchase_order.retention_amount).quantize(CENT)
+    tax_account = retention_account = None
+    if tax_amount > 0:
+        try:
+            tax_account = Account.objects.get(code='1355') # ITBMS Crédito Fiscal
+        except Account.DoesNotExist:
+            raise ValidationError("Falta configurar la cuenta '1355' (ITBMS Crédito Fiscal) en el Plan de Cuentas.")
+    if retention_amount > 0:
+        try:
+            retention_account = Account.objects.get(code='2367') # ITBMS Retenido por Pagar
+        except Account.DoesNotExist:
+            raise ValidationError("Falta configurar la cuenta '2367' (ITBMS Retenido por Pagar) en el Plan de Cuentas.")
 
-        # B. Registrar Deuda (Haber/Crédito a Proveedores)
-        JournalItem.objects.create(
-            journal_entry=entry,
-            account=payable_account,
-            debit=0,
-            credit=purchase_order.total_amount,
-            description=f"CxP - Orden Compra #{purchase_order.id}"
-        )
+    with transaction.atomic():
+        # A. Registrar Deuda (Haber/Crédito a Proveedores); el monto se fija al final
+        payable = {
+            'account': payable_account,
+            'debit': 0,
+            'credit': Decimal('0.00'),
+            'description': f"CxP - Orden Compra #{purchase_order.id}"
+        }
+        lines = [payable]
+        moves = []
 
-        # C. Procesar cada producto (Aumentar Stock y Registrar Activo)
-        for item in purchase_order.items.all():
+        # B. Procesar cada producto (Aumentar Stock y Registrar Activo)
+        for item in purchase_order.items.select_related('product__category__asset_account'):
             product = item.product
             
             # Validar que el producto tenga cuenta de activo asignada en su categoría
@@ -48,21 +64,49 @@ def receive_purchase_order(purchase_order, user):
                     f"El producto '{product.name}' (Categoría: {product.category}) no tiene 'Cuenta de Activo' configurada."
                 )
             
-            # 1. AUMENTAR STOCK FÍSICO
-            product.current_stock += item.quantity
-            product.save()
+            # 1. AUMENTAR STOCK FÍSICO (se aplica junto al final)
+            moves.append((product, item.quantity, item.unit_price, f"Entrada PO-{purchase_order.id}"))
 
             # 2. REGISTRAR VALOR EN LIBROS (Debe/Débito a Inventario)
-            JournalItem.objects.create(
-                journal_entry=entry,
-                account=product.category.asset_account,
-                debit=item.total_price, # Cantidad * Costo
-                credit=0,
-                description=f"Entrada Almacén: {product.name} (+{item.quantity})"
-            )
+            lines.append({
+                'account': product.category.asset_account,
+                'debit': Decimal(item.total_line).quantize(CENT), # Cantidad * Costo
+                'credit': 0,
+                'description': f"Entrada Almacén: {product.name} (+{item.quantity})"
+            })
+
+        # C. ITBMS: crédito fiscal a favor y la parte retenida, que se entera a la DGI
+        if tax_account:
+            lines.append({
+                'account': tax_account,
+                'debit': tax_amount,
+                'credit': 0,
+                'description': f"ITBMS PO-{purchase_order.id}"
+            })
+        if retention_account:
+            lines.append({
+                'account': retention_account,
+                'debit': 0,
+                'credit': retention_amount,
+                'description': f"ITBMS Retenido PO-{purchase_order.id}"
+            })
+        # Al proveedor se le debe el total menos la retención, ya redondeado: el asiento siempre cuadra
+        payable['credit'] = sum(line['debit'] for line in lines) - retention_amount
+
+        # D. Crear el Asiento (cabecera + líneas + saldos diarios)
+        received_date = timezone.now().date()
+        entry = create_journal_entry(
+            date=received_date,
+            description=f"Recepción PO-{purchase_order.id} | Prov: {purchase_order.supplier.name}",
+            lines=lines,
+            created_by=user
+        )
+        apply_stock_changes((product.id, quantity) for product, quantity, _, _ in moves)
+        record_stock_moves(moves, entry.date, 'purchase_order', purchase_order.id, journal_entry=entry)
 
-        # D. Cerrar la Orden
+        # E. Cerrar la Orden
         purchase_order.status = 'Completed'
+        purchase_order.received_date = received_date
         purchase_order.save()
 
     return entry
\ No newline at end of file
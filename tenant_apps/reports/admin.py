@@ -1,3 +1,37 @@
 from django.contrib import admin
+from .models import ReportJob, KpiSnapshot, BiExportWatermark
 
-# Register your models here.
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """
+    Seguimiento de los reportes asíncronos (solo lectura).
+    """
+    list_display = ('id', 'report_type', 'status', 'progress', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('report_type', 'status')
+    readonly_fields = [field.name for field in ReportJob._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+
+@admin.register(KpiSnapshot)
+class KpiSnapshotAdmin(admin.ModelAdmin):
+    """
+    Indicadores precalculados del dashboard (solo lectura).
+    """
+    list_display = ('key', 'value', 'refreshed_at')
+    readonly_fields = [field.name for field in KpiSnapshot._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+
+@admin.register(BiExportWatermark)
+class BiExportWatermarkAdmin(admin.ModelAdmin):
+    """
+    Marcas de agua de la exportación BI. Editar last_id fuerza a reexportar desde ahí.
+    """
+    list_display = ('fact', 'last_id', 'rows_exported', 'exported_at')
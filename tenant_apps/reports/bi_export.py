@@ -0,0 +1,213 @@
+"""
+Exportación columnar (Parquet o Arrow IPC) de tablas de hechos para BI.
+
+Cada hecho se lee con un cursor del lado del servidor (QuerySet.iterator) y se
+escribe por lotes (record batches), con tipos reales: decimal128 para importes,
+date32 para fechas, int64 para ids. La exportación incremental parte de la marca
+de agua (último id exportado) de cada hecho.
+
+Notas:
+- Los hechos se tratan como de solo inserción: una fila editada después de
+  exportada no se vuelve a exportar (salvo con una exportación completa). Por
+  eso no llevan lo que cambia con el tiempo, como el estado de la orden: eso va
+  en las dimensiones (DIMENSIONS), que se exportan completas en cada corrida y
+  reemplazan la foto anterior ({dimensión}.parquet); BI las une por el id.
+- El límite superior no es un simple MAX(id): los ids se asignan al insertar pero
+  las filas se ven al confirmar, así que una transacción lenta puede confirmar un
+  id menor que el MAX ya exportado y la marca de agua lo saltaría para siempre.
+  stward_erp.db.stable_max_id lee MAX(id) y espera a que terminen las transacciones de
+  escritura que seguían abiertas: desde ese momento ningún id <= MAX puede
+  aparecer. Se eligió esto en lugar de re-exportar un margen de ids porque no
+  duplica filas en los archivos. Si alguna sigue abierta tras
+  BI_IN_FLIGHT_WAIT_SECONDS, el hecho se salta hasta la siguiente exportación
+  (la marca de agua no avanza).
+- pyarrow es una dependencia opcional; sin ella el resto del sistema funciona y
+  esta exportación responde con un error claro.
+"""
+import itertools
+import os
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.utils import timezone
+from stward_erp.db import stable_max_id
+from accounting.models import JournalItem
+from purchasing.models import PurchaseOrder, POItem
+from sales.models import SalesOrder, SOItem
+from treasury.models import TreasuryMovement
+from .exports import EXPORT_CHUNK_SIZE
+from .models import BiExportWatermark
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    pa = pq = None
+    HAS_PYARROW = False
+
+BI_OUTPUT_FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+# Espera máxima a las transacciones de escritura en curso antes de fijar el límite superior
+BI_IN_FLIGHT_WAIT_SECONDS = 30
+
+FACTS = {
+    'journal_items': (JournalItem, [
+        'id', 'journal_entry_id', 'entry_date', 'account_id', 'account__code', 'account_type',
+        'debit', 'credit', 'description', 'journal_entry__created_at',
+    ]),
+    'sales_items': (SOItem, [
+        'id', 'sales_order_id', 'sales_order__order_date', 'sales_order__customer_id', 'product_id', 'product__sku', 'quantity', 'unit_price', 'discount', 'tax_rate',
+    ]),
+    'purchase_items': (POItem, [
+        'id', 'purchase_order_id', 'purchase_order__order_date', 'purchase_order__supplier_id',
+        'product_id', 'product__sku', 'quantity', 'unit_price', 'tax_rate',
+    ]),
+    'treasury_movements': (TreasuryMovement, [
+        'id', 'date', 'movement_type', 'amount', 'customer_id', 'supplier_id',
+        'from_bank_account_id', 'from_cash_register_id', 'to_bank_account_id', 'to_cash_register_id',
+    ]),
+}
+
+# Fotos del estado actual de cada documento (sin marca de agua)
+DIMENSIONS = {
+    'sales_orders': (SalesOrder, [
+        'id', 'customer_id', 'order_date', 'invoice_date', 'status', 'dgi_status',
+        'subtotal_exempt', 'subtotal_taxable', 'tax_amount', 'discount_total', 'total_amount',
+    ]),
+    'purchase_orders': (PurchaseOrder, [
+        'id', 'supplier_id', 'order_date', 'received_date', 'status',
+        'subtotal', 'tax_amount', 'retention_amount', 'total_amount', 'payable_amount',
+    ]),
+}
+
+
+def require_pyarrow():
+    if not HAS_PYARROW:
+        raise ImproperlyConfigured("La exportación para BI requiere pyarrow (pip install pyarrow).")
+
+
+def resolve_field(model, path):
+    """
+    Campo de Django al final de una ruta tipo 'sales_order__customer_id'.
+    """
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    field = model._meta.get_field(name[:-3] if name.endswith('_id') else name)
+    # 'x_id' es la FK: su tipo es el de la PK a la que apunta
+    return field.target_field if field.is_relation else field
+
+
+def arrow_type(field):
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.IntegerField):
+        return pa.int64()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    return pa.string()
+
+
+def get_fact(fact):
+    if fact in FACTS:
+        return FACTS[fact]
+    if fact in DIMENSIONS:
+        return DIMENSIONS[fact]
+    raise ValueError(f"Hecho o dimensión desconocido '{fact}'. Use uno de: {', '.join([*FACTS, *DIMENSIONS])}.")
+
+
+def fact_schema(fact):
+    require_pyarrow()
+    model, paths = get_fact(fact)
+    return pa.schema([
+        pa.field(path.replace('__', '_'), arrow_type(resolve_field(model, path)))
+        for path in paths
+    ])
+
+
+def fact_batches(fact, since_id=0, until_id=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Filas (tuplas) del hecho con since_id < id <= until_id, en lotes de chunk_size,
+    leídas con un cursor del lado del servidor.
+    """
+    model, paths = get_fact(fact)
+    queryset = model.objects.filter(id__gt=since_id)
+    if until_id is not None:
+        queryset = queryset.filter(id__lte=until_id)
+    rows = queryset.order_by('id').values_list(*paths).iterator(chunk_size=chunk_size)
+    while True:
+        batch = list(itertools.islice(rows, chunk_size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_fact(fact, path, output='parquet', since_id=0, until_id=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Escribe el hecho en `path` lote a lote y devuelve el número de filas.
+    """
+    require_pyarrow()
+    if output not in BI_OUTPUT_FORMATS:
+        raise ValueError(f"Formato desconocido '{output}'. Use uno de: {', '.join(BI_OUTPUT_FORMATS)}.")
+    schema = fact_schema(fact)
+    writer = pq.ParquetWriter(path, schema) if output == 'parquet' else pa.ipc.new_file(path, schema)
+    rows = 0
+    try:
+        for batch in fact_batches(fact, since_id, until_id, chunk_size):
+            columns = [pa.array(column, type=field.type) for column, field in zip(zip(*batch), schema)]
+            record_batch = pa.RecordBatch.from_arrays(columns, schema=schema)
+            if output == 'parquet':
+                writer.write_batch(record_batch)
+            else:
+                writer.write(record_batch)
+            rows += len(batch)
+    finally:
+        writer.close()
+    return rows
+
+
+def export_dimension(dimension, directory, output='parquet'):
+    """
+    Reescribe la foto completa de la dimensión en `directory`. Se escribe a un
+    archivo temporal y se renombra al terminar: quien lea nunca ve una foto a medias.
+    """
+    path = os.path.join(directory, f"{dimension}.{BI_OUTPUT_FORMATS[output]}")
+    partial = f"{path}.partial"
+    rows = write_fact(dimension, partial, output)
+    os.replace(partial, path)
+    return {'dimension': dimension, 'rows': rows, 'file': path}
+
+
+def export_facts(directory, facts=None, output='parquet', full=False, dimensions=None):
+    """
+    Exporta cada hecho a `directory` (un archivo por hecho y rango de ids) y avanza
+    su marca de agua. El límite superior (stable_max_id) se fija antes de leer, así
+    las filas que llegan durante la exportación quedan para la siguiente. Después
+    reescribe la foto de cada dimensión.
+    Devuelve una lista con el resultado de cada hecho y dimensión exportados.
+    """
+    require_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    results = []
+    for fact in FACTS if facts is None else facts:
+        model, _ = get_fact(fact)
+        watermark, _ = BiExportWatermark.objects.get_or_create(fact=fact)
+        since_id = 0 if full else watermark.last_id
+        until_id = stable_max_id(model, BI_IN_FLIGHT_WAIT_SECONDS)
+        if until_id is None or until_id <= since_id:
+            continue
+
+        path = os.path.join(directory, f"{fact}_{since_id + 1}_{until_id}.{BI_OUTPUT_FORMATS[output]}")
+        rows = write_fact(fact, path, output, since_id, until_id)
+        BiExportWatermark.objects.filter(pk=watermark.pk).update(
+            last_id=until_id, rows_exported=models.F('rows_exported') + rows, exported_at=timezone.now()
+        )
+        results.append({'fact': fact, 'rows': rows, 'file': path, 'since_id': since_id, 'until_id': until_id})
+    for dimension in DIMENSIONS if dimensions is None else dimensions:
+        results.append(export_dimension(dimension, directory, output))
+    return results
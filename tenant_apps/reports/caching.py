@@ -0,0 +1,70 @@
+import hashlib
+import json
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+from accounting.versioning import ledger_version
+from .registry import get_report
+
+# Una versión del Libro Diario no cambia: el timeout solo limita la memoria usada
+REPORT_CACHE_TIMEOUT = 60 * 60
+
+
+class LedgerCachedReportMixin:
+    """
+    Cachea la respuesta de un reporte por tenant, parámetros y versión del Libro Diario.
+    El ETag se deriva de esos mismos datos, así que un If-None-Match que coincide se
+    responde con 304 sin tocar la base de datos.
+    La clave usa los parámetros ya resueltos (parse_params, con sus valores por
+    defecto), no el query string: sin ?as_of= el Balance de hoy y el de ayer son
+    claves distintas.
+    La vista define `report_type` (ver reports.registry) o sobrescribe get_report(request).
+    """
+    report_cache_timeout = REPORT_CACHE_TIMEOUT
+    report_type = None
+
+    def report_params(self, request):
+        if self.report_type is None:
+            return sorted((key, sorted(values)) for key, values in request.query_params.lists())
+        return get_report(self.report_type).parse_params(request.query_params)
+
+    def get_report(self, request):
+        report = get_report(self.report_type)
+        return report.build(report.parse_params(request.query_params))
+
+    def report_version(self, params):
+        if self.report_type is None:
+            return ledger_version()
+        return get_report(self.report_type).version(params)
+
+    def report_cache_key(self, request):
+        params = self.report_params(request)
+        raw = "|".join([
+            connection.schema_name, type(self).__name__, str(self.report_version(params)),
+            json.dumps(params, cls=DjangoJSONEncoder, sort_keys=True),
+        ])
+        return f"reports:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def get(self, request, *args, **kwargs):
+        key = self.report_cache_key(request)
+        etag = f'"{key.split(":", 1)[1]}"'
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        data = cache.get(key)
+        if data is None:
+            data = self.get_report(request)
+            cache.set(key, data, self.report_cache_timeout)
+
+        response = Response(data)
+        response['ETag'] = etag
+        # El navegador puede guardar la respuesta, pero debe revalidarla siempre
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
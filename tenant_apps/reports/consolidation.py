@@ -0,0 +1,223 @@
+"""
+Consolidación de estados financieros de un grupo de empresas (un esquema por tenant).
+
+Cada esquema calcula sus saldos por cuenta con una sola consulta agrupada; los
+esquemas se recorren en paralelo (un hilo y una conexión por esquema) y los
+resultados se combinan por código de cuenta consolidado, aplicando los mapeos
+y las eliminaciones intercompañía del grupo.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum, Q
+from django.db.models.functions import Coalesce
+from django_tenants.utils import schema_context
+from rest_framework.exceptions import ValidationError, PermissionDenied
+from accounting.models import Account
+from accounting.services import cumulative_balances
+from accounting.versioning import ledger_version
+from tenants.models import ConsolidationGroup
+from .services import zero_decimal, PROFIT_AND_LOSS_TYPES
+
+CONSOLIDATED_REPORTS = ('profit_and_loss', 'balance_sheet')
+
+
+def group_for_schema(group_id, schema_name=None):
+    """
+    Grupo de consolidación cuya empresa matriz es el tenant actual, con todas sus
+    empresas autorizadas.
+    """
+    group = ConsolidationGroup.objects.filter(
+        pk=group_id, parent__schema_name=schema_name or connection.schema_name
+    ).select_related('parent').first()
+    if group is None:
+        raise ValidationError({'group': "Grupo de consolidación inexistente para esta empresa."})
+    check_group_authorization(group)
+    return group
+
+
+def check_group_authorization(group):
+    """
+    Antes de entrar en el esquema de otra empresa: la matriz debe estar
+    autorizada a consolidarla (CompanySubsidiary). Un grupo con empresas ajenas
+    no se calcula.
+    """
+    foreign = list(group.unauthorized_members().values_list('schema_name', flat=True))
+    if foreign:
+        raise PermissionDenied(
+            f"La empresa no está autorizada a consolidar: {', '.join(sorted(foreign))}."
+        )
+
+
+def member_schemas(group):
+    return list(group.members.order_by('schema_name').values_list('schema_name', flat=True))
+
+
+def _natural(account_type, debit, credit):
+    if account_type in Account.DEBIT_NATURE_TYPES:
+        return debit - credit
+    return credit - debit
+
+
+def schema_account_amounts(report, params):
+    """
+    Saldos por cuenta del esquema activo, en la naturaleza de cada tipo:
+    movimientos del rango para el Estado de Resultados, acumulados a la fecha
+    para el Balance General. Solo cuentas con saldo.
+    """
+    if report == 'balance_sheet':
+        rows, _ = cumulative_balances(params['as_of'])
+    else:
+        zero = zero_decimal()
+        in_range = Q(daily_balances__date__range=(params['start_date'], params['end_date']))
+        rows = Account.objects.filter(account_type__in=PROFIT_AND_LOSS_TYPES).annotate(
+            debit_total=Coalesce(Sum('daily_balances__debit_total', filter=in_range), zero),
+            credit_total=Coalesce(Sum('daily_balances__credit_total', filter=in_range), zero),
+        )
+
+    amounts = []
+    for row in rows.values('code', 'name', 'account_type', 'debit_total', 'credit_total').order_by('code'):
+        amount = _natural(row['account_type'], row['debit_total'], row['credit_total'])
+        if amount:
+            amounts.append({
+                'code': row['code'], 'name': row['name'],
+                'account_type': row['account_type'], 'amount': amount,
+            })
+    return amounts
+
+
+def _aggregate_schema(schema_name, report, params, own_connection):
+    """
+    Agrega un esquema y mide su tiempo. En un hilo de trabajo la conexión es propia
+    del hilo y se cierra al terminar, para no dejar conexiones abiertas.
+    """
+    started = time.perf_counter()
+    try:
+        with schema_context(schema_name):
+            amounts = schema_account_amounts(report, params)
+            version = ledger_version()
+    finally:
+        if own_connection:
+            connection.close()
+    return {
+        'schema': schema_name,
+        'amounts': amounts,
+        'ledger_version': version,
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+
+
+def aggregate_schemas(schemas, report, params, max_workers=None):
+    """
+    Ejecuta schema_account_amounts en cada esquema, en paralelo con un pool de hilos
+    (las consultas liberan el GIL mientras PostgreSQL trabaja). Con un solo
+    trabajador se ejecuta en el hilo y la conexión actuales.
+    """
+    workers = min(max_workers or settings.CONSOLIDATION_MAX_WORKERS, len(schemas))
+    if workers <= 1:
+        return [_aggregate_schema(schema, report, params, own_connection=False) for schema in schemas]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='consolidation') as executor:
+        return list(executor.map(lambda schema: _aggregate_schema(schema, report, params, True), schemas))
+
+
+def group_ledger_versions(group):
+    """
+    Versiones del Libro Diario de cada empresa del grupo: el consolidado solo es
+    válido mientras ninguna cambie.
+    """
+    check_group_authorization(group)
+    versions = {}
+    for schema_name in member_schemas(group):
+        with schema_context(schema_name):
+            versions[schema_name] = ledger_version()
+    return versions
+
+
+def _apply_eliminations(accounts, rules):
+    eliminations = []
+    for rule in rules:
+        first, second = accounts.get(rule.account_code), accounts.get(rule.counterpart_code)
+        first_amount = first['amount'] if first else Decimal('0.00')
+        second_amount = second['amount'] if second else Decimal('0.00')
+        eliminated = max(min(first_amount, second_amount), Decimal('0.00'))
+        for account in (first, second):
+            if account and eliminated:
+                account['eliminated'] += eliminated
+                account['amount'] -= eliminated
+        eliminations.append({
+            'rule': rule.name,
+            'account_code': rule.account_code,
+            'counterpart_code': rule.counterpart_code,
+            'amount': eliminated,
+            'difference': first_amount - second_amount,
+        })
+    return eliminations
+
+
+def consolidate(group, report, params, max_workers=None):
+    """
+    Estado consolidado del grupo: suma por código consolidado de los saldos de
+    cada empresa, menos las eliminaciones intercompañía. Incluye el detalle por
+    empresa de cada cuenta y el tiempo de cálculo de cada esquema.
+    """
+    if report not in CONSOLIDATED_REPORTS:
+        raise ValidationError({'report': f"Use uno de: {', '.join(CONSOLIDATED_REPORTS)}."})
+    check_group_authorization(group)
+    schemas = member_schemas(group)
+    if not schemas:
+        raise ValidationError({'group': "El grupo no tiene empresas."})
+
+    maps = {}
+    for company_schema, source, target in group.account_maps.values_list(
+        'company__schema_name', 'source_code', 'target_code'
+    ):
+        maps[(company_schema, source)] = target
+
+    started = time.perf_counter()
+    results = aggregate_schemas(schemas, report, params, max_workers)
+    elapsed = time.perf_counter() - started
+
+    accounts = {}
+    for result in results:
+        for line in result['amounts']:
+            code = maps.get((result['schema'], line['code'])) or maps.get((None, line['code'])) or line['code']
+            account = accounts.setdefault(code, {
+                'code': code, 'name': line['name'], 'account_type': line['account_type'],
+                'amount': Decimal('0.00'), 'eliminated': Decimal('0.00'), 'by_schema': {},
+            })
+            account['amount'] += line['amount']
+            account['by_schema'][result['schema']] = account['by_schema'].get(result['schema'], Decimal('0.00')) + line['amount']
+
+    eliminations = _apply_eliminations(accounts, group.elimination_rules.order_by('id'))
+
+    totals = {account_type: Decimal('0.00') for account_type, _ in Account.ACCOUNT_TYPE_CHOICES}
+    for account in accounts.values():
+        totals[account['account_type']] += account['amount']
+    net_profit = totals['REVENUE'] - totals['EXPENSE']
+
+    data = {
+        'group': {'id': group.pk, 'name': group.name},
+        'report': report,
+        'params': params,
+        'accounts': [accounts[code] for code in sorted(accounts)],
+        'eliminations': eliminations,
+        'net_profit': net_profit,
+        'schemas': [
+            {'schema': result['schema'], 'accounts': len(result['amounts']), 'seconds': result['seconds']}
+            for result in results
+        ],
+        'elapsed_seconds': round(elapsed, 4),
+    }
+    if report == 'balance_sheet':
+        equity = totals['EQUITY'] + net_profit
+        data.update({
+            'assets': totals['ASSET'],
+            'liabilities': totals['LIABILITY'],
+            'equity': equity,
+            'check': {'is_balanced': totals['ASSET'] == totals['LIABILITY'] + equity},
+        })
+    else:
+        data.update({'total_revenue': totals['REVENUE'], 'total_expense': totals['EXPENSE']})
+    return data
@@ -0,0 +1,110 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from accounting.models import Account, JournalItem
+
+# Filas que el cursor del servidor trae por cada viaje a la BD
+EXPORT_CHUNK_SIZE = 2000
+
+OUTPUT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    # Texto delimitado por barras verticales (formato de los libros para la DGI)
+    'txt': ('text/plain; charset=utf-8', 'txt'),
+}
+
+GENERAL_LEDGER_FIELDS = [
+    'entry_id', 'date', 'entry_description', 'account_code', 'account_name',
+    'debit', 'credit', 'line_description',
+]
+
+
+class _Echo:
+    """
+    Buffer mínimo para csv.writer: devuelve la línea en lugar de guardarla.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_stream(fields, rows, delimiter=','):
+    writer = csv.writer(_Echo(), delimiter=delimiter)
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def jsonl_stream(fields, rows):
+    for row in rows:
+        yield json.dumps({field: row[field] for field in fields}, cls=DjangoJSONEncoder) + "\n"
+
+
+def export_stream(fields, rows, output):
+    if output == 'jsonl':
+        return jsonl_stream(fields, rows)
+    return csv_stream(fields, rows, delimiter='|' if output == 'txt' else ',')
+
+
+def streaming_export(fields, rows, output, filename):
+    """
+    Respuesta HTTP en streaming (CSV, TXT o JSONL): la memoria usada no depende
+    del número de filas exportadas.
+    """
+    content_type, extension = OUTPUT_FORMATS[output]
+    response = StreamingHttpResponse(export_stream(fields, rows, output), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+
+def general_ledger_items(start_date, end_date, account_code=None):
+    """
+    Líneas de asiento del rango; filtrar por una cuenta incluye todas sus subcuentas.
+    """
+    items = JournalItem.objects.filter(entry_date__range=(start_date, end_date))
+    if account_code:
+        items = items.filter(account__ancestor_links__ancestor__code=account_code)
+    return items
+
+
+def general_ledger_rows(start_date, end_date, account_code=None, book='diario'):
+    """
+    Líneas del Libro Diario (orden cronológico) o del Libro Mayor (por cuenta,
+    con saldo corrido). Se leen con un cursor del lado del servidor
+    (.iterator), así que nunca se cargan todas en memoria.
+    """
+    items = general_ledger_items(start_date, end_date, account_code)
+
+    if book == 'mayor':
+        ordering = ('account__code', 'entry_date', 'journal_entry_id', 'id')
+    else:
+        ordering = ('entry_date', 'journal_entry_id', 'id')
+
+    rows = items.order_by(*ordering).values_list(
+        'journal_entry_id', 'entry_date', 'journal_entry__description',
+        'account__code', 'account__name', 'account_type',
+        'debit', 'credit', 'description',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    current_account, balance = None, 0
+    for entry_id, day, entry_description, code, name, account_type, debit, credit, description in rows:
+        row = {
+            'entry_id': entry_id,
+            'date': day,
+            'entry_description': entry_description,
+            'account_code': code,
+            'account_name': name,
+            'debit': debit,
+            'credit': credit,
+            'line_description': description,
+        }
+        if book == 'mayor':
+            # Saldo corrido dentro del rango, reiniciado en cada cuenta
+            if code != current_account:
+                current_account, balance = code, 0
+            if account_type in Account.DEBIT_NATURE_TYPES:
+                balance += debit - credit
+            else:
+                balance += credit - debit
+            row['balance'] = balance
+        yield row
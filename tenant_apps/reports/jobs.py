@@ -0,0 +1,129 @@
+import hashlib
+import json
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from .models import ReportJob
+from .registry import get_report
+
+
+def job_hash(report_type, params, user=None):
+    """
+    Hash estable de tipo + parámetros normalizados + versión de los datos (la del
+    Libro Diario): mientras no cambie, un resultado terminado sigue siendo válido.
+    Incluye a quien lo pide: los trabajos (y sus archivos) no se comparten entre usuarios.
+    """
+    raw = json.dumps(
+        {
+            'type': report_type, 'params': params, 'version': get_report(report_type).version(params),
+            'user': user.pk if user is not None else None,
+        },
+        cls=DjangoJSONEncoder, sort_keys=True
+    )
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def expire_stale_jobs(report_type=None, params_hash=None):
+    """
+    Marca como fallidos los trabajos sin avance en REPORT_JOB_STALE_MINUTES: en cola
+    desde created_at (la tarea se perdió) o en curso desde started_at (el worker
+    murió). Así dejan de ocupar el índice único y no bloquean a los idénticos.
+    """
+    cutoff = timezone.now() - timedelta(minutes=settings.REPORT_JOB_STALE_MINUTES)
+    jobs = ReportJob.objects.filter(
+        Q(status='Pending', created_at__lt=cutoff) | Q(status='Running', started_at__lt=cutoff)
+    )
+    if report_type is not None:
+        jobs = jobs.filter(report_type=report_type, params_hash=params_hash)
+    return jobs.update(
+        status='Failed', finished_at=timezone.now(),
+        error=f"Sin avance en {settings.REPORT_JOB_STALE_MINUTES} minutos: la tarea se perdió.",
+    )
+
+
+def _reusable_job(report_type, params_hash):
+    return ReportJob.objects.filter(
+        report_type=report_type, params_hash=params_hash, status__in=ReportJob.IN_FLIGHT + ('Done',)
+    ).first()
+
+
+# Intentos de INSERT si el trabajo que ganó la carrera termina fallido antes de leerlo
+SUBMIT_ATTEMPTS = 3
+
+
+def submit_report_job(report_type, raw_params, user=None):
+    """
+    Encola un reporte y devuelve (trabajo, creado).
+    Si el mismo usuario ya tiene uno idéntico en curso, o terminado con la misma
+    versión del Libro Diario, se devuelve ese en lugar de crear otro. Los trabajos idénticos
+    estancados se descartan antes (ver expire_stale_jobs).
+    """
+    report = get_report(report_type)
+    params = report.parse_params(raw_params or {})
+    params_hash = job_hash(report_type, params, user)
+    expire_stale_jobs(report_type, params_hash)
+
+    for attempt in range(SUBMIT_ATTEMPTS):
+        existing = _reusable_job(report_type, params_hash)
+        if existing:
+            return existing, False
+        try:
+            with transaction.atomic():
+                job = ReportJob.objects.create(
+                    report_type=report_type, params=params, params_hash=params_hash, requested_by=user
+                )
+        except IntegrityError:
+            # Otra petición idéntica ganó la carrera (índice único de trabajos en curso).
+            # Su trabajo se vuelve a buscar incluyendo los terminados: puede haber acabado ya.
+            if attempt == SUBMIT_ATTEMPTS - 1:
+                raise
+            continue
+        break
+
+    from .tasks import run_report_job_task
+    schema_name = connection.schema_name
+    transaction.on_commit(lambda: run_report_job_task.delay(schema_name, job.pk))
+    return job, True
+
+
+def run_report_job(job_id):
+    """
+    Genera el archivo del reporte (en el esquema del tenant ya activo).
+    El trabajo se reclama con un UPDATE condicionado a 'Pending': si la tarea se
+    entrega dos veces, o el trabajo ya se dio por estancado, solo un worker lo ejecuta.
+    """
+    claimed = ReportJob.objects.filter(pk=job_id, status='Pending').update(
+        status='Running', started_at=timezone.now()
+    )
+    job = ReportJob.objects.get(pk=job_id)
+    if not claimed:
+        return job
+
+    report = get_report(job.report_type)
+    params = report.parse_params(job.params)
+
+    def progress(percent):
+        ReportJob.objects.filter(pk=job.pk).update(progress=min(int(percent), 99))
+
+    try:
+        # Archivo temporal en disco: el reporte nunca se arma completo en memoria
+        with tempfile.TemporaryFile(mode='w+', encoding='utf-8', newline='') as buffer:
+            report.write(params, buffer, progress)
+            buffer.seek(0)
+            filename = f"{job.report_type}_{job.pk}.{report.file_extension(params)}"
+            job.result_file.save(filename, File(buffer), save=False)
+    except Exception as e:
+        ReportJob.objects.filter(pk=job.pk).update(status='Failed', error=str(e), finished_at=timezone.now())
+        raise
+
+    job.status = 'Done'
+    job.progress = 100
+    job.content_type = report.file_content_type(params)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'result_file', 'content_type', 'finished_at'])
+    return job
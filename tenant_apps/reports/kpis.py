@@ -0,0 +1,131 @@
+"""
+Indicadores del dashboard precalculados en KpiSnapshot.
+
+Cada grupo de indicadores declara la versión de sus datos de origen (Libro Diario,
+Tesorería); refresh_kpis() solo recalcula los grupos cuya versión cambió desde la
+última pasada. Los grupos sin versión (pedidos abiertos, stock) se recalculan siempre.
+"""
+from datetime import date
+from decimal import Decimal
+from django.db.models import Sum, Count, Q, F
+from accounting.models import AccountDailyBalance
+from accounting.services import cumulative_balances
+from accounting.versioning import ledger_version, treasury_version
+from inventory.models import Product
+from purchasing.models import PurchaseOrder
+from sales.models import SalesOrder
+from treasury.models import BankAccount, CashRegister
+from .models import KpiSnapshot
+from .services import aging_report, cash_account_filter
+
+KPI_GROUPS = []
+# Productos listados en el detalle de alertas de stock
+STOCK_ALERT_SAMPLE = 10
+
+
+def kpi_group(*keys, version=None):
+    """
+    Decorador: registra una función que calcula los indicadores `keys` y devuelve
+    {clave: valor} o {clave: (valor, detalle)}.
+    """
+    def decorator(function):
+        KPI_GROUPS.append((keys, function, version))
+        return function
+    return decorator
+
+
+def _ledger_today():
+    # Los acumulados del mes/año también cambian con la fecha
+    return f"{ledger_version()}:{date.today()}"
+
+
+def _treasury():
+    return str(treasury_version())
+
+
+@kpi_group('revenue_mtd', 'revenue_ytd', 'expense_ytd', 'net_profit_ytd', version=_ledger_today)
+def profit_and_loss_kpis():
+    today = date.today()
+    month_start = today.replace(day=1)
+    revenue = Q(account__account_type='REVENUE')
+    expense = Q(account__account_type='EXPENSE')
+    totals = AccountDailyBalance.objects.filter(
+        revenue | expense, date__range=(date(today.year, 1, 1), today)
+    ).aggregate(
+        revenue_mtd=Sum(F('credit_total') - F('debit_total'), filter=revenue & Q(date__gte=month_start)),
+        revenue_ytd=Sum(F('credit_total') - F('debit_total'), filter=revenue),
+        expense_ytd=Sum(F('debit_total') - F('credit_total'), filter=expense),
+    )
+    totals = {key: value or Decimal('0.00') for key, value in totals.items()}
+    totals['net_profit_ytd'] = totals['revenue_ytd'] - totals['expense_ytd']
+    return totals
+
+
+@kpi_group('cash_position', version=_ledger_today)
+def cash_position_kpi():
+    rows, _ = cumulative_balances(date.today())
+    balance = sum(
+        (row['debit_total'] - row['credit_total']
+         for row in rows.filter(cash_account_filter()).values('debit_total', 'credit_total')),
+        Decimal('0.00')
+    )
+    return {'cash_position': balance}
+
+
+@kpi_group('treasury_balance', version=_treasury)
+def treasury_balance_kpi():
+    banks = BankAccount.objects.aggregate(total=Sum('current_balance'))['total'] or Decimal('0.00')
+    registers = CashRegister.objects.aggregate(total=Sum('current_balance'))['total'] or Decimal('0.00')
+    return {'treasury_balance': (banks + registers, {'bank_accounts': banks, 'cash_registers': registers})}
+
+
+@kpi_group('open_sales_orders', 'open_purchase_orders')
+def open_orders_kpis():
+    sales = SalesOrder.objects.filter(status__in=('Draft', 'Confirmed')).aggregate(
+        count=Count('id'), amount=Sum('total_amount')
+    )
+    purchases = PurchaseOrder.objects.filter(status__in=('Draft', 'Submitted')).aggregate(
+        count=Count('id'), amount=Sum('total_amount')
+    )
+    return {
+        'open_sales_orders': (sales['count'], {'amount': sales['amount'] or Decimal('0.00')}),
+        'open_purchase_orders': (purchases['count'], {'amount': purchases['amount'] or Decimal('0.00')}),
+    }
+
+
+@kpi_group('receivables', 'payables')
+def aging_kpis():
+    today = date.today()
+    results = {}
+    for key, kind in (('receivables', 'receivable'), ('payables', 'payable')):
+        totals = aging_report(kind, today)['totals']
+        results[key] = (totals['total'], {'overdue': totals['total'] - totals['current']})
+    return results
+
+
+@kpi_group('stock_alerts')
+def stock_alerts_kpi():
+    products = Product.objects.filter(current_stock__lte=0).order_by('current_stock', 'name')
+    sample = list(products.values('id', 'name', 'current_stock')[:STOCK_ALERT_SAMPLE])
+    count = len(sample) if len(sample) < STOCK_ALERT_SAMPLE else products.count()
+    return {'stock_alerts': (count, {'products': sample})}
+
+
+def refresh_kpis(force=False):
+    """
+    Recalcula los indicadores del tenant actual cuyos datos cambiaron y devuelve
+    las claves actualizadas.
+    """
+    stored = dict(KpiSnapshot.objects.values_list('key', 'source_version'))
+    refreshed = []
+    for keys, compute, version in KPI_GROUPS:
+        current = version() if version else ''
+        if not force and current and all(stored.get(key) == current for key in keys):
+            continue
+        for key, result in compute().items():
+            value, details = result if isinstance(result, tuple) else (result, {})
+            KpiSnapshot.objects.update_or_create(
+                key=key, defaults={'value': value, 'details': details, 'source_version': current}
+            )
+            refreshed.append(key)
+    return refreshed
@@ -0,0 +1,71 @@
+import os
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from reports.bi_export import FACTS, DIMENSIONS, BI_OUTPUT_FORMATS, export_facts
+
+
+class Command(BaseCommand):
+    """
+    Exporta las tablas de hechos (Libro Diario, ventas, compras, Tesorería) en
+    Parquet o Arrow para BI, de forma incremental desde la última exportación,
+    y la foto actual de las dimensiones (órdenes de venta y de compra con su estado).
+    Al ser una app de inquilino se ejecuta por esquema:
+        python manage.py tenant_command export_bi_facts --schema=<esquema>
+        python manage.py all_tenants_command export_bi_facts --format arrow
+    """
+    help = "Exporta hechos para BI (Parquet/Arrow) desde la marca de agua de cada uno."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=list(BI_OUTPUT_FORMATS),
+            default='parquet',
+            help="Formato de salida (por defecto parquet)."
+        )
+        parser.add_argument(
+            '--facts',
+            help=f"Hechos a exportar, separados por coma (por defecto todos: {', '.join(FACTS)})."
+        )
+        parser.add_argument(
+            '--dimensions',
+            help=f"Dimensiones a exportar, separadas por coma; vacío para ninguna (por defecto todas: {', '.join(DIMENSIONS)})."
+        )
+        parser.add_argument(
+            '--output-dir',
+            help="Directorio de salida (por defecto MEDIA_ROOT/bi/<esquema>)."
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="Exporta todo desde el principio, ignorando la marca de agua."
+        )
+
+    def handle(self, *args, **options):
+        facts = [fact.strip() for fact in options['facts'].split(',')] if options['facts'] else None
+        unknown = sorted(set(facts or []) - set(FACTS))
+        if unknown:
+            raise CommandError(f"Hechos desconocidos: {', '.join(unknown)}.")
+        dimensions = None
+        if options['dimensions'] is not None:
+            dimensions = [name.strip() for name in options['dimensions'].split(',') if name.strip()]
+            unknown = sorted(set(dimensions) - set(DIMENSIONS))
+            if unknown:
+                raise CommandError(f"Dimensiones desconocidas: {', '.join(unknown)}.")
+        directory = options['output_dir'] or os.path.join(settings.MEDIA_ROOT, 'bi', connection.schema_name)
+
+        try:
+            results = export_facts(directory, facts, options['format'], options['full'], dimensions)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        for result in results:
+            if 'dimension' in result:
+                self.stdout.write(f"{result['dimension']}: {result['rows']} filas (foto completa) -> {result['file']}")
+                continue
+            self.stdout.write(
+                f"{result['fact']}: {result['rows']} filas (ids {result['since_id'] + 1}-{result['until_id']}) "
+                f"-> {result['file']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Exportación BI terminada: {len(results)} archivos."))
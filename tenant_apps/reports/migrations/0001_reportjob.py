@@ -0,0 +1,45 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:35
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import reports.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(max_length=50)),
+                ('params', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('params_hash', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('Pending', 'En cola'), ('Running', 'Procesando'), ('Done', 'Terminado'), ('Failed', 'Fallido')], default='Pending', max_length=10)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('result_file', models.FileField(blank=True, null=True, upload_to=reports.models.report_job_upload_to)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['report_type', 'params_hash'], name='reports_job_type_hash_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ('Pending', 'Running'))), fields=('report_type', 'params_hash'), name='reports_job_inflight_uniq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_kpisnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BiExportWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fact', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('rows_exported', models.BigIntegerField(default=0)),
+                ('exported_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
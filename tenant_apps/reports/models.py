@@ -1,3 +1,85 @@
-from django.db import models
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models
 
-# Create your models here.
+
+def report_job_upload_to(instance, filename):
+    # Un directorio por tenant: los archivos de una empresa nunca se mezclan con otra
+    return f"reports/{connection.schema_name}/{filename}"
+
+
+class ReportJob(models.Model):
+    """
+    Reporte pesado generado en segundo plano (Celery).
+    El resultado queda en un archivo que el cliente descarga al terminar.
+    Dos trabajos idénticos (mismo tipo y parámetros) no pueden estar en curso a la vez.
+    """
+    STATUS_CHOICES = [
+        ('Pending', 'En cola'),
+        ('Running', 'Procesando'),
+        ('Done', 'Terminado'),
+        ('Failed', 'Fallido'),
+    ]
+    IN_FLIGHT = ('Pending', 'Running')
+
+    report_type = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # Hash de tipo + parámetros normalizados + versión del Libro Diario
+    params_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
+    progress = models.PositiveSmallIntegerField(default=0)
+    result_file = models.FileField(upload_to=report_job_upload_to, null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.report_type} #{self.id} [{self.get_status_display()}]"
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['report_type', 'params_hash'],
+                condition=models.Q(status__in=('Pending', 'Running')),
+                name='reports_job_inflight_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['report_type', 'params_hash'], name='reports_job_type_hash_idx'),
+        ]
+
+
+class KpiSnapshot(models.Model):
+    """
+    Valor precalculado de un indicador del dashboard (ver reports.kpis).
+    Una fila por indicador: el dashboard lee la tabla completa en una consulta y
+    la tarea periódica solo recalcula los indicadores cuyos datos cambiaron.
+    """
+    key = models.CharField(max_length=50, unique=True)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    details = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    # Versión de los datos de origen con la que se calculó (vacía = recalcular siempre)
+    source_version = models.CharField(max_length=100, blank=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
+
+
+class BiExportWatermark(models.Model):
+    """
+    Última fila exportada de cada tabla de hechos para BI (ver reports.bi_export).
+    La siguiente exportación incremental empieza en last_id + 1.
+    """
+    fact = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    rows_exported = models.BigIntegerField(default=0)
+    exported_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.fact} hasta id {self.last_id}"
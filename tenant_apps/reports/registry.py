@@ -0,0 +1,276 @@
+import json
+from datetime import date
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.exceptions import ValidationError
+from accounting.versioning import ledger_version, treasury_version
+from stward_erp.utils import parse_date
+from .services import trial_balance, balance_sheet, profit_and_loss, cash_flow
+from .consolidation import CONSOLIDATED_REPORTS, consolidate, group_for_schema, group_ledger_versions
+from .tax import TAX_BOOKS, itbms_declaration, tax_book_documents, tax_book_fields, tax_book_rows
+from .exports import (
+    OUTPUT_FORMATS, GENERAL_LEDGER_FIELDS, EXPORT_CHUNK_SIZE,
+    general_ledger_items, general_ledger_rows, export_stream,
+)
+
+REPORTS = {}
+
+
+def register(report_class):
+    """
+    Decorador: registra una instancia del reporte bajo su `name`.
+    """
+    REPORTS[report_class.name] = report_class()
+    return report_class
+
+
+def get_report(name):
+    report = REPORTS.get(name)
+    if report is None:
+        raise ValidationError({'report_type': f"Use uno de: {', '.join(sorted(REPORTS))}."})
+    return report
+
+
+def _year_range(params):
+    today = date.today()
+    return (
+        parse_date(params.get('start_date'), 'start_date', date(today.year, 1, 1)),
+        parse_date(params.get('end_date'), 'end_date', date(today.year, 12, 31)),
+    )
+
+
+class ReportDefinition:
+    """
+    Un reporte que puede servirse en línea (vista) o como trabajo asíncrono (ReportJob).
+    parse_params() normaliza los parámetros (con sus valores por defecto), de modo que
+    dos peticiones equivalentes generan el mismo hash de trabajo.
+    """
+    name = None
+    extension = 'json'
+    content_type = 'application/json'
+
+    def parse_params(self, params):
+        return {}
+
+    def build(self, params, progress=None):
+        raise NotImplementedError
+
+    def version(self, params):
+        """
+        Versión de los datos de origen: mientras no cambie, el resultado cacheado
+        (o de un trabajo ya terminado) sigue siendo válido.
+        """
+        return ledger_version()
+
+    def file_extension(self, params):
+        return self.extension
+
+    def file_content_type(self, params):
+        return self.content_type
+
+    def write(self, params, out, progress=None):
+        """
+        Escribe el resultado en `out` (archivo de texto). Por defecto, el JSON de build().
+        `progress(porcentaje)` permite informar el avance de los reportes largos.
+        """
+        json.dump(self.build(params, progress), out, cls=DjangoJSONEncoder)
+
+
+@register
+class TrialBalanceReport(ReportDefinition):
+    name = 'trial_balance'
+
+    def parse_params(self, params):
+        start_date, end_date = _year_range(params)
+        return {'start_date': start_date, 'end_date': end_date, 'granularity': params.get('granularity') or 'month'}
+
+    def build(self, params, progress=None):
+        return trial_balance(params['start_date'], params['end_date'], params['granularity'])
+
+
+@register
+class ProfitAndLossReport(ReportDefinition):
+    name = 'profit_and_loss'
+
+    def parse_params(self, params):
+        start_date, end_date = _year_range(params)
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'granularity': params.get('granularity') or 'month',
+            'compare': params.get('compare') or None,
+        }
+
+    def build(self, params, progress=None):
+        return profit_and_loss(params['start_date'], params['end_date'], params['granularity'], params['compare'])
+
+
+@register
+class BalanceSheetReport(ReportDefinition):
+    name = 'balance_sheet'
+
+    def parse_params(self, params):
+        return {'as_of': parse_date(params.get('as_of'), 'as_of', date.today())}
+
+    def build(self, params, progress=None):
+        return balance_sheet(params['as_of'])
+
+
+@register
+class CashFlowReport(ReportDefinition):
+    name = 'cash_flow'
+
+    def parse_params(self, params):
+        start_date, end_date = _year_range(params)
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'granularity': params.get('granularity') or 'month',
+            'method': params.get('method') or 'direct',
+        }
+
+    def version(self, params):
+        # El método directo lee Tesorería, que no pasa por el Libro Diario
+        if params['method'] == 'direct':
+            return treasury_version()
+        return ledger_version()
+
+    def build(self, params, progress=None):
+        return cash_flow(params['start_date'], params['end_date'], params['granularity'], params['method'])
+
+
+@register
+class ConsolidatedReport(ReportDefinition):
+    """
+    Estado de Resultados o Balance General consolidado de un grupo de empresas.
+    """
+    name = 'consolidated'
+
+    def parse_params(self, params):
+        report = params.get('report') or 'profit_and_loss'
+        if report not in CONSOLIDATED_REPORTS:
+            raise ValidationError({'report': f"Use uno de: {', '.join(CONSOLIDATED_REPORTS)}."})
+        try:
+            group_id = int(params.get('group'))
+        except (TypeError, ValueError):
+            raise ValidationError({'group': "Indique el id del grupo de consolidación."})
+        group_for_schema(group_id)
+        parsed = {'group': group_id, 'report': report}
+        if report == 'balance_sheet':
+            parsed['as_of'] = parse_date(params.get('as_of'), 'as_of', date.today())
+        else:
+            parsed['start_date'], parsed['end_date'] = _year_range(params)
+        return parsed
+
+    def version(self, params):
+        # El consolidado depende del Libro Diario de todas las empresas y de la configuración del grupo
+        group = group_for_schema(params['group'])
+        return {
+            'ledgers': group_ledger_versions(group),
+            'maps': list(group.account_maps.order_by('id').values_list('company_id', 'source_code', 'target_code')),
+            'rules': list(group.elimination_rules.order_by('id').values_list('account_code', 'counterpart_code')),
+        }
+
+    def build(self, params, progress=None):
+        return consolidate(group_for_schema(params['group']), params['report'], params)
+
+
+@register
+class ItbmsDeclarationReport(ReportDefinition):
+    """
+    Declaración de ITBMS. Facturar y recibir compras siempre contabiliza, así que
+    la versión del Libro Diario también cubre estos documentos.
+    """
+    name = 'itbms_declaration'
+
+    def parse_params(self, params):
+        start_date, end_date = _year_range(params)
+        return {'start_date': start_date, 'end_date': end_date, 'granularity': params.get('granularity') or 'month'}
+
+    def build(self, params, progress=None):
+        return itbms_declaration(params['start_date'], params['end_date'], params['granularity'])
+
+
+class StreamedReport(ReportDefinition):
+    """
+    Reporte tabular que se escribe fila a fila (CSV, TXT o JSONL) sin armarlo en memoria.
+    Las subclases definen fields(params) y rows(params); count(params), si se
+    define, permite informar el avance.
+    """
+
+    def parse_output(self, params):
+        output = params.get('output') or 'csv'
+        if output not in OUTPUT_FORMATS:
+            raise ValidationError({'output': f"Use uno de: {', '.join(OUTPUT_FORMATS)}."})
+        return output
+
+    def file_extension(self, params):
+        return OUTPUT_FORMATS[params['output']][1]
+
+    def file_content_type(self, params):
+        return OUTPUT_FORMATS[params['output']][0]
+
+    def count(self, params):
+        return None
+
+    def write(self, params, out, progress=None):
+        total = self.count(params)
+        stream = export_stream(self.fields(params), self.rows(params), params['output'])
+        for written, chunk in enumerate(stream):
+            out.write(chunk)
+            if progress and total and written % EXPORT_CHUNK_SIZE == 0:
+                progress(written * 100 // total)
+
+
+@register
+class TaxBookReport(StreamedReport):
+    """
+    Libro de ventas o de compras (DGI), un documento por fila.
+    """
+    name = 'tax_book'
+
+    def parse_params(self, params):
+        start_date, end_date = _year_range(params)
+        book = params.get('book') or 'sales'
+        if book not in TAX_BOOKS:
+            raise ValidationError({'book': f"Use uno de: {', '.join(TAX_BOOKS)}."})
+        return {'start_date': start_date, 'end_date': end_date, 'book': book, 'output': self.parse_output(params)}
+
+    def fields(self, params):
+        return tax_book_fields(params['book'])
+
+    def rows(self, params):
+        return tax_book_rows(params['book'], params['start_date'], params['end_date'])
+
+    def count(self, params):
+        return tax_book_documents(params['book'], params['start_date'], params['end_date']).count()
+
+
+@register
+class GeneralLedgerReport(StreamedReport):
+    """
+    Libro Diario / Mayor completo (CSV o JSONL), escrito en streaming.
+    """
+    name = 'general_ledger'
+
+    def parse_params(self, params):
+        start_date, end_date = _year_range(params)
+        book = params.get('book') or 'diario'
+        if book not in ('diario', 'mayor'):
+            raise ValidationError({'book': "Use 'diario' o 'mayor'."})
+        output = self.parse_output(params)
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'account': params.get('account') or None,
+            'book': book,
+            'output': output,
+        }
+
+    def fields(self, params):
+        return GENERAL_LEDGER_FIELDS + (['balance'] if params['book'] == 'mayor' else [])
+
+    def rows(self, params):
+        return general_ledger_rows(params['start_date'], params['end_date'], params['account'], params['book'])
+
+    def count(self, params):
+        return general_ledger_items(params['start_date'], params['end_date'], params['account']).count()
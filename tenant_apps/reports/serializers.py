@@ -0,0 +1,27 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+from .models import ReportJob
+from .registry import REPORTS
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """
+    Estado de un reporte asíncrono. Al crear solo se envían report_type y params.
+    """
+    report_type = serializers.ChoiceField(choices=sorted(REPORTS))
+    params = serializers.DictField(required=False, default=dict)
+    requested_by_username = serializers.CharField(source='requested_by.username', read_only=True, allow_null=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'report_type', 'params', 'status', 'progress', 'error',
+            'requested_by_username', 'created_at', 'started_at', 'finished_at', 'download_url',
+        ]
+        read_only_fields = ['status', 'progress', 'error', 'created_at', 'started_at', 'finished_at']
+
+    def get_download_url(self, obj):
+        if obj.status != 'Done':
+            return None
+        return reverse('reportjob-download', args=[obj.pk], request=self.context.get('request'))
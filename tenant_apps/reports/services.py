@@ -0,0 +1,619 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection
+from django.db.models import (
+    Sum, Count, Q, F, Value, DecimalField, DateField, BooleanField, ExpressionWrapper, FilteredRelation,
+)
+from django.db.models.functions import Coalesce, Trunc
+from rest_framework.exceptions import ValidationError
+from accounting.models import Account, AccountDailyBalance
+from accounting.services import snapshot_ledger, cumulative_balances
+from sales.models import Customer, SalesOrder
+from purchasing.models import Supplier, PurchaseOrder
+from treasury.models import TreasuryMovement
+
+GRANULARITIES = ('week', 'month', 'quarter', 'year')
+# Límite de columnas por reporte, para que un rango absurdo no genere miles de agregados
+MAX_PERIODS = 60
+
+
+def zero_decimal():
+    return Value(Decimal('0.00'), output_field=DecimalField())
+
+
+def _period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'year':
+        return date(day.year, 1, 1)
+    if granularity == 'quarter':
+        return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+    return date(day.year, day.month, 1)
+
+
+def _next_period_start(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[granularity]
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _period_label(day, granularity):
+    if granularity == 'week':
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == 'year':
+        return f"{day.year}"
+    if granularity == 'quarter':
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    return f"{day.year}-{day.month:02d}"
+
+
+def build_periods(start_date, end_date, granularity):
+    """
+    Divide [start_date, end_date] en periodos de calendario (semana ISO, mes,
+    trimestre o año).
+    El primer y el último periodo se recortan al rango pedido.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValidationError({'granularity': f"Use uno de: {', '.join(GRANULARITIES)}."})
+    if start_date > end_date:
+        raise ValidationError({'start_date': "La fecha inicial no puede ser posterior a la final."})
+
+    periods = []
+    cursor = _period_start(start_date, granularity)
+    while cursor <= end_date:
+        next_start = _next_period_start(cursor, granularity)
+        periods.append({
+            'key': _period_label(cursor, granularity),
+            'start': max(cursor, start_date),
+            'end': min(next_start - timedelta(days=1), end_date),
+        })
+        if len(periods) > MAX_PERIODS:
+            raise ValidationError({'granularity': f"El rango genera más de {MAX_PERIODS} periodos."})
+        cursor = next_start
+    return periods
+
+
+def trial_balance(start_date, end_date, granularity='month'):
+    """
+    Balance de comprobación multi-periodo.
+    Saldo inicial, Debe/Haber de cada periodo y saldo final por cuenta, todo en una
+    sola consulta agrupada con agregados condicionales (SUM ... FILTER) sobre
+    los saldos diarios posteriores al último cierre fiscal.
+    Los saldos son deudores en positivo (Debe - Haber).
+    """
+    periods = build_periods(start_date, end_date, granularity)
+    zero = zero_decimal()
+
+    # Saldo inicial = foto del último cierre anterior + movimientos posteriores a él
+    queryset, snapshot = snapshot_ledger(end_date, before=start_date)
+    before_start = Q(movements__date__lt=start_date)
+    annotations = {
+        'opening_debit': Coalesce(Sum('movements__debit_total', filter=before_start), zero) + F('snapshot_debit'),
+        'opening_credit': Coalesce(Sum('movements__credit_total', filter=before_start), zero) + F('snapshot_credit'),
+    }
+    for index, period in enumerate(periods):
+        in_period = Q(movements__date__range=(period['start'], period['end']))
+        annotations[f'p{index}_debit'] = Coalesce(Sum('movements__debit_total', filter=in_period), zero)
+        annotations[f'p{index}_credit'] = Coalesce(Sum('movements__credit_total', filter=in_period), zero)
+
+    rows = queryset.annotate(**annotations).values(
+        'id', 'code', 'name', 'account_type', 'parent_id', *annotations.keys()
+    ).order_by('code')
+
+    accounts = []
+    totals = {
+        'opening_balance': Decimal('0.00'),
+        'periods': [{'debit': Decimal('0.00'), 'credit': Decimal('0.00')} for _ in periods],
+        'closing_balance': Decimal('0.00'),
+    }
+    for row in rows:
+        opening = row['opening_debit'] - row['opening_credit']
+        closing = opening
+        movements = []
+        for index in range(len(periods)):
+            debit, credit = row[f'p{index}_debit'], row[f'p{index}_credit']
+            closing += debit - credit
+            movements.append({'debit': debit, 'credit': credit})
+            totals['periods'][index]['debit'] += debit
+            totals['periods'][index]['credit'] += credit
+
+        totals['opening_balance'] += opening
+        totals['closing_balance'] += closing
+        accounts.append({
+            'id': row['id'],
+            'code': row['code'],
+            'name': row['name'],
+            'account_type': row['account_type'],
+            'parent_id': row['parent_id'],
+            'opening_balance': opening,
+            'periods': movements,
+            'closing_balance': closing,
+        })
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'granularity': granularity,
+        'periods': periods,
+        'snapshot': snapshot.name if snapshot else None,
+        'accounts': accounts,
+        'totals': totals,
+    }
+
+
+BALANCE_SHEET_SECTIONS = (
+    ('assets', 'ASSET'),
+    ('liabilities', 'LIABILITY'),
+    ('equity', 'EQUITY'),
+)
+
+
+def balance_sheet(as_of_date):
+    """
+    Balance General a una fecha.
+    Una sola consulta agrupada por cuenta (foto del último cierre + saldos diarios
+    posteriores) alimenta los totales por tipo, las líneas por cuenta y los
+    subtotales de cada cuenta padre (suma de su subárbol).
+    Los saldos se expresan según la naturaleza de cada tipo de cuenta.
+    """
+    rows, snapshot = cumulative_balances(as_of_date)
+    rows = list(rows.values(
+        'id', 'code', 'name', 'account_type', 'parent_id', 'debit_total', 'credit_total'
+    ).order_by('code'))
+
+    accounts = {}
+    for row in rows:
+        if row['account_type'] in Account.DEBIT_NATURE_TYPES:
+            balance = row['debit_total'] - row['credit_total']
+        else:
+            balance = row['credit_total'] - row['debit_total']
+        accounts[row['id']] = {
+            'id': row['id'],
+            'code': row['code'],
+            'name': row['name'],
+            'account_type': row['account_type'],
+            'parent_id': row['parent_id'],
+            'balance': balance,
+            'total': Decimal('0.00'),
+        }
+
+    # Subtotal de cada cuenta = su saldo + el de todas sus subcuentas
+    totals = {account_type: Decimal('0.00') for account_type, _ in Account.ACCOUNT_TYPE_CHOICES}
+    for account in accounts.values():
+        totals[account['account_type']] += account['balance']
+        node, seen = account, set()
+        while node and node['id'] not in seen:
+            seen.add(node['id'])
+            node['total'] += account['balance']
+            node = accounts.get(node['parent_id'])
+
+    net_profit = totals['REVENUE'] - totals['EXPENSE']
+    sections = {}
+    for key, account_type in BALANCE_SHEET_SECTIONS:
+        sections[key] = {
+            'total': totals[account_type],
+            'accounts': [
+                account for account in accounts.values()
+                if account['account_type'] == account_type and (account['total'] or account['balance'])
+            ],
+        }
+    # El resultado del ejercicio aún no cerrado forma parte del Patrimonio
+    sections['equity']['net_profit'] = net_profit
+    sections['equity']['total'] += net_profit
+
+    assets = sections['assets']['total']
+    liabilities = sections['liabilities']['total']
+    equity = sections['equity']['total']
+    return {
+        'as_of_date': as_of_date,
+        'snapshot': snapshot.name if snapshot else None,
+        'assets': assets,
+        'liabilities': liabilities,
+        'equity': equity,
+        'sections': sections,
+        'check': {
+            'total_assets': assets,
+            'total_liabilities_plus_equity': liabilities + equity,
+            'is_balanced': assets == liabilities + equity,
+        },
+    }
+
+
+COMPARISONS = ('previous_year', 'previous_period')
+PROFIT_AND_LOSS_TYPES = ('REVENUE', 'EXPENSE')
+
+
+def _shift_year(day, years=-1):
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:  # 29 de febrero
+        return day.replace(year=day.year + years, day=28)
+
+
+def comparison_periods(periods, start_date, end_date, comparison):
+    """
+    Periodos de comparación alineados 1 a 1 con `periods`: el mismo tramo un año
+    antes ('previous_year') o el rango de igual duración inmediatamente anterior
+    ('previous_period').
+    """
+    if comparison not in COMPARISONS:
+        raise ValidationError({'compare': f"Use uno de: {', '.join(COMPARISONS)}."})
+    offset = end_date - start_date + timedelta(days=1)
+
+    def shift(day):
+        return _shift_year(day) if comparison == 'previous_year' else day - offset
+
+    return [{
+        'key': f"{shift(period['start'])}/{shift(period['end'])}",
+        'start': shift(period['start']),
+        'end': shift(period['end']),
+    } for period in periods]
+
+
+def _natural_amounts(row, prefix, count):
+    """
+    Importes de las columnas `prefix{i}`: Haber - Debe para ingresos, Debe - Haber para gastos.
+    """
+    amounts = []
+    for index in range(count):
+        debit, credit = row[f'{prefix}{index}_debit'], row[f'{prefix}{index}_credit']
+        amounts.append(credit - debit if row['account_type'] == 'REVENUE' else debit - credit)
+    return amounts
+
+
+def profit_and_loss(start_date, end_date, granularity='month', comparison=None):
+    """
+    Estado de Resultados multi-periodo y comparativo.
+    Todas las columnas (periodos y, si se pide, sus comparativos) salen de una sola
+    consulta agrupada por cuenta con agregados condicionales (SUM ... FILTER)
+    sobre los saldos diarios. Ingresos en saldo acreedor, gastos en saldo deudor.
+    """
+    periods = build_periods(start_date, end_date, granularity)
+    compared = comparison_periods(periods, start_date, end_date, comparison) if comparison else []
+    zero = zero_decimal()
+
+    columns = [('p', index, period) for index, period in enumerate(periods)]
+    columns += [('c', index, period) for index, period in enumerate(compared)]
+    first = min(period['start'] for _, _, period in columns)
+    last = max(period['end'] for _, _, period in columns)
+
+    annotations = {}
+    for prefix, index, period in columns:
+        in_period = Q(movements__date__range=(period['start'], period['end']))
+        annotations[f'{prefix}{index}_debit'] = Coalesce(Sum('movements__debit_total', filter=in_period), zero)
+        annotations[f'{prefix}{index}_credit'] = Coalesce(Sum('movements__credit_total', filter=in_period), zero)
+
+    rows = Account.objects.filter(account_type__in=PROFIT_AND_LOSS_TYPES).annotate(
+        movements=FilteredRelation(
+            'daily_balances', condition=Q(daily_balances__date__range=(first, last))
+        ),
+        **annotations
+    ).values('id', 'code', 'name', 'account_type', 'parent_id', *annotations.keys()).order_by('code')
+
+    totals = {
+        account_type: {
+            key: {'amounts': [Decimal('0.00')] * len(periods), 'total': Decimal('0.00')}
+            if key == 'current' or comparison else None
+            for key in ('current', 'comparison')
+        }
+        for account_type in PROFIT_AND_LOSS_TYPES
+    }
+    accounts = []
+    for row in rows:
+        line = {
+            'id': row['id'],
+            'code': row['code'],
+            'name': row['name'],
+            'account_type': row['account_type'],
+            'parent_id': row['parent_id'],
+            'current': {'amounts': _natural_amounts(row, 'p', len(periods))},
+            'comparison': {'amounts': _natural_amounts(row, 'c', len(compared))} if comparison else None,
+        }
+        for key in ('current', 'comparison'):
+            if line[key] is None:
+                continue
+            line[key]['total'] = sum(line[key]['amounts'], Decimal('0.00'))
+            bucket = totals[row['account_type']][key]
+            bucket['amounts'] = [a + b for a, b in zip(bucket['amounts'], line[key]['amounts'])]
+            bucket['total'] += line[key]['total']
+        if comparison:
+            line['variance'] = line['current']['total'] - line['comparison']['total']
+        accounts.append(line)
+
+    net_profit = {}
+    for key in ('current', 'comparison'):
+        revenue, expense = totals['REVENUE'][key], totals['EXPENSE'][key]
+        net_profit[key] = None if revenue is None else {
+            'amounts': [r - e for r, e in zip(revenue['amounts'], expense['amounts'])],
+            'total': revenue['total'] - expense['total'],
+        }
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'granularity': granularity,
+        'comparison': comparison,
+        'periods': periods,
+        'comparison_periods': compared,
+        'accounts': accounts,
+        'revenue': totals['REVENUE'],
+        'expense': totals['EXPENSE'],
+        'net_profit_by_period': net_profit,
+        # Resumen compatible con el reporte anterior
+        'total_revenue': totals['REVENUE']['current']['total'],
+        'total_expense': totals['EXPENSE']['current']['total'],
+        'net_profit': net_profit['current']['total'],
+    }
+
+
+# Tramos de antigüedad: días de atraso sobre el vencimiento (fecha + plazo de crédito)
+AGING_BUCKETS = (
+    ('current', None, 0),
+    ('days_1_30', 1, 30),
+    ('days_31_60', 31, 60),
+    ('days_61_90', 61, 90),
+    ('over_90', 91, None),
+)
+
+
+def _aging_sources():
+    """
+    Documentos, pagos y contraparte de cada tipo de antigüedad:
+    CxC = ventas facturadas y cobros (Ingresos) del cliente;
+    CxP = compras recibidas (neto a pagar) y pagos (Egresos) al proveedor.
+    El vencimiento corre desde la fecha de factura/recepción, no desde el borrador.
+    """
+    return {
+        'receivable': {
+            'party': Customer, 'party_column': 'customer_id',
+            'documents': SalesOrder, 'date': 'invoice_date', 'amount': 'total_amount', 'statuses': ('Invoiced',),
+            'movement_type': 'Income',
+        },
+        'payable': {
+            'party': Supplier, 'party_column': 'supplier_id',
+            'documents': PurchaseOrder, 'date': 'received_date', 'amount': 'payable_amount',
+            'statuses': ('Received', 'Completed'),
+            'movement_type': 'Expense',
+        },
+    }
+
+
+def aging_report(kind, as_of_date, credit_days=None):
+    """
+    Antigüedad de saldos (CxC o CxP) por cliente/proveedor a una fecha, en una sola
+    consulta agrupada.
+    Los cobros/pagos no están ligados a un documento: se aplican FIFO, primero a los
+    documentos más antiguos. Para eso una suma acumulada (ventana) por contraparte
+    indica cuánto de cada documento queda cubierto por el total pagado; el resto
+    es el saldo abierto, que se reparte en tramos con SUM ... FILTER.
+    Un saldo a favor (pagos por encima de lo facturado) no aparece como deuda.
+    """
+    sources = _aging_sources()
+    if kind not in sources:
+        raise ValidationError({'kind': f"Use uno de: {', '.join(sources)}."})
+    source = sources[kind]
+    if credit_days is None:
+        credit_days = settings.AGING_CREDIT_DAYS
+
+    quote = connection.ops.quote_name
+    party_column = quote(source['party_column'])
+    date_column = quote(source['date'])
+    bucket_columns = []
+    bucket_params = []
+    for key, low, high in AGING_BUCKETS:
+        conditions = []
+        if low is not None:
+            conditions.append("days_overdue >= %s")
+            bucket_params.append(low)
+        if high is not None:
+            conditions.append("days_overdue <= %s")
+            bucket_params.append(high)
+        bucket_columns.append(f"SUM(open_amount) FILTER (WHERE {' AND '.join(conditions)}) AS {key}")
+
+    sql = f"""
+        WITH paid AS (
+            SELECT {party_column} AS party_id, SUM(amount) AS total
+            FROM {quote(TreasuryMovement._meta.db_table)}
+            WHERE movement_type = %s AND {party_column} IS NOT NULL AND date <= %s
+            GROUP BY {party_column}
+        ),
+        documents AS (
+            SELECT {party_column} AS party_id, {date_column} AS document_date, {quote(source['amount'])} AS amount,
+                   SUM({quote(source['amount'])}) OVER (
+                       PARTITION BY {party_column} ORDER BY {date_column}, id
+                   ) AS running_total
+            FROM {quote(source['documents']._meta.db_table)}
+            WHERE status IN %s AND {date_column} <= %s
+        ),
+        open_items AS (
+            SELECT d.party_id,
+                   LEAST(d.amount, d.running_total - COALESCE(p.total, 0)) AS open_amount,
+                   %s::date - d.document_date - %s AS days_overdue
+            FROM documents d LEFT JOIN paid p ON p.party_id = d.party_id
+            WHERE d.running_total > COALESCE(p.total, 0)
+        )
+        SELECT o.party_id, party.name, {', '.join(bucket_columns)}, SUM(o.open_amount) AS total
+        FROM open_items o JOIN {quote(source['party']._meta.db_table)} party ON party.id = o.party_id
+        GROUP BY o.party_id, party.name
+        ORDER BY party.name, o.party_id
+    """
+    params = [
+        source['movement_type'], as_of_date,
+        tuple(source['statuses']), as_of_date,
+        as_of_date, credit_days,
+        *bucket_params,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    keys = [key for key, _, _ in AGING_BUCKETS]
+    totals = {key: Decimal('0.00') for key in keys + ['total']}
+    parties = []
+    for party_id, name, *amounts in rows:
+        line = {'id': party_id, 'name': name}
+        for key, amount in zip(keys + ['total'], amounts):
+            line[key] = amount or Decimal('0.00')
+            totals[key] += line[key]
+        parties.append(line)
+
+    return {
+        'kind': kind,
+        'as_of_date': as_of_date,
+        'credit_days': credit_days,
+        'buckets': keys,
+        'parties': parties,
+        'totals': totals,
+    }
+
+
+CASH_FLOW_METHODS = ('direct', 'indirect')
+CASH_FLOW_GRANULARITIES = ('week', 'month')
+
+
+def cash_account_filter(field='code'):
+    """
+    Cuentas de efectivo y bancos según ACCOUNTING_CASH_ACCOUNT_PREFIXES (incluye subcuentas).
+    """
+    condition = Q()
+    for prefix in settings.ACCOUNTING_CASH_ACCOUNT_PREFIXES:
+        condition |= Q(**{f'{field}__startswith': prefix})
+    return condition
+
+
+def _zero_totals(keys):
+    return {key: Decimal('0.00') for key in keys}
+
+
+def _direct_cash_flow(periods, granularity, start_date, end_date):
+    """
+    Método directo: cobros, pagos y transferencias de Tesorería agrupados por
+    periodo, tipo, contraparte y caja/cuenta bancaria en una sola consulta.
+    """
+    keys = ('inflows', 'outflows', 'transfers', 'net')
+    index = {_period_start(period['start'], granularity): i for i, period in enumerate(periods)}
+    lines = [dict(period, **_zero_totals(keys)) for period in periods]
+    counterparties = {}
+    cash_accounts = {}
+
+    rows = TreasuryMovement.objects.filter(date__range=(start_date, end_date)).annotate(
+        period=Trunc('date', granularity, output_field=DateField())
+    ).values(
+        'period', 'movement_type',
+        'customer_id', 'customer__name', 'supplier_id', 'supplier__name',
+        'from_bank_account_id', 'from_bank_account__name', 'from_cash_register_id', 'from_cash_register__name',
+        'to_bank_account_id', 'to_bank_account__name', 'to_cash_register_id', 'to_cash_register__name',
+    ).annotate(total=Sum('amount'), movements=Count('id')).order_by()
+
+    for row in rows:
+        amount = row['total']
+        line = lines[index[row['period']]]
+        bucket = {'Income': 'inflows', 'Expense': 'outflows'}.get(row['movement_type'], 'transfers')
+        line[bucket] += amount
+
+        for kind in ('customer', 'supplier'):
+            if row[f'{kind}_id'] and bucket != 'transfers':
+                party = counterparties.setdefault((kind, row[f'{kind}_id']), {
+                    'type': kind, 'id': row[f'{kind}_id'], 'name': row[f'{kind}__name'],
+                    **_zero_totals(('inflows', 'outflows')), 'movements': 0,
+                })
+                party[bucket] += amount
+                party['movements'] += row['movements']
+
+        # En cada caja o cuenta bancaria las transferencias sí entran y salen
+        for direction, side in (('from', 'outflows'), ('to', 'inflows')):
+            for kind in ('bank_account', 'cash_register'):
+                account_id = row[f'{direction}_{kind}_id']
+                if account_id:
+                    account = cash_accounts.setdefault((kind, account_id), {
+                        'type': kind, 'id': account_id, 'name': row[f'{direction}_{kind}__name'],
+                        **_zero_totals(('inflows', 'outflows')),
+                    })
+                    account[side] += amount
+
+    totals = _zero_totals(keys)
+    for line in lines:
+        line['net'] = line['inflows'] - line['outflows']
+        for key in keys:
+            totals[key] += line[key]
+    return {
+        'periods': lines,
+        'totals': totals,
+        'counterparties': sorted(counterparties.values(), key=lambda p: (p['type'], p['name'] or '')),
+        'cash_accounts': sorted(cash_accounts.values(), key=lambda a: (a['type'], a['name'] or '')),
+    }
+
+
+def _indirect_cash_flow(periods, granularity, start_date, end_date):
+    """
+    Método indirecto: resultado del periodo más las variaciones de las cuentas de
+    balance que no son efectivo, agrupando los saldos diarios por periodo, tipo de
+    cuenta y si la cuenta es de efectivo. Por partida doble, la suma coincide con la
+    variación de las cuentas de efectivo, que se devuelve para conciliar.
+    """
+    keys = ('net_profit', 'assets', 'liabilities', 'equity', 'net_cash_flow', 'cash_change')
+    index = {_period_start(period['start'], granularity): i for i, period in enumerate(periods)}
+    lines = [dict(period, **_zero_totals(keys)) for period in periods]
+
+    cash = cash_account_filter('account__code')
+    rows = AccountDailyBalance.objects.filter(date__range=(start_date, end_date)).annotate(
+        period=Trunc('date', granularity, output_field=DateField()),
+        is_cash=ExpressionWrapper(cash, output_field=BooleanField()) if cash else Value(False),
+    ).values('period', 'account__account_type', 'is_cash').annotate(
+        debit=Sum('debit_total'), credit=Sum('credit_total')
+    ).order_by()
+
+    sections = {'ASSET': 'assets', 'LIABILITY': 'liabilities', 'EQUITY': 'equity',
+                'REVENUE': 'net_profit', 'EXPENSE': 'net_profit'}
+    for row in rows:
+        line = lines[index[row['period']]]
+        if row['is_cash']:
+            line['cash_change'] += row['debit'] - row['credit']
+        else:
+            # Un activo que baja o un pasivo/patrimonio/resultado que sube aporta efectivo
+            line[sections[row['account__account_type']]] += row['credit'] - row['debit']
+
+    totals = _zero_totals(keys)
+    for line in lines:
+        line['net_cash_flow'] = line['net_profit'] + line['assets'] + line['liabilities'] + line['equity']
+        for key in keys:
+            totals[key] += line[key]
+
+    opening_rows, _ = cumulative_balances(start_date - timedelta(days=1))
+    opening_cash = sum(
+        (row['debit_total'] - row['credit_total']
+         for row in opening_rows.filter(cash_account_filter()).values('debit_total', 'credit_total')),
+        Decimal('0.00')
+    ) if settings.ACCOUNTING_CASH_ACCOUNT_PREFIXES else Decimal('0.00')
+    return {
+        'periods': lines,
+        'totals': totals,
+        'opening_cash': opening_cash,
+        'closing_cash': opening_cash + totals['cash_change'],
+        'is_reconciled': totals['net_cash_flow'] == totals['cash_change'],
+    }
+
+
+def cash_flow(start_date, end_date, granularity='month', method='direct'):
+    """
+    Estado de Flujo de Efectivo por semana o mes.
+    Directo: desde los movimientos de Tesorería. Indirecto: desde los saldos diarios
+    del Libro Diario (resultado + variaciones de balance vs. cuentas de efectivo).
+    """
+    if granularity not in CASH_FLOW_GRANULARITIES:
+        raise ValidationError({'granularity': f"Use uno de: {', '.join(CASH_FLOW_GRANULARITIES)}."})
+    if method not in CASH_FLOW_METHODS:
+        raise ValidationError({'method': f"Use uno de: {', '.join(CASH_FLOW_METHODS)}."})
+    periods = build_periods(start_date, end_date, granularity)
+    build = _direct_cash_flow if method == 'direct' else _indirect_cash_flow
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'granularity': granularity,
+        'method': method,
+        **build(periods, granularity, start_date, end_date),
+    }
@@ -0,0 +1,30 @@
+from celery import shared_task
+from django_tenants.utils import schema_context
+from tenants.utils import tenant_schemas
+from .jobs import run_report_job
+from .kpis import refresh_kpis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def run_report_job_task(schema_name, job_id):
+    """
+    Ejecuta un ReportJob dentro del esquema del tenant que lo pidió.
+    """
+    with schema_context(schema_name):
+        job = run_report_job(job_id)
+    logger.info(f"Reporte {job.report_type} #{job.pk} ({schema_name}): {job.status}")
+
+
+@shared_task
+def refresh_kpi_snapshots():
+    """
+    Actualiza los indicadores del dashboard de cada tenant (solo los que cambiaron).
+    """
+    for schema in tenant_schemas():
+        with schema_context(schema):
+            refreshed = refresh_kpis()
+        if refreshed:
+            logger.info(f"KPIs actualizados en {schema}: {', '.join(refreshed)}")
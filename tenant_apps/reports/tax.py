@@ -0,0 +1,185 @@
+"""
+Declaración de ITBMS y libros de ventas/compras para la DGI.
+
+La declaración sale de consultas agrupadas (por periodo y tipo de contribuyente
+sobre los totales de cada documento, y por periodo y tasa sobre sus líneas);
+los libros son el detalle documento a documento, leído con un cursor del lado
+del servidor para exportarlo en streaming.
+"""
+from decimal import Decimal
+from django.db.models import Sum, Count, F, DateField, DecimalField, ExpressionWrapper
+from django.db.models.functions import Trunc
+from rest_framework.exceptions import ValidationError
+from purchasing.models import PurchaseOrder, POItem
+from sales.models import SalesOrder, SOItem
+from .exports import EXPORT_CHUNK_SIZE
+from .services import build_periods, _period_start
+
+# Documentos que cuentan para el ITBMS: ventas facturadas y compras recibidas,
+# por la fecha de factura/recepción (no la del borrador, order_date)
+SALES_TAX_STATUSES = ('Invoiced',)
+PURCHASE_TAX_STATUSES = ('Received', 'Completed')
+SALES_TAX_DATE = 'invoice_date'
+PURCHASE_TAX_DATE = 'received_date'
+TAX_GRANULARITIES = ('month', 'quarter')
+TAX_BOOKS = ('sales', 'purchases')
+
+SALES_BOOK_FIELDS = [
+    'date', 'document', 'cufe', 'ruc', 'dv', 'name', 'taxpayer_type',
+    'subtotal_exempt', 'subtotal_taxable', 'tax_amount', 'total_amount',
+]
+PURCHASE_BOOK_FIELDS = [
+    'date', 'document', 'ruc', 'dv', 'name', 'supplier_type',
+    'subtotal', 'tax_amount', 'retention_amount', 'total_amount', 'payable_amount',
+]
+
+
+def _money():
+    return DecimalField(max_digits=16, decimal_places=2)
+
+
+def _by_period(periods, granularity, rows, group_key, amount_keys):
+    """
+    Reparte las filas agrupadas (periodo truncado + clave) en la lista de periodos.
+    """
+    index = {_period_start(period['start'], granularity): i for i, period in enumerate(periods)}
+    grouped = [{} for _ in periods]
+    for row in rows:
+        bucket = grouped[index[row['period']]].setdefault(
+            str(row[group_key]), {key: Decimal('0.00') for key in amount_keys} | {'documents': 0}
+        )
+        for key in amount_keys:
+            bucket[key] += row[key] or Decimal('0.00')
+        bucket['documents'] += row['documents']
+    return grouped
+
+
+def itbms_declaration(start_date, end_date, granularity='month'):
+    """
+    Resumen de ITBMS por periodo: débito fiscal (ventas), crédito fiscal (compras)
+    e ITBMS retenido a proveedores, con el detalle por tipo de contribuyente y
+    por tasa. Cuatro consultas agrupadas, sin importar el número de documentos.
+    """
+    if granularity not in TAX_GRANULARITIES:
+        raise ValidationError({'granularity': f"Use uno de: {', '.join(TAX_GRANULARITIES)}."})
+    periods = build_periods(start_date, end_date, granularity)
+
+    sales = tax_book_documents('sales', start_date, end_date)
+    purchases = tax_book_documents('purchases', start_date, end_date)
+    def period(field):
+        return Trunc(field, granularity, output_field=DateField())
+
+    sales_by_taxpayer = sales.annotate(period=period(SALES_TAX_DATE)).values(
+        'period', 'customer__taxpayer_type'
+    ).annotate(
+        subtotal_exempt=Sum('subtotal_exempt'), subtotal_taxable=Sum('subtotal_taxable'),
+        tax_amount=Sum('tax_amount'), total_amount=Sum('total_amount'), documents=Count('id'),
+    ).order_by()
+    purchases_by_supplier = purchases.annotate(period=period(PURCHASE_TAX_DATE)).values(
+        'period', 'supplier__supplier_type'
+    ).annotate(
+        subtotal=Sum('subtotal'), tax_amount=Sum('tax_amount'),
+        retention_amount=Sum('retention_amount'), total_amount=Sum('total_amount'), documents=Count('id'),
+    ).order_by()
+
+    sales_base = ExpressionWrapper(F('quantity') * F('unit_price') - F('discount'), output_field=_money())
+    sales_by_rate = SOItem.objects.filter(sales_order__in=sales).annotate(
+        period=period(f'sales_order__{SALES_TAX_DATE}'), line_base=sales_base
+    ).values('period', 'tax_rate').annotate(
+        base=Sum('line_base'),
+        tax_amount=Sum(ExpressionWrapper(F('line_base') * F('tax_rate'), output_field=_money())),
+        documents=Count('sales_order_id', distinct=True),
+    ).order_by()
+    purchase_base = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=_money())
+    purchases_by_rate = POItem.objects.filter(purchase_order__in=purchases).annotate(
+        period=period(f'purchase_order__{PURCHASE_TAX_DATE}'), line_base=purchase_base
+    ).values('period', 'tax_rate').annotate(
+        base=Sum('line_base'),
+        tax_amount=Sum(ExpressionWrapper(F('line_base') * F('tax_rate'), output_field=_money())),
+        documents=Count('purchase_order_id', distinct=True),
+    ).order_by()
+
+    sales_taxpayers = _by_period(
+        periods, granularity, sales_by_taxpayer, 'customer__taxpayer_type',
+        ('subtotal_exempt', 'subtotal_taxable', 'tax_amount', 'total_amount'),
+    )
+    purchase_suppliers = _by_period(
+        periods, granularity, purchases_by_supplier, 'supplier__supplier_type',
+        ('subtotal', 'tax_amount', 'retention_amount', 'total_amount'),
+    )
+    sales_rates = _by_period(periods, granularity, sales_by_rate, 'tax_rate', ('base', 'tax_amount'))
+    purchase_rates = _by_period(periods, granularity, purchases_by_rate, 'tax_rate', ('base', 'tax_amount'))
+
+    keys = ('output_tax', 'input_tax', 'retained_tax', 'tax_payable')
+    totals = {key: Decimal('0.00') for key in keys}
+    lines = []
+    for i, period in enumerate(periods):
+        output_tax = sum((row['tax_amount'] for row in sales_taxpayers[i].values()), Decimal('0.00'))
+        input_tax = sum((row['tax_amount'] for row in purchase_suppliers[i].values()), Decimal('0.00'))
+        retained_tax = sum((row['retention_amount'] for row in purchase_suppliers[i].values()), Decimal('0.00'))
+        line = dict(
+            period,
+            output_tax=output_tax,
+            input_tax=input_tax,
+            # Lo retenido a proveedores se entera aparte, como agente de retención
+            retained_tax=retained_tax,
+            tax_payable=output_tax - input_tax,
+            sales={'by_taxpayer_type': sales_taxpayers[i], 'by_rate': sales_rates[i]},
+            purchases={'by_supplier_type': purchase_suppliers[i], 'by_rate': purchase_rates[i]},
+        )
+        for key in keys:
+            totals[key] += line[key]
+        lines.append(line)
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'granularity': granularity,
+        'periods': lines,
+        'totals': totals,
+    }
+
+
+def tax_book_fields(book):
+    return SALES_BOOK_FIELDS if book == 'sales' else PURCHASE_BOOK_FIELDS
+
+
+def tax_book_documents(book, start_date, end_date):
+    """
+    Documentos del libro de ventas (facturas) o de compras (compras recibidas) del rango.
+    """
+    if book not in TAX_BOOKS:
+        raise ValidationError({'book': f"Use uno de: {', '.join(TAX_BOOKS)}."})
+    if book == 'sales':
+        return SalesOrder.objects.filter(
+            status__in=SALES_TAX_STATUSES, **{f'{SALES_TAX_DATE}__range': (start_date, end_date)}
+        )
+    return PurchaseOrder.objects.filter(
+        status__in=PURCHASE_TAX_STATUSES, **{f'{PURCHASE_TAX_DATE}__range': (start_date, end_date)}
+    )
+
+
+def tax_book_rows(book, start_date, end_date):
+    """
+    Libro de ventas o de compras: un documento por fila, en orden de fecha.
+    """
+    date_field = SALES_TAX_DATE if book == 'sales' else PURCHASE_TAX_DATE
+    documents = tax_book_documents(book, start_date, end_date).order_by(date_field, 'id')
+    if book == 'sales':
+        columns = (
+            date_field, 'id', 'cufe', 'customer__ruc', 'customer__dv', 'customer__name',
+            'customer__taxpayer_type', 'subtotal_exempt', 'subtotal_taxable', 'tax_amount', 'total_amount',
+        )
+        prefix = 'SO'
+    else:
+        columns = (
+            date_field, 'id', 'supplier__ruc', 'supplier__dv', 'supplier__name', 'supplier__supplier_type',
+            'subtotal', 'tax_amount', 'retention_amount', 'total_amount', 'payable_amount',
+        )
+        prefix = 'PO'
+
+    fields = tax_book_fields(book)
+    for row in documents.values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        line = dict(zip(fields, row))
+        line['document'] = f"{prefix}-{line['document']}"
+        yield line
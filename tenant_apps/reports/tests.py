@@ -1,3 +1,822 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from unittest import mock, skipIf, skipUnless
+from django.core.management import call_command, CommandError
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
+from django_tenants.utils import schema_context, get_public_schema_name
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.models import User
+from stward_erp.db import stable_max_id
+from stward_erp.testing import business_queries, post_entry
+from accounting.models import Account, FiscalPeriod, JournalEntry, JournalItem
+from accounting.services import close_fiscal_period
+from reports.services import build_periods, trial_balance, profit_and_loss, aging_report, cash_flow
+from reports.views import (
+    TrialBalanceAPIView, BalanceSheetAPIView, ProfitAndLossAPIView, GeneralLedgerExportView, ReportJobViewSet,
+    ConsolidatedReportAPIView, AgingReportAPIView, CashFlowAPIView, KpiSnapshotAPIView,
+    ItbmsDeclarationAPIView, TaxBookExportView,
+)
+from reports.models import ReportJob, KpiSnapshot
+from reports.kpis import refresh_kpis
+from reports.bi_export import HAS_PYARROW, FACTS, fact_batches, export_facts
+from reports.models import BiExportWatermark
+from reports.jobs import submit_report_job, run_report_job, _reusable_job as reusable_job
+from reports.tasks import run_report_job_task
+from reports.consolidation import aggregate_schemas
+from sales.models import Customer, SalesOrder, SOItem
+from sales.services import invoice_sales_order
+from purchasing.models import Supplier, PurchaseOrder, POItem
+from inventory.models import Category, Product, UnitOfMeasure
+from treasury.models import BankAccount, CashRegister, TreasuryMovement
+from tenants.models import Company, CompanySubsidiary, ConsolidationGroup, ConsolidationAccountMap, EliminationRule
+from tenants.views import ConsolidationGroupViewSet
 
-# Create your tests here.
+
+class BuildPeriodsTests(SimpleTestCase):
+
+    def test_quarters_are_clipped_to_range(self):
+        periods = build_periods(date(2025, 2, 15), date(2025, 7, 10), 'quarter')
+        self.assertEqual([p['key'] for p in periods], ['2025-Q1', '2025-Q2', '2025-Q3'])
+        self.assertEqual(periods[0]['start'], date(2025, 2, 15))
+        self.assertEqual(periods[1]['end'], date(2025, 6, 30))
+        self.assertEqual(periods[2]['end'], date(2025, 7, 10))
+
+    def test_rejects_unknown_granularity(self):
+        with self.assertRaises(ValidationError):
+            build_periods(date(2025, 1, 1), date(2025, 12, 31), 'day')
+
+
+class ReportTestCase(TenantTestCase):
+    """
+    Plan de cuentas mínimo y helpers compartidos por los reportes.
+    """
+
+    def setUp(self):
+        # Los reportes se cachean por versión del Libro Diario, que en un TestCase
+        # no cambia (on_commit no se ejecuta): cada test parte de una caché vacía
+        cache.clear()
+        self.cash = Account.objects.create(name='Caja', code='1105', account_type='ASSET')
+        self.payables = Account.objects.create(name='Proveedores', code='2205', account_type='LIABILITY')
+        self.capital = Account.objects.create(name='Capital', code='3105', account_type='EQUITY')
+        self.sales = Account.objects.create(name='Ventas', code='4135', account_type='REVENUE')
+        self.expenses = Account.objects.create(name='Arriendos', code='5120', account_type='EXPENSE')
+        self.user = User.objects.create_user(username='contador', password='x')
+
+    def get(self, view, params=None, headers=None, **kwargs):
+        request = APIRequestFactory().get('/', params or {}, **(headers or {}))
+        force_authenticate(request, user=self.user)
+        return view.as_view()(request, **kwargs)
+
+
+class TrialBalanceTests(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        post_entry(date(2024, 12, 20), self.cash, self.capital, '1000.00')
+        post_entry(date(2025, 1, 10), self.cash, self.sales, '200.00')
+        post_entry(date(2025, 2, 5), self.expenses, self.cash, '50.00')
+        post_entry(date(2025, 2, 28), self.cash, self.sales, '30.00')
+
+    def test_opening_movements_and_closing_in_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            report = trial_balance(date(2025, 1, 1), date(2025, 3, 31), 'month')
+        # Búsqueda del último cierre + una sola consulta agregada
+        queries = business_queries(context)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(len([sql for sql in queries if 'SUM(' in sql]), 1)
+
+        rows = {row['code']: row for row in report['accounts']}
+        cash = rows['1105']
+        self.assertEqual(cash['opening_balance'], Decimal('1000.00'))
+        self.assertEqual(cash['periods'][0], {'debit': Decimal('200.00'), 'credit': Decimal('0.00')})
+        self.assertEqual(cash['periods'][1], {'debit': Decimal('30.00'), 'credit': Decimal('50.00')})
+        self.assertEqual(cash['closing_balance'], Decimal('1180.00'))
+        self.assertEqual(rows['4135']['closing_balance'], Decimal('-230.00'))
+        # Cuentas sin movimiento también aparecen
+        self.assertEqual(rows['2205']['closing_balance'], Decimal('0.00'))
+        # Un balance de comprobación siempre suma cero
+        self.assertEqual(report['totals']['closing_balance'], Decimal('0.00'))
+
+    def test_endpoint_validates_params(self):
+        response = self.get(TrialBalanceAPIView, {'start_date': '2025-01-01', 'end_date': '2025-12-31', 'granularity': 'quarter'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['periods']), 4)
+
+        response = self.get(TrialBalanceAPIView, {'start_date': '2025-13-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_closed_snapshot_gives_same_result(self):
+        before = trial_balance(date(2025, 2, 1), date(2025, 3, 31), 'month')
+
+        period = FiscalPeriod.objects.create(name='2025-01', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31))
+        close_fiscal_period(period, self.user)
+        after = trial_balance(date(2025, 2, 1), date(2025, 3, 31), 'month')
+
+        self.assertEqual(after['snapshot'], '2025-01')
+        self.assertEqual(after['accounts'], before['accounts'])
+
+
+class ProfitAndLossTests(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        post_entry(date(2024, 1, 15), self.cash, self.sales, '100.00')
+        post_entry(date(2025, 1, 10), self.cash, self.sales, '300.00')
+        post_entry(date(2025, 1, 20), self.expenses, self.cash, '80.00')
+        post_entry(date(2025, 6, 5), self.cash, self.sales, '50.00')
+
+    def test_comparative_monthly_columns_in_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            report = profit_and_loss(date(2025, 1, 1), date(2025, 12, 31), 'month', 'previous_year')
+        queries = business_queries(context)
+        # 12 meses + 12 comparativos en un solo recorrido
+        self.assertEqual(len(queries), 1)
+        self.assertIn('FILTER', queries[0])
+
+        self.assertEqual(len(report['comparison_periods']), 12)
+        self.assertEqual(report['comparison_periods'][0]['start'], date(2024, 1, 1))
+        self.assertEqual(report['net_profit_by_period']['current']['amounts'][0], Decimal('220.00'))
+        self.assertEqual(report['net_profit_by_period']['comparison']['amounts'][0], Decimal('100.00'))
+        self.assertEqual(report['net_profit'], Decimal('270.00'))
+
+        sales = next(line for line in report['accounts'] if line['code'] == '4135')
+        self.assertEqual(sales['current']['total'], Decimal('350.00'))
+        self.assertEqual(sales['variance'], Decimal('250.00'))
+
+    def test_endpoint_params(self):
+        data = self.get(ProfitAndLossAPIView, {
+            'start_date': '2025-01-01', 'end_date': '2025-06-30', 'granularity': 'quarter',
+            'compare': 'previous_period',
+        }).data
+        self.assertEqual([p['key'] for p in data['periods']], ['2025-Q1', '2025-Q2'])
+        self.assertEqual(data['comparison_periods'][0]['start'], date(2024, 7, 4))
+        self.assertEqual(data['total_expense'], Decimal('80.00'))
+
+        response = self.get(ProfitAndLossAPIView, {'compare': 'last_week'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BalanceSheetTests(ReportTestCase):
+
+    def test_balance_sheet_uses_snapshot_and_later_movements(self):
+        post_entry(date(2025, 1, 10), self.cash, self.capital, '1000.00')
+        post_entry(date(2025, 1, 20), self.cash, self.sales, '300.00')
+        period = FiscalPeriod.objects.create(name='2025-01', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31))
+        close_fiscal_period(period, self.user)
+        post_entry(date(2025, 3, 1), self.expenses, self.payables, '100.00')
+
+        data = self.get(BalanceSheetAPIView).data
+        self.assertEqual(data['assets'], Decimal('1300.00'))
+        self.assertEqual(data['liabilities'], Decimal('100.00'))
+        self.assertEqual(data['equity'], Decimal('1200.00'))
+        self.assertTrue(data['check']['is_balanced'])
+
+    def test_as_of_breakdown_in_one_grouped_query(self):
+        bank = Account.objects.create(name='Bancos', code='1110', account_type='ASSET')
+        current = Account.objects.create(name='Activo corriente', code='11', account_type='ASSET')
+        for account in (self.cash, bank):
+            account.parent = current
+            account.save()
+        post_entry(date(2025, 1, 10), self.cash, self.capital, '1000.00')
+        post_entry(date(2025, 2, 10), bank, self.sales, '250.00')
+        post_entry(date(2025, 3, 10), self.expenses, bank, '50.00')
+
+        with CaptureQueriesContext(connection) as context:
+            data = self.get(BalanceSheetAPIView, {'as_of': '2025-02-28'}).data
+        # Búsqueda del último cierre + una sola consulta agrupada
+        self.assertEqual(len(business_queries(context)), 2)
+
+        self.assertEqual(data['as_of_date'], date(2025, 2, 28))
+        self.assertEqual(data['assets'], Decimal('1250.00'))
+        lines = {line['code']: line for line in data['sections']['assets']['accounts']}
+        self.assertEqual(lines['11']['total'], Decimal('1250.00'))
+        self.assertEqual(lines['11']['balance'], Decimal('0.00'))
+        self.assertEqual(lines['1110']['balance'], Decimal('250.00'))
+        self.assertEqual(data['sections']['equity']['net_profit'], Decimal('250.00'))
+        self.assertTrue(data['check']['is_balanced'])
+
+        self.assertEqual(self.get(BalanceSheetAPIView, {'as_of': '2025-31-12'}).status_code, 400)
+
+
+class GeneralLedgerExportTests(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.petty_cash = Account.objects.create(name='Caja menor', code='110510', account_type='ASSET', parent=self.cash)
+        post_entry(date(2025, 1, 10), self.cash, self.capital, '1000.00')
+        post_entry(date(2025, 1, 11), self.expenses, self.petty_cash, '40.00')
+        post_entry(date(2025, 2, 1), self.cash, self.sales, '60.00')
+        post_entry(date(2026, 1, 1), self.cash, self.sales, '1.00')
+
+    def _content(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_diario_streams_all_lines_in_range(self):
+        response = self.get(GeneralLedgerExportView, {'start_date': '2025-01-01', 'end_date': '2025-12-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = self._content(response).strip().splitlines()
+        self.assertEqual(lines[0].split(','), ['entry_id', 'date', 'entry_description', 'account_code',
+                                               'account_name', 'debit', 'credit', 'line_description'])
+        self.assertEqual(len(lines), 1 + 6)
+
+    def test_jsonl_mayor_filters_subtree_with_running_balance(self):
+        response = self.get(GeneralLedgerExportView, {
+            'start_date': '2025-01-01', 'end_date': '2025-12-31',
+            'account': '1105', 'book': 'mayor', 'output': 'jsonl',
+        })
+        rows = [json.loads(line) for line in self._content(response).splitlines()]
+        self.assertEqual([row['account_code'] for row in rows], ['1105', '1105', '110510'])
+        self.assertEqual([row['balance'] for row in rows], ['1000.00', '1060.00', '-40.00'])
+
+    def test_rejects_unknown_output(self):
+        response = self.get(GeneralLedgerExportView, {'output': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReportCacheTests(ReportTestCase):
+
+    def test_etag_304_and_invalidation_on_posting(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post_entry(date(2025, 1, 10), self.cash, self.capital, '1000.00')
+        params = {'as_of': '2025-12-31'}
+
+        first = self.get(BalanceSheetAPIView, params)
+        etag = first['ETag']
+        self.assertEqual(first.data['assets'], Decimal('1000.00'))
+
+        # Misma versión: 304 sin consultas de negocio; sin ETag, se sirve desde la caché
+        with CaptureQueriesContext(connection) as context:
+            not_modified = self.get(BalanceSheetAPIView, params, headers={'HTTP_IF_NONE_MATCH': etag})
+            cached = self.get(BalanceSheetAPIView, params)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(cached.data['assets'], Decimal('1000.00'))
+        self.assertEqual(business_queries(context), [])
+
+        # Otros parámetros, otra entrada
+        self.assertNotEqual(self.get(BalanceSheetAPIView, {'as_of': '2024-12-31'})['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post_entry(date(2025, 2, 1), self.cash, self.sales, '5.00')
+        fresh = self.get(BalanceSheetAPIView, params, headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.data['assets'], Decimal('1005.00'))
+
+    def test_default_dates_follow_today(self):
+        # Sin ?as_of= la clave sale de la fecha resuelta: al cambiar el día no se sirve el Balance de ayer
+        with self.captureOnCommitCallbacks(execute=True):
+            post_entry(date(2025, 1, 10), self.cash, self.capital, '1000.00')
+
+        with mock.patch('reports.registry.date', wraps=date) as fake_date:
+            fake_date.today.return_value = date(2024, 12, 31)
+            yesterday = self.get(BalanceSheetAPIView)
+            fake_date.today.return_value = date(2025, 1, 10)
+            today = self.get(BalanceSheetAPIView, headers={'HTTP_IF_NONE_MATCH': yesterday['ETag']})
+
+        self.assertEqual(yesterday.data['assets'], Decimal('0.00'))
+        self.assertEqual(today.status_code, 200)
+        self.assertNotEqual(today['ETag'], yesterday['ETag'])
+        self.assertEqual(today.data['assets'], Decimal('1000.00'))
+
+
+class ReportJobTests(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        post_entry(date(2025, 1, 10), self.cash, self.capital, '1000.00')
+
+    def _request(self, method, path, data=None, user=None):
+        factory = APIRequestFactory()
+        request = getattr(factory, method)(path, data or {}, format='json' if method == 'post' else None)
+        force_authenticate(request, user=user or self.user)
+        return request
+
+    def test_identical_jobs_are_deduplicated(self):
+        view = ReportJobViewSet.as_view({'post': 'create'})
+        data = {'report_type': 'trial_balance', 'params': {'start_date': '2025-01-01', 'end_date': '2025-12-31'}}
+        first = view(self._request('post', '/api/v1/report-jobs/', data))
+        # Los valores por defecto se normalizan: granularity=month es la misma petición
+        data['params']['granularity'] = 'month'
+        second = view(self._request('post', '/api/v1/report-jobs/', data))
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+        response = view(self._request('post', '/api/v1/report-jobs/', {'report_type': 'nope'}))
+        self.assertEqual(response.status_code, 400)
+
+    def test_worker_runs_in_tenant_schema_and_result_is_downloadable(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            job, created = submit_report_job('general_ledger', {'start_date': '2025-01-01', 'output': 'jsonl'}, self.user)
+            self.assertTrue(created)
+            run_report_job_task(connection.schema_name, job.pk)
+
+            detail = ReportJobViewSet.as_view({'get': 'retrieve'})(self._request('get', '/'), pk=job.pk).data
+            self.assertEqual((detail['status'], detail['progress']), ('Done', 100))
+            self.assertTrue(detail['download_url'].endswith(f'/report-jobs/{job.pk}/download/'))
+
+            response = ReportJobViewSet.as_view({'get': 'download'})(self._request('get', '/'), pk=job.pk)
+            lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['account_code'] for line in lines], ['1105', '3105'])
+
+        # Ya terminado y sin cambios en el Libro Diario: se reutiliza el resultado
+        self.assertEqual(submit_report_job('general_ledger', {'start_date': '2025-01-01', 'output': 'jsonl'}, self.user)[0], job)
+
+    def test_download_before_done_conflicts(self):
+        job, _ = submit_report_job('balance_sheet', {}, self.user)
+        response = ReportJobViewSet.as_view({'get': 'download'})(self._request('get', '/'), pk=job.pk)
+        self.assertEqual(response.status_code, 409)
+
+
+    def test_jobs_are_private_to_their_requester(self):
+        job, _ = submit_report_job('balance_sheet', {'as_of': '2025-12-31'}, self.user)
+        other = User.objects.create_user(username='auditor', password='x')
+        # La misma petición de otro usuario es otro trabajo
+        self.assertNotEqual(submit_report_job('balance_sheet', {'as_of': '2025-12-31'}, other)[0], job)
+
+        retrieve = ReportJobViewSet.as_view({'get': 'retrieve'})
+        download = ReportJobViewSet.as_view({'get': 'download'})
+        self.assertEqual(retrieve(self._request('get', '/', user=other), pk=job.pk).status_code, 404)
+        self.assertEqual(download(self._request('get', '/', user=other), pk=job.pk).status_code, 404)
+
+        other.is_staff = True
+        other.save()
+        listing = ReportJobViewSet.as_view({'get': 'list'})(self._request('get', '/', user=other))
+        self.assertEqual(len(listing.data['results']), 2)
+
+    def test_stale_pending_job_stops_blocking(self):
+        job, _ = submit_report_job('balance_sheet', {'as_of': '2025-12-31'})
+        # La tarea se perdió: lleva en cola más que el plazo
+        ReportJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(hours=2))
+
+        with override_settings(REPORT_JOB_STALE_MINUTES=30):
+            retry, created = submit_report_job('balance_sheet', {'as_of': '2025-12-31'})
+        self.assertTrue(created)
+        self.assertNotEqual(retry.pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Failed')
+
+        # Si la tarea perdida aparece tarde, ya no reclama el trabajo
+        self.assertEqual(run_report_job(job.pk).status, 'Failed')
+
+    def test_race_loser_finds_finished_winner(self):
+        winner, _ = submit_report_job('balance_sheet', {'as_of': '2025-12-31'})
+        lookups = []
+
+        def racing(report_type, params_hash):
+            lookups.append(params_hash)
+            if len(lookups) == 1:
+                return None  # Aún no se veía el trabajo de la otra petición...
+            ReportJob.objects.filter(pk=winner.pk).update(status='Done')  # ...que terminó antes de releerlo
+            return reusable_job(report_type, params_hash)
+
+        with mock.patch('reports.jobs._reusable_job', side_effect=racing):
+            job, created = submit_report_job('balance_sheet', {'as_of': '2025-12-31'})
+        self.assertEqual((job.pk, created), (winner.pk, False))
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_job_is_claimed_once(self):
+        job, _ = submit_report_job('balance_sheet', {'as_of': '2025-12-31'})
+        # Otro worker ya lo reclamó: esta entrega duplicada no hace nada
+        ReportJob.objects.filter(pk=job.pk).update(status='Running')
+        result = run_report_job(job.pk)
+        self.assertEqual((result.status, result.progress), ('Running', 0))
+        self.assertFalse(result.result_file)
+
+class ConsolidationTests(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.receivable = Account.objects.create(name='CxC vinculadas', code='1380', account_type='ASSET')
+        self.group = ConsolidationGroup.objects.create(name='Holding', parent=self.tenant)
+        self.group.members.add(self.tenant)
+        ConsolidationAccountMap.objects.create(group=self.group, source_code='2205', target_code='2200')
+        EliminationRule.objects.create(
+            group=self.group, name='Saldos intercompañía', account_code='1380', counterpart_code='2200'
+        )
+
+        post_entry(date(2025, 1, 10), self.cash, self.capital, '1000.00')
+        post_entry(date(2025, 2, 1), self.receivable, self.capital, '300.00')
+        post_entry(date(2025, 3, 1), self.expenses, self.payables, '200.00')
+        post_entry(date(2025, 3, 5), self.cash, self.sales, '500.00')
+
+    def test_balance_sheet_maps_codes_and_eliminates_intercompany(self):
+        response = self.get(ConsolidatedReportAPIView, {
+            'group': self.group.pk, 'report': 'balance_sheet', 'as_of': '2025-12-31',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        accounts = {a['code']: a for a in data['accounts']}
+
+        self.assertNotIn('2205', accounts)
+        self.assertEqual(accounts['2200']['eliminated'], Decimal('200.00'))
+        self.assertEqual(accounts['2200']['amount'], Decimal('0.00'))
+        self.assertEqual(accounts['1380']['amount'], Decimal('100.00'))
+        self.assertEqual(accounts['1105']['by_schema'], {self.tenant.schema_name: Decimal('1500.00')})
+        self.assertEqual(data['eliminations'][0]['difference'], Decimal('100.00'))
+        self.assertEqual(data['assets'], Decimal('1600.00'))
+        self.assertTrue(data['check']['is_balanced'])
+        self.assertEqual([s['schema'] for s in data['schemas']], [self.tenant.schema_name])
+
+    def test_profit_and_loss_and_group_scope(self):
+        data = self.get(ConsolidatedReportAPIView, {
+            'group': self.group.pk, 'start_date': '2025-03-01', 'end_date': '2025-03-31',
+        }).data
+        self.assertEqual((data['total_revenue'], data['total_expense']), (Decimal('500.00'), Decimal('200.00')))
+        self.assertEqual(data['net_profit'], Decimal('300.00'))
+
+        # Un grupo de otra empresa matriz no es visible desde este tenant
+        company = self.foreign_company()
+        other = ConsolidationGroup.objects.create(name='Ajeno', parent=company)
+        response = self.get(ConsolidatedReportAPIView, {'group': other.pk})
+        self.assertEqual(response.status_code, 400)
+
+    def foreign_company(self, schema_name='ajena'):
+        with schema_context(get_public_schema_name()):
+            company = Company(schema_name=schema_name, name='Ajena')
+            company.auto_create_schema = False
+            company.save()
+        return company
+
+    def test_foreign_company_cannot_be_consolidated(self):
+        foreign = self.foreign_company()
+        create = ConsolidationGroupViewSet.as_view({'post': 'create'})
+
+        def post_group(members, maps=()):
+            request = APIRequestFactory().post('/', {
+                'name': 'Intento', 'members': members,
+                'account_maps': [{'company': pk, 'source_code': '1105', 'target_code': '1100'} for pk in maps],
+            }, format='json')
+            force_authenticate(request, user=self.user)
+            return create(request)
+
+        response = post_group([self.tenant.pk, foreign.pk])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('members', response.data)
+        self.assertEqual(post_group([self.tenant.pk], maps=[foreign.pk]).status_code, 400)
+        self.assertFalse(ConsolidationGroup.objects.filter(name='Intento').exists())
+
+        # Un grupo con una empresa ajena (p. ej. creado antes de la autorización) no se calcula
+        self.group.members.add(foreign)
+        response = self.get(ConsolidatedReportAPIView, {'group': self.group.pk, 'report': 'balance_sheet'})
+        self.assertEqual(response.status_code, 403)
+
+        # Con la relación holding -> subsidiaria registrada en el esquema público, sí
+        CompanySubsidiary.objects.create(holding=self.tenant, subsidiary=foreign)
+        self.assertEqual(post_group([self.tenant.pk, foreign.pk], maps=[foreign.pk]).status_code, 201)
+
+    def test_schemas_are_aggregated_on_worker_threads(self):
+        # Cada hilo abre su propia conexión: no ve los datos sin confirmar del test,
+        # pero sí recorre el esquema y mide su tiempo
+        params = {'start_date': date(2025, 1, 1), 'end_date': date(2025, 12, 31)}
+        schema = self.tenant.schema_name
+        results = aggregate_schemas([schema, schema], 'profit_and_loss', params, max_workers=2)
+        self.assertEqual([r['schema'] for r in results], [schema, schema])
+        self.assertTrue(all(r['seconds'] >= 0 for r in results))
+        self.assertEqual(connection.schema_name, schema)
+
+
+class AgingReportTests(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name='Cliente Uno', ruc='155555-1-2025', taxpayer_type='Extranjero')
+        self.supplier = Supplier.objects.create(name='Proveedor Uno')
+        self.register = CashRegister.objects.create(name='Caja principal', initial_balance=Decimal('1000.00'))
+
+        self.invoice(date(2025, 1, 15), '100.00')
+        self.invoice(date(2025, 4, 20), '200.00')
+        self.invoice(date(2025, 6, 20), '300.00')
+        self.invoice(date(2025, 7, 10), '999.00')  # posterior a la fecha de corte
+        self.payment('Income', date(2025, 5, 1), '150.00', customer=self.customer, to_cash_register=self.register)
+        self.payment('Income', date(2025, 7, 5), '100.00', customer=self.customer, to_cash_register=self.register)
+
+        PurchaseOrder.objects.create(
+            supplier=self.supplier, status='Completed', payable_amount=Decimal('80.00'), received_date=date(2025, 6, 1)
+        )
+        self.payment('Expense', date(2025, 6, 2), '20.00', supplier=self.supplier, from_cash_register=self.register)
+
+    def invoice(self, day, amount):
+        # El vencimiento corre desde la factura; order_date (el borrador, auto_now_add) es hoy
+        SalesOrder.objects.create(customer=self.customer, status='Invoiced', total_amount=Decimal(amount), invoice_date=day)
+
+    def payment(self, movement_type, day, amount, **kwargs):
+        movement = TreasuryMovement.objects.create(movement_type=movement_type, amount=Decimal(amount), **kwargs)
+        TreasuryMovement.objects.filter(pk=movement.pk).update(date=day)
+
+    def test_payments_are_applied_to_oldest_invoices_first(self):
+        with CaptureQueriesContext(connection) as context:
+            report = aging_report('receivable', date(2025, 6, 30), credit_days=30)
+        self.assertEqual(len(business_queries(context)), 1)
+
+        [line] = report['parties']
+        self.assertEqual(line['name'], 'Cliente Uno')
+        # 100 (enero) queda pagada; de la de abril quedan 150, vencida hace 41 días
+        self.assertEqual(line['over_90'], Decimal('0.00'))
+        self.assertEqual(line['days_31_60'], Decimal('150.00'))
+        self.assertEqual(line['current'], Decimal('300.00'))
+        self.assertEqual(line['total'], Decimal('450.00'))
+        self.assertEqual(report['totals']['total'], Decimal('450.00'))
+
+    def test_payable_aging_endpoint(self):
+        response = self.get(AgingReportAPIView, {'kind': 'payable', 'as_of': '2025-07-15'})
+        self.assertEqual(response.status_code, 200)
+        [line] = response.data['parties']
+        self.assertEqual((line['days_1_30'], line['total']), (Decimal('60.00'), Decimal('60.00')))
+
+        self.assertEqual(self.get(AgingReportAPIView, {'kind': 'other'}).status_code, 400)
+
+
+class CashFlowTests(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.bank = Account.objects.create(name='Bancos', code='1110', account_type='ASSET')
+        self.customer = Customer.objects.create(name='Cliente Uno', ruc='155555-1-2025', taxpayer_type='Extranjero')
+        self.supplier = Supplier.objects.create(name='Proveedor Uno')
+        self.register = CashRegister.objects.create(name='Caja principal', initial_balance=Decimal('1000.00'))
+        self.bank_account = BankAccount.objects.create(
+            name='Operativa', bank_name='Banco General', account_number='04-01-00-000001',
+            initial_balance=Decimal('0.00'),
+        )
+
+    def movement(self, movement_type, day, amount, **kwargs):
+        movement = TreasuryMovement.objects.create(movement_type=movement_type, amount=Decimal(amount), **kwargs)
+        TreasuryMovement.objects.filter(pk=movement.pk).update(date=day)
+
+    def test_direct_method_by_week_counterparty_and_cash_account(self):
+        self.movement('Income', date(2025, 1, 6), '300.00', customer=self.customer, to_cash_register=self.register)
+        self.movement('Expense', date(2025, 1, 8), '100.00', supplier=self.supplier, from_cash_register=self.register)
+        self.movement('Transfer', date(2025, 1, 14), '50.00', from_cash_register=self.register, to_bank_account=self.bank_account)
+
+        with CaptureQueriesContext(connection) as context:
+            report = cash_flow(date(2025, 1, 6), date(2025, 1, 19), 'week', 'direct')
+        self.assertEqual(len(business_queries(context)), 1)
+
+        first, second = report['periods']
+        self.assertEqual(first['key'], '2025-W02')
+        self.assertEqual((first['inflows'], first['outflows'], first['net']),
+                         (Decimal('300.00'), Decimal('100.00'), Decimal('200.00')))
+        self.assertEqual((second['transfers'], second['net']), (Decimal('50.00'), Decimal('0.00')))
+
+        parties = {p['type']: p for p in report['counterparties']}
+        self.assertEqual(parties['customer']['inflows'], Decimal('300.00'))
+        self.assertEqual(parties['supplier']['outflows'], Decimal('100.00'))
+        accounts = {a['type']: a for a in report['cash_accounts']}
+        self.assertEqual((accounts['cash_register']['inflows'], accounts['cash_register']['outflows']),
+                         (Decimal('300.00'), Decimal('150.00')))
+        self.assertEqual(accounts['bank_account']['inflows'], Decimal('50.00'))
+
+    def test_indirect_method_reconciles_with_cash_accounts(self):
+        post_entry(date(2024, 12, 20), self.bank, self.capital, '400.00')
+        post_entry(date(2025, 1, 10), self.cash, self.capital, '1000.00')
+        post_entry(date(2025, 1, 20), self.cash, self.sales, '500.00')
+        post_entry(date(2025, 2, 5), self.expenses, self.cash, '200.00')
+        post_entry(date(2025, 2, 6), self.bank, self.payables, '150.00')
+
+        report = cash_flow(date(2025, 1, 1), date(2025, 2, 28), 'month', 'indirect')
+        january, february = report['periods']
+        self.assertEqual((january['equity'], january['net_profit']), (Decimal('1000.00'), Decimal('500.00')))
+        self.assertEqual(january['cash_change'], Decimal('1500.00'))
+        self.assertEqual(february['net_cash_flow'], Decimal('-50.00'))
+        self.assertEqual(report['opening_cash'], Decimal('400.00'))
+        self.assertEqual(report['closing_cash'], Decimal('1850.00'))
+        self.assertTrue(report['is_reconciled'])
+
+    def test_treasury_changes_invalidate_cached_direct_report(self):
+        params = {'start_date': '2025-01-01', 'end_date': '2025-01-31'}
+        self.movement('Income', date(2025, 1, 6), '300.00', customer=self.customer, to_cash_register=self.register)
+        self.assertEqual(self.get(CashFlowAPIView, params).data['totals']['inflows'], Decimal('300.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movement('Income', date(2025, 1, 7), '25.00', customer=self.customer, to_cash_register=self.register)
+        self.assertEqual(self.get(CashFlowAPIView, params).data['totals']['inflows'], Decimal('325.00'))
+
+
+class KpiSnapshotTests(ReportTestCase):
+
+    def test_refresh_only_recomputes_changed_sources(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post_entry(date.today(), self.cash, self.sales, '700.00')
+        self.assertIn('revenue_ytd', refresh_kpis())
+        self.assertEqual(KpiSnapshot.objects.get(key='revenue_ytd').value, Decimal('700.00'))
+        self.assertEqual(KpiSnapshot.objects.get(key='cash_position').value, Decimal('700.00'))
+
+        # Sin cambios en el Libro Diario ni en Tesorería solo se recalculan los grupos sin versión
+        refreshed = refresh_kpis()
+        self.assertNotIn('revenue_ytd', refreshed)
+        self.assertNotIn('treasury_balance', refreshed)
+        self.assertIn('open_sales_orders', refreshed)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post_entry(date.today(), self.expenses, self.cash, '200.00')
+        self.assertIn('net_profit_ytd', refresh_kpis())
+        self.assertEqual(KpiSnapshot.objects.get(key='net_profit_ytd').value, Decimal('500.00'))
+
+    def test_dashboard_reads_all_kpis_in_one_query(self):
+        post_entry(date.today(), self.cash, self.sales, '700.00')
+        refresh_kpis(force=True)
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(KpiSnapshotAPIView)
+        self.assertEqual(len(business_queries(context)), 1)
+        self.assertEqual(response.data['kpis']['revenue_mtd']['value'], Decimal('700.00'))
+        self.assertEqual(response.data['kpis']['stock_alerts']['value'], Decimal('0.00'))
+
+
+class BiExportTests(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        post_entry(date(2025, 1, 10), self.cash, self.capital, '1000.50')
+        post_entry(date(2025, 2, 10), self.expenses, self.cash, '200.25')
+        self.customer = Customer.objects.create(name='Cliente Uno', ruc='155555-1-2025', taxpayer_type='Extranjero')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_batches_cover_the_id_range_in_order(self):
+        batches = list(fact_batches('journal_items', chunk_size=3))
+        self.assertEqual([len(batch) for batch in batches], [3, 1])
+        ids = [row[0] for batch in batches for row in batch]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(list(fact_batches('journal_items', since_id=ids[1], until_id=ids[2]))[0]), 1)
+
+    def test_upper_bound_waits_for_in_flight_inserts(self):
+        # Otra conexión inserta (y toma un id menor) pero aún no confirma
+        schema = connection.schema_name
+        inserted, release = threading.Event(), threading.Event()
+        errors = []
+
+        def writer():
+            try:
+                with schema_context(schema), transaction.atomic():
+                    entry = JournalEntry.objects.create(date=date(2025, 3, 1), description='Lenta')
+                    # La cuenta es de la transacción del test, invisible aquí: sin save() ni validación
+                    JournalItem.objects.bulk_create([JournalItem(
+                        journal_entry=entry, entry_date=entry.date, account_id=self.cash.id,
+                        account_type='ASSET', debit=Decimal('1.00'), credit=0,
+                    )])
+                    inserted.set()
+                    release.wait(5)
+                    raise RuntimeError("rollback")
+            except RuntimeError:
+                pass
+            except Exception as exc:
+                errors.append(exc)
+                inserted.set()
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        inserted.wait(5)
+        last = post_entry(date(2025, 3, 2), self.cash, self.sales, '5.00').items.order_by('-id').first()
+        try:
+            # Mientras la escritura siga abierta, el MAX(id) visible no es un límite seguro
+            self.assertIsNone(stable_max_id(JournalItem, wait_seconds=0.2))
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(stable_max_id(JournalItem, wait_seconds=5), last.id)
+
+    def test_order_status_is_a_snapshot_not_a_fact(self):
+        self.assertFalse([path for _, paths in FACTS.values() for path in paths if path.endswith('status')])
+        order = SalesOrder.objects.create(customer=self.customer)
+        self.assertEqual([row[4] for batch in fact_batches('sales_orders') for row in batch], ['Draft'])
+        # La foto siguiente ve el estado nuevo; el hecho ya exportado no lo necesita
+        SalesOrder.objects.filter(pk=order.pk).update(status='Invoiced', invoice_date=date(2025, 3, 1))
+        [[row]] = fact_batches('sales_orders')
+        self.assertEqual((row[0], row[3], row[4]), (order.pk, date(2025, 3, 1), 'Invoiced'))
+
+    @skipUnless(HAS_PYARROW, "Requiere pyarrow")
+    def test_dimensions_replace_their_previous_snapshot(self):
+        import pyarrow.parquet as pq
+        SalesOrder.objects.create(customer=self.customer)
+        results = export_facts(self.directory, facts=[])
+        self.assertEqual([result['dimension'] for result in results], ['sales_orders', 'purchase_orders'])
+        SalesOrder.objects.update(status='Invoiced')
+        first = export_facts(self.directory, facts=[], dimensions=['sales_orders'])[0]
+        self.assertEqual(first['file'], results[0]['file'])
+        self.assertEqual(pq.read_table(first['file']).column('status').to_pylist(), ['Invoiced'])
+
+    @skipIf(HAS_PYARROW, "Solo aplica sin pyarrow instalado")
+    def test_command_reports_missing_pyarrow(self):
+        with self.assertRaisesMessage(CommandError, 'pyarrow'):
+            call_command('export_bi_facts', output_dir=self.directory)
+
+    @skipUnless(HAS_PYARROW, "Requiere pyarrow")
+    def test_incremental_parquet_export_keeps_decimal_and_date_types(self):
+        import pyarrow.parquet as pq
+        [result] = export_facts(self.directory, ['journal_items'], dimensions=[])
+        table = pq.read_table(result['file'])
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(str(table.schema.field('debit').type), 'decimal128(12, 2)')
+        self.assertEqual(str(table.schema.field('entry_date').type), 'date32[day]')
+        self.assertIn(Decimal('1000.50'), table.column('debit').to_pylist())
+
+        self.assertEqual(export_facts(self.directory, ['journal_items'], dimensions=[]), [])
+        post_entry(date(2025, 3, 1), self.cash, self.sales, '10.00')
+        [result] = export_facts(self.directory, ['journal_items'], dimensions=[])
+        self.assertEqual(result['rows'], 2)
+        self.assertEqual(BiExportWatermark.objects.get(fact='journal_items').rows_exported, 6)
+
+
+class ItbmsTests(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        unit = UnitOfMeasure.objects.create(name='Unidad', abbreviation='und')
+        self.product = Product.objects.create(name='Café', sku='CAF-1', unit_of_measure=unit)
+        self.customer = Customer.objects.create(name='Cliente Uno', ruc='155555-1-2025', taxpayer_type='Extranjero')
+        self.local = Supplier.objects.create(name='Proveedor Local', ruc='8-888-888', dv='12', supplier_type='Local')
+
+        self.sale(date(2025, 1, 10), [('100.00', '0.07'), ('50.00', '0.00')])
+        self.sale(date(2025, 2, 3), [('200.00', '0.10')])
+        self.purchase(date(2025, 1, 20), [('80.00', '0.07')])
+
+    def sale(self, day, lines):
+        order = SalesOrder.objects.create(customer=self.customer, status='Invoiced')
+        for price, rate in lines:
+            SOItem.objects.create(
+                sales_order=order, product=self.product, quantity=Decimal('1'),
+                unit_price=Decimal(price), tax_rate=Decimal(rate),
+            )
+        order.calculate_totals()
+        SalesOrder.objects.filter(pk=order.pk).update(invoice_date=day)
+
+    def purchase(self, day, lines):
+        order = PurchaseOrder.objects.create(supplier=self.local, status='Completed')
+        for price, rate in lines:
+            POItem.objects.create(
+                purchase_order=order, product=self.product, quantity=Decimal('1'),
+                unit_price=Decimal(price), tax_rate=Decimal(rate),
+            )
+        order.calculate_totals()
+        PurchaseOrder.objects.filter(pk=order.pk).update(received_date=day)
+
+    def test_declaration_groups_by_period_taxpayer_type_and_rate(self):
+        with CaptureQueriesContext(connection) as context:
+            report = self.get(ItbmsDeclarationAPIView, {'start_date': '2025-01-01', 'end_date': '2025-02-28'}).data
+        self.assertEqual(len(business_queries(context)), 4)
+
+        january, february = report['periods']
+        self.assertEqual(january['output_tax'], Decimal('7.00'))
+        self.assertEqual(january['input_tax'], Decimal('5.60'))
+        self.assertEqual(january['retained_tax'], Decimal('2.80'))
+        self.assertEqual(january['tax_payable'], Decimal('1.40'))
+        self.assertEqual(january['sales']['by_taxpayer_type']['Extranjero']['subtotal_exempt'], Decimal('50.00'))
+        self.assertEqual(january['sales']['by_rate']['0.07']['base'], Decimal('100.00'))
+        self.assertEqual(february['sales']['by_rate']['0.10']['tax_amount'], Decimal('20.00'))
+        self.assertEqual(report['totals']['output_tax'], Decimal('27.00'))
+
+    def test_documents_are_declared_by_invoice_date(self):
+        Account.objects.create(name='Clientes', code='110505', account_type='ASSET')
+        Account.objects.create(name='ITBMS por Pagar', code='2408', account_type='LIABILITY')
+        self.product.category = Category.objects.create(name='Bebidas', income_account=self.sales)
+        self.product.save()
+
+        # Borrador del 30 de enero, facturado el 2 de febrero: cuenta en febrero
+        order = SalesOrder.objects.create(customer=self.customer)
+        SOItem.objects.create(
+            sales_order=order, product=self.product, quantity=Decimal('1'),
+            unit_price=Decimal('10.00'), tax_rate=Decimal('0.07'),
+        )
+        order.calculate_totals()
+        SalesOrder.objects.filter(pk=order.pk).update(order_date=date(2025, 1, 30))
+        with mock.patch('sales.services.timezone.now', return_value=timezone.make_aware(datetime(2025, 2, 2, 10))):
+            invoice_sales_order(order, self.user)
+
+        january, february = self.get(
+            ItbmsDeclarationAPIView, {'start_date': '2025-01-01', 'end_date': '2025-02-28'}
+        ).data['periods']
+        self.assertEqual(january['output_tax'], Decimal('7.00'))
+        self.assertEqual(february['output_tax'], Decimal('20.70'))
+        response = self.get(TaxBookExportView, {
+            'book': 'sales', 'output': 'txt', 'start_date': '2025-02-01', 'end_date': '2025-02-28',
+        })
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertTrue(lines[1].startswith(f'2025-02-02|SO-{order.pk}|'))
+
+    def test_purchase_book_streams_pipe_delimited_text(self):
+        response = self.get(TaxBookExportView, {
+            'book': 'purchases', 'output': 'txt', 'start_date': '2025-01-01', 'end_date': '2025-12-31',
+        })
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0].split('|')[:3], ['date', 'document', 'ruc'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('|8-888-888|12|Proveedor Local|Local|80.00|5.60|2.80|', lines[1])
@@ -1,115 +1,199 @@
+import os
+from datetime import date
+from django.http import FileResponse
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, DecimalField, Value
-from django.db.models.functions import Coalesce
-from accounting.models import Account, JournalItem
-from decimal import Decimal # <-- IMPORTAR Decimal
+from stward_erp.utils import parse_date_param
+from .exports import streaming_export
+from .services import aging_report
+from .caching import LedgerCachedReportMixin
+from .registry import get_report
+from .models import ReportJob, KpiSnapshot
+from .kpis import refresh_kpis
+from .serializers import ReportJobSerializer
+from .jobs import submit_report_job
+
+class ProfitAndLossAPIView(LedgerCachedReportMixin, APIView):
+    """
+    API endpoint para el Estado de Resultados (Ganancias y Pérdidas).
+    Parámetros: start_date, end_date (AAAA-MM-DD), granularity (month, quarter, year)
+    y compare (previous_year | previous_period, opcional).
+    Lee de los saldos diarios (AccountDailyBalance), no del Libro Diario.
+    Cacheado por versión del Libro Diario (ETag / 304).
+    """
+    permission_classes = [IsAuthenticated]
+    report_type = 'profit_and_loss'
 
+class BalanceSheetAPIView(LedgerCachedReportMixin, APIView):
+    """
+    API endpoint para generar un reporte de Balance General
+    (Estado de Situación Financiera) a la fecha ?as_of= (por defecto, hoy).
+    Parte de la foto del último cierre fiscal y solo agrega los saldos
+    diarios posteriores a él. Incluye el detalle por cuenta y por cuenta padre.
+    """
+    permission_classes = [IsAuthenticated]
+    report_type = 'balance_sheet'
+
+class TrialBalanceAPIView(LedgerCachedReportMixin, APIView):
+    """
+    API endpoint para el Balance de Comprobación multi-periodo.
+    Parámetros: start_date, end_date (AAAA-MM-DD) y granularity (month, quarter, year).
+    """
+    permission_classes = [IsAuthenticated]
+    report_type = 'trial_balance'
 
-class ProfitAndLossAPIView(APIView):
+class CashFlowAPIView(LedgerCachedReportMixin, APIView):
     """
-    API endpoint para generar un reporte de Estado de Resultados
-    (Ganancias y Pérdidas) simple.
+    API endpoint para el Estado de Flujo de Efectivo.
+    Parámetros: start_date, end_date, granularity (week | month) y
+    method (direct: movimientos de Tesorería por periodo, contraparte y cuenta;
+    indirect: resultado + variaciones de balance desde el Libro Diario).
+    """
+    permission_classes = [IsAuthenticated]
+    report_type = 'cash_flow'
+
+class ItbmsDeclarationAPIView(LedgerCachedReportMixin, APIView):
+    """
+    API endpoint para la declaración de ITBMS: débito y crédito fiscal e ITBMS
+    retenido por periodo, con detalle por tipo de contribuyente y por tasa.
+    Parámetros: start_date, end_date y granularity (month | quarter).
+    """
+    permission_classes = [IsAuthenticated]
+    report_type = 'itbms_declaration'
+
+class ConsolidatedReportAPIView(LedgerCachedReportMixin, APIView):
+    """
+    API endpoint para estados consolidados de un grupo de empresas.
+    Parámetros: group (id), report (profit_and_loss | balance_sheet) y
+    start_date/end_date o as_of. Cada empresa se agrega en paralelo en su esquema;
+    la respuesta incluye las eliminaciones y el tiempo por esquema.
+    Cacheado mientras no cambie el Libro Diario de ninguna empresa del grupo.
+    """
+    permission_classes = [IsAuthenticated]
+    report_type = 'consolidated'
+
+
+class AgingReportAPIView(APIView):
+    """
+    API endpoint para la antigüedad de saldos por cliente (kind=receivable) o
+    proveedor (kind=payable) a la fecha ?as_of= (por defecto, hoy).
+    ?credit_days= cambia el plazo de crédito usado para el vencimiento.
+    No se cachea por versión del Libro Diario: los cobros y pagos de Tesorería
+    no generan asientos.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        start_date = '2025-01-01'
-        end_date = '2025-12-31'
-
-        # Definimos un valor Decimal(0) explícito
-        zero_decimal = Value(Decimal('0.0'), output_field=DecimalField())
-
-        # 2. Calcular el total de Ingresos (son Créditos)
-        total_revenue = JournalItem.objects.filter(
-            account__account_type='REVENUE',
-            journal_entry__date__range=[start_date, end_date]
-        ).aggregate(
-            total=Coalesce(Sum('credit'), zero_decimal) # <-- CORREGIDO
-        )['total']
-
-        # 3. Calcular el total de Gastos (son Débitos)
-        total_expense = JournalItem.objects.filter(
-            account__account_type='EXPENSE',
-            journal_entry__date__range=[start_date, end_date]
-        ).aggregate(
-            total=Coalesce(Sum('debit'), zero_decimal) # <-- CORREGIDO
-        )['total']
-
-        net_profit = total_revenue - total_expense
-
-        report_data = {
-            'start_date': start_date,
-            'end_date': end_date,
-            'total_revenue': total_revenue,
-            'total_expense': total_expense,
-            'net_profit': net_profit,
-        }
-        return Response(report_data)
-
-class BalanceSheetAPIView(APIView):
+        credit_days = request.query_params.get('credit_days')
+        if credit_days is not None:
+            try:
+                credit_days = int(credit_days)
+            except ValueError:
+                raise ValidationError({'credit_days': "Debe ser un número entero de días."})
+        return Response(aging_report(
+            request.query_params.get('kind', 'receivable'),
+            parse_date_param(request, 'as_of', date.today()),
+            credit_days,
+        ))
+
+class KpiSnapshotAPIView(APIView):
     """
-    API endpoint para generar un reporte de Balance General
-    (Estado de Situación Financiera).
+    API endpoint con todos los indicadores del dashboard en una sola lectura de
+    KpiSnapshot (los recalcula una tarea periódica de Celery).
+    La primera vez, si aún no hay indicadores, se calculan en la petición.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        snapshots = list(KpiSnapshot.objects.all())
+        if not snapshots:
+            refresh_kpis(force=True)
+            snapshots = list(KpiSnapshot.objects.all())
+        return Response({
+            'kpis': {
+                snapshot.key: {
+                    'value': snapshot.value,
+                    'details': snapshot.details,
+                    'refreshed_at': snapshot.refreshed_at,
+                }
+                for snapshot in snapshots
+            },
+            'refreshed_at': max((snapshot.refreshed_at for snapshot in snapshots), default=None),
+        })
+
+class GeneralLedgerExportView(APIView):
+    """
+    Exportación en streaming del Libro Diario o del Libro Mayor para auditoría.
+    Parámetros: start_date, end_date, account (código, incluye subcuentas),
+    book (diario | mayor) y output (csv | jsonl).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        report = get_report('general_ledger')
+        params = report.parse_params(request.query_params)
+        filename = f"libro_{params['book']}_{params['start_date']}_{params['end_date']}"
+        return streaming_export(report.fields(params), report.rows(params), params['output'], filename)
+
+
+class TaxBookExportView(APIView):
+    """
+    Exportación en streaming del libro de ventas o de compras para la DGI.
+    Parámetros: start_date, end_date, book (sales | purchases) y output (csv | txt | jsonl).
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        as_of_date = '2025-12-31'
-
-        # Definimos un valor Decimal(0) explícito
-        zero_decimal = Value(Decimal('0.0'), output_field=DecimalField())
-
-        # 2. Calcular saldos
-        assets_balance = JournalItem.objects.filter(
-            account__account_type='ASSET',
-            journal_entry__date__lte=as_of_date
-        ).aggregate(
-            total=Coalesce(Sum('debit'), zero_decimal) - Coalesce(Sum('credit'), zero_decimal) # <-- CORREGIDO
-        )['total']
-
-        liabilities_balance = JournalItem.objects.filter(
-            account__account_type='LIABILITY',
-            journal_entry__date__lte=as_of_date
-        ).aggregate(
-            total=Coalesce(Sum('credit'), zero_decimal) - Coalesce(Sum('debit'), zero_decimal) # <-- CORREGIDO
-        )['total']
-
-        equity_base_balance = JournalItem.objects.filter(
-            account__account_type='EQUITY',
-            journal_entry__date__lte=as_of_date
-        ).aggregate(
-            total=Coalesce(Sum('credit'), zero_decimal) - Coalesce(Sum('debit'), zero_decimal) # <-- CORREGIDO
-        )['total']
-
-        # 3. Calcular Ganancia/Pérdida Neta
-        total_revenue = JournalItem.objects.filter(
-            account__account_type='REVENUE',
-            journal_entry__date__lte=as_of_date
-        ).aggregate(total=Coalesce(Sum('credit'), zero_decimal) - Coalesce(Sum('debit'), zero_decimal))['total'] # <-- CORREGIDO
-
-        total_expense = JournalItem.objects.filter(
-            account__account_type='EXPENSE',
-            journal_entry__date__lte=as_of_date
-        ).aggregate(total=Coalesce(Sum('debit'), zero_decimal) - Coalesce(Sum('credit'), zero_decimal))['total'] # <-- CORREGIDO
-
-        net_profit = total_revenue - total_expense
-
-        # 4. Calcular Patrimonio Total
-        total_equity = equity_base_balance + net_profit
-
-        # 5. Preparar la respuesta
-        report_data = {
-            'as_of_date': as_of_date,
-            'assets': assets_balance,
-            'liabilities': liabilities_balance,
-            'equity': total_equity,
-            'check': {
-                'total_assets': assets_balance,
-                'total_liabilities_plus_equity': liabilities_balance + total_equity,
-                'is_balanced': assets_balance == (liabilities_balance + total_equity)
-            }
-        }
-
-        return Response(report_data)
\ No newline at end of file
+        report = get_report('tax_book')
+        params = report.parse_params(request.query_params)
+        filename = f"libro_{params['book']}_{params['start_date']}_{params['end_date']}"
+        return streaming_export(report.fields(params), report.rows(params), params['output'], filename)
+
+
+class ReportJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                       mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Reportes asíncronos: POST encola (o reutiliza uno idéntico), GET consulta
+    estado y progreso, y /download/ entrega el archivo cuando está terminado.
+    Cada usuario ve solo sus trabajos; el personal (is_staff) ve los de todo el tenant.
+    """
+    queryset = ReportJob.objects.all().select_related('requested_by')
+    serializer_class = ReportJobSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(requested_by=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job, created = submit_report_job(
+            serializer.validated_data['report_type'],
+            serializer.validated_data.get('params'),
+            user=request.user,
+        )
+        return Response(
+            self.get_serializer(job).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+        )
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'Done' or not job.result_file:
+            return Response(
+                {'detail': f"El reporte aún no está disponible (estado: {job.get_status_display()})."},
+                status=status.HTTP_409_CONFLICT
+            )
+        return FileResponse(
+            job.result_file.open('rb'),
+            as_attachment=True,
+            filename=os.path.basename(job.result_file.name),
+            content_type=job.content_type or None,
+        )
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_customer_contact_person_alter_soitem_isc_rate_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(fields=['order_date', 'id'], name='sales_order_date_id_idx'),
+        ),
+    ]
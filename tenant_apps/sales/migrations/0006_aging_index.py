@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_salesorder_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(condition=models.Q(('status', 'Invoiced')), fields=['customer', 'order_date', 'id'], include=('total_amount',), name='sales_order_open_ar_idx'),
+        ),
+    ]
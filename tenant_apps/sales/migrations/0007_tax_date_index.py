@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_aging_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(condition=models.Q(('status', 'Invoiced')), fields=['order_date', 'id'], name='sales_order_invoiced_idx'),
+        ),
+    ]
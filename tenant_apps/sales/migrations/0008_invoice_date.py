@@ -0,0 +1,67 @@
+# Generated by Django 4.2.13 on 2026-10-18 08:50
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_invoice_date(apps, schema_editor):
+    """
+    Fecha de factura de las órdenes ya facturadas, por rangos de id: la de su salida
+    de almacén (el asiento de la factura) si existe, o si no la única fecha guardada,
+    order_date. Cada lote se confirma por separado.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT MIN(id), MAX(id) FROM sales_salesorder WHERE status = 'Invoiced'")
+        min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            return
+        for start in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                """
+                UPDATE sales_salesorder o
+                SET invoice_date = COALESCE((
+                    SELECT MIN(m.date) FROM inventory_stockmove m
+                    WHERE m.source_type = 'sales_order' AND m.source_id = o.id
+                ), o.order_date)
+                WHERE o.status = 'Invoiced' AND o.invoice_date IS NULL
+                  AND o.id >= %s AND o.id < %s
+                """,
+                [start, start + BACKFILL_BATCH_SIZE],
+            )
+
+
+class Migration(migrations.Migration):
+    # Lotes confirmados uno a uno e índices CONCURRENTLY: no se bloquea la escritura
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0002_stockmove'),
+        ('sales', '0007_tax_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesorder',
+            name='invoice_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Fecha de Factura'),
+        ),
+        migrations.RunPython(backfill_invoice_date, migrations.RunPython.noop),
+        RemoveIndexConcurrently(
+            model_name='salesorder',
+            name='sales_order_open_ar_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='salesorder',
+            name='sales_order_invoiced_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='salesorder',
+            index=models.Index(condition=models.Q(('status', 'Invoiced')), fields=['customer', 'invoice_date', 'id'], include=('total_amount',), name='sales_order_open_ar_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='salesorder',
+            index=models.Index(condition=models.Q(('status', 'Invoiced')), fields=['invoice_date', 'id'], name='sales_order_invoice_date_idx'),
+        ),
+    ]
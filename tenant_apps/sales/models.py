@@ -53,6 +53,8 @@ class SalesOrder(models.Model):
 
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='sales_orders')
     order_date = models.DateField(auto_now_add=True)
+    # Fecha de la factura (la fija invoice_sales_order): es la que cuenta para el ITBMS y la antigüedad
+    invoice_date = models.DateField(null=True, blank=True, verbose_name="Fecha de Factura")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Draft')
     
     # Campos Fiscales DGI
@@ -97,6 +99,22 @@ class SalesOrder(models.Model):
     def __str__(self):
         return f"SO-{self.id} | {self.customer.name}"
 
+    class Meta:
+        indexes = [
+            # Paginación keyset (order_date, id)
+            models.Index(fields=['order_date', 'id'], name='sales_order_date_id_idx'),
+            # Antigüedad de CxC: facturas de cada cliente en orden FIFO, sin leer la tabla
+            models.Index(
+                fields=['customer', 'invoice_date', 'id'], include=['total_amount'],
+                condition=models.Q(status='Invoiced'), name='sales_order_open_ar_idx',
+            ),
+            # Declaración de ITBMS y libro de ventas: facturas por rango de fecha de factura
+            models.Index(
+                fields=['invoice_date', 'id'], condition=models.Q(status='Invoiced'),
+                name='sales_order_invoice_date_idx',
+            ),
+        ]
+
 class SOItem(models.Model):
     sales_order = models.ForeignKey(SalesOrder, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey('inventory.Product', on_delete=models.PROTECT, related_name='sales_order_items')
@@ -46,6 +46,7 @@ class SalesOrderSerializer(serializers.ModelSerializer):
             'customer', 
             'customer_name', 
             'order_date', 
+            'invoice_date',
             'status', 
             'dgi_status',
             'cufe',
@@ -59,7 +60,7 @@ class SalesOrderSerializer(serializers.ModelSerializer):
             'items'
         ]
         read_only_fields = [
-            'order_date', 'total_amount', 'tax_amount', 
+            'order_date', 'invoice_date', 'total_amount', 'tax_amount', 
             'subtotal_taxable', 'subtotal_exempt', 'discount_total',
             'dgi_status', 'cufe', 'qr_data'
         ]
@@ -1,12 +1,24 @@
+from collections import defaultdict
+from decimal import Decimal
 from django.db import transaction
 from django.utils import timezone
-from accounting.models import JournalEntry, JournalItem, Account
+from accounting.models import Account
+from accounting.services import create_journal_entry
+from inventory.services import apply_stock_changes, average_costs, record_stock_moves
 from rest_framework.exceptions import ValidationError
 
+CENT = Decimal('0.01')
+
+
 def invoice_sales_order(sales_order, user):
     """
     Transforma una Orden de Venta en una Factura (Asiento Contable).
-    Realiza validaciones de negocio y contables.
+    Realiza validaciones de negocio y contables, descuenta el stock y registra
+    las salidas en el kardex al costo promedio de cada producto.
+    El asiento cuadra con el ITBMS: Débito a Clientes por ingresos + impuesto,
+    Crédito a Ingresos por el neto de cada línea y a ITBMS por Pagar (2408) por el débito fiscal.
+    El costo de lo vendido sale del inventario en el mismo asiento: Débito a Costo
+    de Ventas (6135), Crédito a la Cuenta de Activo de la categoría de cada producto.
     """
     if sales_order.status == 'Invoiced':
         raise ValidationError("Esta orden ya ha sido facturada.")
@@ -21,26 +33,31 @@ def invoice_sales_order(sales_order, user):
     except Account.DoesNotExist:
         raise ValidationError("No existe la cuenta contable '110505' para Cuentas por Cobrar. Configure el Plan de Cuentas.")
 
-    with transaction.atomic():
-        # 1. Crear la Cabecera del Asiento
-        journal_entry = JournalEntry.objects.create(
-            date=timezone.now().date(),
-            description=f"Factura de Venta - Orden #{sales_order.id} - Cliente: {sales_order.customer.name}",
-            created_by=user
-        )
+    tax_amount = Decimal(sales_order.tax_amount).quantize(CENT)
+    tax_account = None
+    if tax_amount > 0:
+        try:
+            tax_account = Account.objects.get(code='2408') # ITBMS por Pagar (Débito Fiscal)
+        except Account.DoesNotExist:
+            raise ValidationError("No existe la cuenta contable '2408' para ITBMS por Pagar. Configure el Plan de Cuentas.")
 
-        # 2. Crear Línea de Débito (Cuentas por Cobrar - Activo aumenta)
-        JournalItem.objects.create(
-            journal_entry=journal_entry,
-            account=receivable_account,
-            debit=sales_order.total_amount,
-            credit=0,
-            description=f"CXC - {sales_order.customer.name}"
-        )
+    with transaction.atomic():
+        # 1. Línea de Débito (Cuentas por Cobrar - Activo aumenta); el monto se fija al final
+        receivable = {
+            'account': receivable_account,
+            'debit': Decimal('0.00'),
+            'credit': 0,
+            'description': f"CXC - {sales_order.customer.name}"
+        }
+        lines = [receivable]
 
-        # 3. Crear Líneas de Crédito (Ingresos por cada producto)
+        # 2. Líneas de Crédito (Ingresos por cada producto)
         # Agrupamos por producto/categoría para buscar sus cuentas
-        for item in sales_order.items.all():
+        items = list(sales_order.items.select_related('product__category__income_account', 'product__category__asset_account'))
+        costs = average_costs({item.product_id for item in items})
+        moves = []
+        inventory_credits = defaultdict(Decimal)
+        for item in items:
             product = item.product
             # Buscamos la cuenta en la categoría del producto
             income_account = product.category.income_account if product.category else None
@@ -50,16 +67,70 @@ def invoice_sales_order(sales_order, user):
                     f"El producto '{product.name}' (Categoría: {product.category}) no tiene configurada una Cuenta de Ingresos."
                 )
 
-            JournalItem.objects.create(
-                journal_entry=journal_entry,
-                account=income_account,
-                debit=0,
-                credit=item.total_price, # Usamos la propiedad calculada
-                description=f"Venta {product.name} (x{item.quantity})"
-            )
+            lines.append({
+                'account': income_account,
+                'debit': 0,
+                'credit': Decimal(item.net_total).quantize(CENT), # Usamos la propiedad calculada
+                'description': f"Venta {product.name} (x{item.quantity})"
+            })
+
+            # Salida de almacén (el stock se descuenta junto al final)
+            unit_cost = costs.get(product.id, Decimal('0.00'))
+            moves.append((product, -item.quantity, unit_cost, f"Salida SO-{sales_order.id}"))
+
+            cost = (Decimal(item.quantity) * unit_cost).quantize(CENT)
+            if cost > 0:
+                if not product.category.asset_account:
+                    raise ValidationError(
+                        f"El producto '{product.name}' (Categoría: {product.category}) no tiene 'Cuenta de Activo' configurada."
+                    )
+                inventory_credits[product.category.asset_account] += cost
+
+        # 3. Débito fiscal: el ITBMS facturado se debe a la DGI
+        if tax_account:
+            lines.append({
+                'account': tax_account,
+                'debit': 0,
+                'credit': tax_amount,
+                'description': f"ITBMS SO-{sales_order.id}"
+            })
+        # Clientes = ingresos + ITBMS, ya redondeados: el asiento siempre cuadra
+        receivable['debit'] = sum(line['credit'] for line in lines[1:])
+
+        # 4. Costo de ventas: la mercancía sale del inventario al costo promedio
+        if inventory_credits:
+            try:
+                cost_account = Account.objects.get(code='6135') # Costo de Ventas (Comercio)
+            except Account.DoesNotExist:
+                raise ValidationError("No existe la cuenta contable '6135' para Costo de Ventas. Configure el Plan de Cuentas.")
+            lines.append({
+                'account': cost_account,
+                'debit': sum(inventory_credits.values()),
+                'credit': 0,
+                'description': f"Costo de Ventas SO-{sales_order.id}"
+            })
+            for asset_account, cost in inventory_credits.items():
+                lines.append({
+                    'account': asset_account,
+                    'debit': 0,
+                    'credit': cost,
+                    'description': f"Salida Almacén SO-{sales_order.id}"
+                })
+
+        # 5. Crear el Asiento (cabecera + líneas + saldos diarios)
+        invoice_date = timezone.now().date()
+        journal_entry = create_journal_entry(
+            date=invoice_date,
+            description=f"Factura de Venta - Orden #{sales_order.id} - Cliente: {sales_order.customer.name}",
+            lines=lines,
+            created_by=user
+        )
+        apply_stock_changes((product.id, quantity) for product, quantity, _, _ in moves)
+        record_stock_moves(moves, journal_entry.date, 'sales_order', sales_order.id, journal_entry=journal_entry)
 
-        # 4. Actualizar Estado de la Orden
+        # 6. Actualizar Estado de la Orden
         sales_order.status = 'Invoiced'
+        sales_order.invoice_date = invoice_date
         sales_order.save()
 
     return journal_entry
\ No newline at end of file
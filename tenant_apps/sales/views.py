@@ -1,6 +1,7 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from stward_erp.pagination import HybridPagination
 from .models import Customer, SalesOrder, SOItem
 from .serializers import CustomerSerializer, SalesOrderSerializer
 from .services import invoice_sales_order 
@@ -12,6 +13,9 @@ class CustomerViewSet(viewsets.ModelViewSet):
 class SalesOrderViewSet(viewsets.ModelViewSet):
     queryset = SalesOrder.objects.all().select_related('customer').prefetch_related('items__product__category') 
     serializer_class = SalesOrderSerializer
+    # ?cursor= activa la paginación keyset (más recientes primero)
+    pagination_class = HybridPagination
+    keyset_ordering = ('-order_date', '-id')
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
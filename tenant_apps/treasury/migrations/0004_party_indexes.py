@@ -0,0 +1,21 @@
+# Generated by Django 4.2.13 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treasury', '0003_treasurymovement_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='treasurymovement',
+            index=models.Index(condition=models.Q(('customer__isnull', False)), fields=['customer', 'date'], include=('amount',), name='trs_movement_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treasurymovement',
+            index=models.Index(condition=models.Q(('supplier__isnull', False)), fields=['supplier', 'date'], include=('amount',), name='trs_movement_supplier_idx'),
+        ),
+    ]
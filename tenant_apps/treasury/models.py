@@ -3,6 +3,7 @@ from django.conf import settings
 from sales.models import Customer
 from purchasing.models import Supplier
 from django.core.exceptions import ValidationError # Para validaciones
+from accounting.versioning import bump_treasury_version
 
 class BankAccount(models.Model):
     name = models.CharField(max_length=100)
@@ -61,6 +62,21 @@ class TreasuryMovement(models.Model):
     def __str__(self):
         return f"{self.movement_type} - ${self.amount} on {self.date}"
 
+    class Meta:
+        indexes = [
+            # Paginación keyset (date, id)
+            models.Index(fields=['date', 'id'], name='trs_movement_date_id_idx'),
+            # Cobros y pagos por contraparte (antigüedad de saldos)
+            models.Index(
+                fields=['customer', 'date'], include=['amount'],
+                condition=models.Q(customer__isnull=False), name='trs_movement_customer_idx',
+            ),
+            models.Index(
+                fields=['supplier', 'date'], include=['amount'],
+                condition=models.Q(supplier__isnull=False), name='trs_movement_supplier_idx',
+            ),
+        ]
+
     # --- ¡INICIA LA LÓGICA DE LA MEJORA! ---
 
     # Validación para asegurar que los movimientos sean lógicos
@@ -92,6 +108,8 @@ class TreasuryMovement(models.Model):
         with transaction.atomic():
             # Primero, guarda el movimiento en sí
             super().save(*args, **kwargs) 
+            # Invalida los reportes de flujo de caja cacheados
+            bump_treasury_version()
 
             if is_new: # Solo actualiza saldos si es un movimiento nuevo
                 # Lógica de Ingreso
@@ -127,4 +145,9 @@ class TreasuryMovement(models.Model):
                         self.to_bank_account.save()
                     elif self.to_cash_register:
                         self.to_cash_register.current_balance += self.amount
-                        self.to_cash_register.save()
\ No newline at end of file
+                        self.to_cash_register.save()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            bump_treasury_version()
+            return super().delete(*args, **kwargs)
@@ -1,4 +1,5 @@
 from rest_framework import viewsets
+from stward_erp.pagination import HybridPagination
 from .models import BankAccount, CashRegister, TreasuryMovement
 from .serializers import BankAccountSerializer, CashRegisterSerializer, TreasuryMovementSerializer
 
@@ -27,6 +28,9 @@ class TreasuryMovementViewSet(viewsets.ModelViewSet):
         'customer', 'supplier', 'processed_by'
     )
     serializer_class = TreasuryMovementSerializer
+    # ?cursor= activa la paginación keyset (más recientes primero)
+    pagination_class = HybridPagination
+    keyset_ordering = ('-date', '-id')
 
     def perform_create(self, serializer):
         # Asigna automáticamente el usuario logueado al crear un movimiento